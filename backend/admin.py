@@ -1,11 +1,21 @@
 from flask import Blueprint, render_template, flash, Response, redirect, url_for, request, jsonify, send_file, current_app
 from flask_login import login_required, current_user
-from database.models import Shop, Product, Inventory, User, db, Sale, Service, ServiceSale, Resource, ShopResource, Expense, ResourceHistory, ResourceAlert, ResourceCategory, ServiceCategory, FinancialRecord
-from io import StringIO
+from database.models import Shop, Product, Inventory, User, db, Sale, Service, ServiceSale, Resource, ShopResource, Expense, ResourceHistory, ResourceAlert, ResourceCategory, ServiceCategory, ReportJob
+from database.daily_totals import load_daily_totals, sum_totals, net_total
+from report_queries import SalesReportQuery, period_start
+from exports import EXPORT_BATCH_SIZE, XlsxSheet, send_xlsx, stream_csv
+from jobs import enqueue
+from kpi_cache import kpi_cache
+from llm_cache import llm_cache
+from ai_agent import ai_agent
+from catalog_import import read_catalog, import_catalog
+from resource_updates import apply_resource_updates
+from alert_engine import low_stock_counts, low_stock_products
 import csv
 from datetime import datetime, timedelta
 import io
 import logging
+import os
 from sqlalchemy import text
 import pandas as pd
 from io import BytesIO
@@ -14,10 +24,9 @@ from reportlab.platypus import SimpleDocTemplate, Paragraph, Table, TableStyle,
 from reportlab.lib import colors
 from reportlab.lib.styles import getSampleStyleSheet
 from functools import wraps
-from decimal import Decimal
 import json
+import heapq
 from sqlalchemy import func
-import xlsxwriter
 from werkzeug.security import generate_password_hash
 
 # Configure logging
@@ -26,6 +35,9 @@ logger = logging.getLogger(__name__)
 # Define the admin blueprint
 admin_bp = Blueprint('admin', __name__)
 
+# Rows per page on the sales report and its JSON filter endpoint
+SALES_REPORT_PAGE_SIZE = 50
+
 
 def admin_required(f):
     @wraps(f)
@@ -53,191 +65,153 @@ def ai_assistant():
 def dashboard():
     try:
         # Get shops owned by the current admin
-        shops = Shop.query.filter_by(admin_id=current_user.id).all()
-        
-        # Initialize data structures
-        shop_data = {}
-        total_product_revenue = 0.0
-        total_service_revenue = 0.0
-        total_revenue = 0.0
-        total_products = 0
-        total_inventory = 0
-        total_employees = 0
-        total_sale_count = 0
-        total_service_count = 0
-        total_expenses = 0.0
-        
-        # Process each shop
-        for shop in shops:
-            try:
-                # Get product sales data
-                sales = Sale.query.filter_by(shop_id=shop.id).all()
-                shop_product_revenue = sum(sale.total for sale in sales)
-                total_sale_count += len(sales)
-
-                # Get service sales data
-                service_sales = ServiceSale.query.filter_by(shop_id=shop.id).all()
-                shop_service_revenue = sum(ss.price for ss in service_sales)
-                total_service_count += len(service_sales)
-                
-                # Get inventory data
-                inventory_items = Inventory.query.filter_by(shop_id=shop.id).all()
-                shop_inventory = sum(item.quantity for item in inventory_items)
-                
-                # Get employee count (only employees managed by this admin)
-                employee_count = User.query.filter_by(
-                    shop_id=shop.id, 
-                    admin_id=current_user.id,
-                    role='employee'
-                ).count()
-                
-                # Expenses for this shop (all time)
-                shop_expenses = db.session.query(func.coalesce(func.sum(Expense.amount), 0.0)).filter(Expense.shop_id == shop.id).scalar() or 0.0
-
-                # Store shop data
-                shop_data[shop.id] = {
-                    'name': shop.name,
-                    'product_revenue': float(shop_product_revenue),
-                    'service_revenue': float(shop_service_revenue),
-                    'revenue': float(shop_product_revenue + shop_service_revenue),
-                    'inventory': shop_inventory,
-                    'employees': employee_count,
-                    'expenses': float(shop_expenses)
-                }
-                
-                # Update totals
-                total_product_revenue += float(shop_product_revenue)
-                total_service_revenue += float(shop_service_revenue)
-                total_revenue += float(shop_product_revenue + shop_service_revenue)
-                total_inventory += shop_inventory
-                total_employees += employee_count
-                total_expenses += float(shop_expenses)
-            except Exception as e:
-                current_app.logger.error(f"Error processing shop {shop.id}: {str(e)}", exc_info=True)
-                continue
-        
-        # Get total products across all shops
-        shop_ids = [shop.id for shop in shops] or [-1]
-        total_products = Product.query.filter(Product.shop_id.in_(shop_ids)).count()
-
-        # Total shops/users (for header cards)
-        total_shops = len(shops)
-        active_shops = total_shops
-        total_users = User.query.filter(User.admin_id == current_user.id).count()
-        active_users = total_users
-
-        # Low stock count across shops
-        low_stock_count = (
-            db.session.query(Inventory)
-            .join(Product, Product.id == Inventory.product_id)
-            .filter(Inventory.shop_id.in_(shop_ids))
-            .filter(Inventory.quantity < Product.reorder_level)
-            .count()
-        )
+        shop_ids = [shop_id for shop_id, in db.session.query(Shop.id).filter_by(admin_id=current_user.id)]
+        admin_id = current_user.id
 
-        # Recent products with total stock
-        recent_products = (
-            Product.query.filter(Product.shop_id.in_(shop_ids))
-            .order_by(Product.created_at.desc())
-            .limit(5)
-            .all()
-        )
-        for p in recent_products:
-            qty = (
-                db.session.query(func.coalesce(func.sum(Inventory.quantity), 0))
-                .filter(Inventory.product_id == p.id)
-                .filter(Inventory.shop_id.in_(shop_ids))
-            ).scalar() or 0
-            setattr(p, 'total_stock', int(qty))
-
-        # Low stock products list
-        low_stock_products = (
-            db.session.query(Product)
-            .join(Inventory, Inventory.product_id == Product.id)
-            .filter(Product.shop_id.in_(shop_ids))
-            .filter(Inventory.quantity < Product.reorder_level)
-            .group_by(Product.id)
-            .limit(10)
-            .all()
-        )
-        for p in low_stock_products:
-            qty = (
-                db.session.query(func.coalesce(func.sum(Inventory.quantity), 0))
-                .filter(Inventory.product_id == p.id)
-                .filter(Inventory.shop_id.in_(shop_ids))
-            ).scalar() or 0
-            setattr(p, 'total_stock', int(qty))
-        
-        # Get recent product sales for all shops
-        recent_sales = Sale.query.filter(
-            Sale.shop_id.in_(shop_ids)
-        ).order_by(Sale.sale_date.desc()).limit(5).all()
-
-        # Get recent service sales for all shops
-        recent_service_sales = ServiceSale.query.filter(
-            ServiceSale.shop_id.in_(shop_ids)
-        ).order_by(ServiceSale.sale_date.desc()).limit(5).all()
-
-        # Active services and service categories summary
-        active_services = Service.query.filter(Service.shop_id.in_(shop_ids), Service.is_active == True).all()
-        service_categories = (
-            db.session.query(ServiceCategory, func.count(Service.id))
-            .join(Service, Service.category_id == ServiceCategory.id)
-            .filter(Service.shop_id.in_(shop_ids))
-            .group_by(ServiceCategory.id)
-            .all()
+        context = kpi_cache.get_or_set(
+            'admin.dashboard', shop_ids,
+            lambda: _dashboard_context(admin_id),
+            params=(admin_id,)
         )
-
-        # Augment shops with totals for the overview card
-        for s in shops:
-            s.total_products = Product.query.filter_by(shop_id=s.id).count()
-            s.total_quantity = (
-                db.session.query(func.coalesce(func.sum(Inventory.quantity), 0))
-                .filter(Inventory.shop_id == s.id)
-            ).scalar() or 0
-            s.low_stock = (
-                db.session.query(Inventory)
-                .join(Product, Product.id == Inventory.product_id)
-                .filter(Inventory.shop_id == s.id)
-                .filter(Inventory.quantity < Product.reorder_level)
-            ).all()
-        
-        # Derived metrics expected by template
-        total_transactions = total_sale_count + total_service_count
-        average_sale = float(total_revenue) / total_transactions if total_transactions > 0 else 0.0
-
-        return render_template('admin/dashboard.html',
-                             shops=shops,
-                             shop_data=shop_data,
-                             total_product_revenue=total_product_revenue,
-                             total_service_revenue=total_service_revenue,
-                             total_revenue=total_revenue,
-                             total_sales=total_revenue,
-                             total_products=total_products,
-                             total_inventory=total_inventory,
-                             total_employees=total_employees,
-                             total_sale_count=total_sale_count,
-                             total_service_count=total_service_count,
-                             total_transactions=total_transactions,
-                             average_sale=average_sale,
-                             total_expenses=total_expenses,
-                             recent_sales=recent_sales,
-                             recent_service_sales=recent_service_sales,
-                             total_shops=total_shops,
-                             active_shops=active_shops,
-                             total_users=total_users,
-                             active_users=active_users,
-                             low_stock_count=low_stock_count,
-                             recent_products=recent_products,
-                             low_stock_products=low_stock_products,
-                             active_services=active_services,
-                             service_categories=service_categories)
+        return render_template('admin/dashboard.html', **context)
     except Exception as e:
         current_app.logger.error(f"Error in dashboard: {str(e)}", exc_info=True)
         flash('An error occurred while loading the dashboard.', 'error')
         return redirect(url_for('auth.select_role'))
 
 
+def _dashboard_context(admin_id):
+    """Template context for the admin dashboard, as plain data so it can be cached."""
+    shops = Shop.query.filter_by(admin_id=admin_id).all()
+    shop_ids = [shop.id for shop in shops] or [-1]
+
+    def per_shop(*columns, model, extra=()):
+        """{shop_id: row} for one GROUP BY shop_id aggregate over the admin's shops."""
+        query = db.session.query(model.shop_id, *columns)\
+            .filter(model.shop_id.in_(shop_ids), *extra)\
+            .group_by(model.shop_id)
+        return {row[0]: row[1:] for row in query}
+
+    # One aggregate query per table, grouped by shop
+    sales_by_shop = per_shop(func.coalesce(func.sum(Sale.line_total), 0.0), func.count(Sale.id), model=Sale)
+    services_by_shop = per_shop(func.coalesce(func.sum(ServiceSale.price), 0.0), func.count(ServiceSale.id),
+                                model=ServiceSale)
+    stock_by_shop = per_shop(func.coalesce(func.sum(Inventory.quantity), 0), model=Inventory)
+    expenses_by_shop = per_shop(func.coalesce(func.sum(Expense.amount), 0.0), model=Expense)
+    products_by_shop = per_shop(func.count(Product.id), model=Product)
+    employees_by_shop = per_shop(func.count(User.id), model=User,
+                                 extra=(User.admin_id == admin_id, User.role == 'employee'))
+    low_stock_by_shop = low_stock_counts(shop_ids)
+
+    shop_data = {}
+    shop_cards = []
+    for shop in shops:
+        product_revenue, sale_count = sales_by_shop.get(shop.id, (0.0, 0))
+        service_revenue, service_count = services_by_shop.get(shop.id, (0.0, 0))
+        shop_data[shop.id] = {
+            'name': shop.name,
+            'product_revenue': float(product_revenue),
+            'service_revenue': float(service_revenue),
+            'revenue': float(product_revenue) + float(service_revenue),
+            'inventory': int(stock_by_shop.get(shop.id, (0,))[0]),
+            'employees': employees_by_shop.get(shop.id, (0,))[0],
+            'expenses': float(expenses_by_shop.get(shop.id, (0.0,))[0]),
+            'sale_count': sale_count,
+            'service_count': service_count
+        }
+
+        # Totals for the overview card
+        shop_cards.append({
+            'id': shop.id,
+            'name': shop.name,
+            'location': shop.location,
+            'total_products': products_by_shop.get(shop.id, (0,))[0],
+            'total_quantity': shop_data[shop.id]['inventory'],
+            'low_stock_count': low_stock_by_shop.get(shop.id, 0)
+        })
+
+    total_product_revenue = sum(data['product_revenue'] for data in shop_data.values())
+    total_service_revenue = sum(data['service_revenue'] for data in shop_data.values())
+    total_revenue = total_product_revenue + total_service_revenue
+    total_sale_count = sum(data['sale_count'] for data in shop_data.values())
+    total_service_count = sum(data['service_count'] for data in shop_data.values())
+
+    # Total shops/users (for header cards)
+    total_users = User.query.filter(User.admin_id == admin_id).count()
+
+    # Recent and low-stock (active alert) products, with stock summed in one grouped query
+    recent_products = (
+        Product.query.filter(Product.shop_id.in_(shop_ids))
+        .order_by(Product.created_at.desc())
+        .limit(5)
+        .all()
+    )
+    low_stock_items = low_stock_products(shop_ids, limit=10)
+    listed_ids = {p.id for p in recent_products} | {p.id for p in low_stock_items}
+    stock_by_product = dict(
+        db.session.query(Inventory.product_id, func.coalesce(func.sum(Inventory.quantity), 0))
+        .filter(Inventory.product_id.in_(listed_ids or [-1]))
+        .filter(Inventory.shop_id.in_(shop_ids))
+        .group_by(Inventory.product_id)
+    )
+
+    def product_row(p):
+        return {
+            'id': p.id,
+            'name': p.name,
+            'category': p.category,
+            'marked_price': p.marked_price,
+            'total_stock': int(stock_by_product.get(p.id, 0))
+        }
+
+    # Active services and service categories summary
+    active_services = Service.query.options(db.joinedload(Service.category))\
+        .filter(Service.shop_id.in_(shop_ids), Service.is_active == True).all()
+    service_categories = (
+        db.session.query(ServiceCategory.id, ServiceCategory.name, func.count(Service.id))
+        .join(Service, Service.category_id == ServiceCategory.id)
+        .filter(Service.shop_id.in_(shop_ids))
+        .group_by(ServiceCategory.id, ServiceCategory.name)
+        .all()
+    )
+
+    # Derived metrics expected by template
+    total_transactions = total_sale_count + total_service_count
+    average_sale = float(total_revenue) / total_transactions if total_transactions > 0 else 0.0
+
+    return dict(
+        shops=shop_cards,
+        shop_data=shop_data,
+        total_product_revenue=total_product_revenue,
+        total_service_revenue=total_service_revenue,
+        total_revenue=total_revenue,
+        total_sales=total_revenue,
+        total_products=sum(card['total_products'] for card in shop_cards),
+        total_inventory=sum(data['inventory'] for data in shop_data.values()),
+        total_employees=sum(data['employees'] for data in shop_data.values()),
+        total_sale_count=total_sale_count,
+        total_service_count=total_service_count,
+        total_transactions=total_transactions,
+        average_sale=average_sale,
+        total_expenses=sum(data['expenses'] for data in shop_data.values()),
+        total_shops=len(shops),
+        active_shops=len(shops),
+        total_users=total_users,
+        active_users=total_users,
+        low_stock_count=sum(low_stock_by_shop.values()),
+        recent_products=[product_row(p) for p in recent_products],
+        low_stock_products=[product_row(p) for p in low_stock_items],
+        active_services=[{
+            'id': service.id,
+            'name': service.name,
+            'category': service.category.name if service.category else '',
+            'price': service.price
+        } for service in active_services],
+        service_categories=[({'id': category_id, 'name': name}, count)
+                            for category_id, name, count in service_categories]
+    )
+
+
 @admin_bp.route('/api/my-shops')
 @login_required
 @admin_required
@@ -254,6 +228,30 @@ def api_my_shops():
         return jsonify({ 'error': 'Failed to load shops' }), 500
 
 
+@admin_bp.route('/api/kpi-cache')
+@login_required
+@admin_required
+def kpi_cache_stats():
+    """Hit, miss and invalidation counters of the dashboard/KPI cache in this worker."""
+    return jsonify(kpi_cache.stats())
+
+
+@admin_bp.route('/api/llm-cache')
+@login_required
+@admin_required
+def llm_cache_stats():
+    """Hit, miss and eviction counters of the AI response cache in this worker."""
+    return jsonify(llm_cache.stats())
+
+
+@admin_bp.route('/api/ai-providers')
+@login_required
+@admin_required
+def ai_provider_stats():
+    """Circuit breaker state of each configured AI provider in this worker."""
+    return jsonify(ai_agent.providers.stats())
+
+
 @admin_bp.route('/dashboard/recent-sales')
 @login_required
 @admin_required
@@ -279,26 +277,31 @@ def get_recent_sales():
             start_date = end_date.replace(
                 hour=0, minute=0, second=0, microsecond=0)
 
-        # Get recent sales with eager loading
-        sales = (
-            Sale.query
-            .join(Shop)
-            .join(Product)
-            .filter(Sale.sale_date >= start_date)
-            .filter(Sale.sale_date <= end_date)
-            .order_by(Sale.sale_date.desc())
-            .limit(20)
-            .all()
-        )
+        def build():
+            # Get recent sales with eager loading
+            sales = (
+                Sale.query
+                .join(Shop)
+                .join(Product)
+                .options(db.contains_eager(Sale.shop), db.contains_eager(Sale.product))
+                .filter(Sale.sale_date >= start_date)
+                .filter(Sale.sale_date <= end_date)
+                .order_by(Sale.sale_date.desc())
+                .limit(20)
+                .all()
+            )
 
-        # Format sales data for response
-        sales_data = [{
-            'sale_date': sale.sale_date.strftime('%Y-%m-%d %H:%M'),
-            'shop_name': sale.shop.name,
-            'product_name': sale.product.name,
-            'quantity': sale.quantity,
-            'total': float(sale.product.marked_price * sale.quantity)
-        } for sale in sales]
+            # Format sales data for response
+            return [{
+                'sale_date': sale.sale_date.strftime('%Y-%m-%d %H:%M'),
+                'shop_name': sale.shop.name,
+                'product_name': sale.product.name,
+                'quantity': sale.quantity,
+                'total': float(sale.total)
+            } for sale in sales]
+
+        # Covers every shop, so any shop's sale invalidates it
+        sales_data = kpi_cache.get_or_set('admin.recent_sales', None, build, params=(period,))
 
         logger.info(f"Found {len(sales_data)} recent sales")
 
@@ -675,53 +678,32 @@ def sales_report():
         return redirect(url_for('auth.select_role'))
 
     try:
-        # Get period filter and shop selection
-        period = request.args.get('period', 'today')
-        selected_shop_id = request.args.get('shop_id', type=int)
-
         # Get all shops for the filter dropdown
         shops = Shop.query.all()
 
-        # Calculate date range based on period
-        end_date = datetime.now()
-        if period == 'today':
-            start_date = end_date.replace(
-                hour=0, minute=0, second=0, microsecond=0)
-        elif period == 'week':
-            start_date = end_date - timedelta(days=7)
-        elif period == 'month':
-            start_date = end_date - timedelta(days=30)
-        elif period == 'year':
-            start_date = end_date.replace(month=1, day=1, hour=0, minute=0, second=0, microsecond=0)
-        else:
-            start_date = end_date.replace(hour=0, minute=0, second=0, microsecond=0)
-
-        # Base query with eager loading
-        query = Sale.query.join(Shop).join(Product).options(
-            db.joinedload(Sale.shop),
-            db.joinedload(Sale.product)
-        )
-
-        # Apply date filter
-        query = query.filter(
-            Sale.sale_date >= start_date,
-            Sale.sale_date <= end_date)
-
-        # Apply shop filter
-        if selected_shop_id:
-            query = query.filter(Sale.shop_id == selected_shop_id)
-
-        # Get sales data
-        sales = query.order_by(Sale.sale_date.desc()).all()
-
-        # Calculate summary statistics
-        total_sales = sum(sale.quantity * sale.price for sale in sales)
-        total_items = sum(sale.quantity for sale in sales)
-        total_transactions = len(sales)
-        average_sale = total_sales / total_transactions if total_transactions > 0 else 0
+        # Build the report filter (defaults to today)
+        try:
+            report = SalesReportQuery.from_args(request.args, default_period='today')
+        except ValueError:
+            flash('Invalid date format. Please use YYYY-MM-DD format.', 'danger')
+            report = SalesReportQuery(start=period_start('today', datetime.now()), period='today')
+        period = report.period
+        selected_shop_id = report.shop_id
+        page = request.args.get('page', 1, type=int)
 
-        # Get recent sales (last 20)
-        recent_sales = query.order_by(Sale.sale_date.desc()).limit(20).all()
+        # One query returns the page rows and the totals for the whole filter
+        sales, summary = report.page(page, SALES_REPORT_PAGE_SIZE)
+        total_sales = summary['total_sales']
+        total_items = summary['total_items']
+        total_transactions = summary['total_transactions']
+        average_sale = summary['average_sale']
+        total_pages = max((total_transactions + SALES_REPORT_PAGE_SIZE - 1) // SALES_REPORT_PAGE_SIZE, 1)
+
+        # Recent sales are the head of the first page
+        if report.sort_by == 'date_desc' and page == 1:
+            recent_sales = sales[:20]
+        else:
+            recent_sales = report.rows('date_desc').limit(20).all()
 
         return render_template('admin/sales_report.html',
                                sales=sales,
@@ -732,7 +714,10 @@ def sales_report():
                                average_sale=average_sale,
                                shops=shops,
                                period=period,
-                               selected_shop_id=selected_shop_id)
+                               selected_shop_id=selected_shop_id,
+                               sort_by=report.sort_by,
+                               page=page,
+                               total_pages=total_pages)
     except Exception as e:
         logger.error(f"Error in sales report: {str(e)}")
         flash('Error loading sales report.', 'danger')
@@ -748,85 +733,31 @@ def filter_sales():
 
     try:
         # Get filter parameters
-        start_date = request.args.get('start_date')
-        end_date = request.args.get('end_date')
-        shop_id = request.args.get('shop_id', type=int)
-        period = request.args.get('period', 'all')
-        sort_by = request.args.get('sort_by', 'date_desc')
-
-        logger.info(
-            f"Filtering sales with params: start_date={start_date}, end_date={end_date}, shop_id={shop_id}, period={period}, sort_by={sort_by}")
+        page = request.args.get('page', 1, type=int)
+        per_page = min(request.args.get('per_page', SALES_REPORT_PAGE_SIZE, type=int), 500)
 
-        # Base query with eager loading
-        query = Sale.query.join(Shop).join(Product).options(
-            db.joinedload(Sale.shop),
-            db.joinedload(Sale.product)
-        )
+        logger.info(f"Filtering sales with params: {request.args.to_dict()}")
 
-        # Apply date filters
-        if start_date and end_date:
-            try:
-                start = datetime.strptime(start_date, '%Y-%m-%d')
-                end = datetime.strptime(
-                    end_date, '%Y-%m-%d') + timedelta(days=1)
-                query = query.filter(Sale.sale_date.between(start, end))
-            except ValueError as e:
-                logger.error(f"Invalid date format: {str(e)}")
-                return jsonify(
-                    {'success': False, 'message': 'Invalid date format'}), 400
-        elif period != 'all':
-            now = datetime.utcnow()
-            if period == 'today':
-                start = now.replace(hour=0, minute=0, second=0, microsecond=0)
-                query = query.filter(Sale.sale_date >= start)
-            elif period == 'week':
-                start = now - timedelta(days=7)
-                query = query.filter(Sale.sale_date >= start)
-            elif period == 'month':
-                start = now - timedelta(days=30)
-                query = query.filter(Sale.sale_date >= start)
-            elif period == 'year':
-                start = now.replace(
-                    month=1,
-                    day=1,
-                    hour=0,
-                    minute=0,
-                    second=0,
-                    microsecond=0)
-                query = query.filter(Sale.sale_date >= start)
+        try:
+            report = SalesReportQuery.from_args(request.args)
+        except ValueError as e:
+            logger.error(f"Invalid date format: {str(e)}")
+            return jsonify(
+                {'success': False, 'message': 'Invalid date format'}), 400
 
         # Apply shop filter
-        if shop_id:
-            shop = Shop.query.get(shop_id)
-            if not shop:
-                return jsonify(
-                    {'success': False, 'message': 'Invalid shop ID'}), 400
-            query = query.filter(Sale.shop_id == shop_id)
+        if report.shop_id and not Shop.query.get(report.shop_id):
+            return jsonify(
+                {'success': False, 'message': 'Invalid shop ID'}), 400
 
-        # Apply sorting
-        if sort_by == 'date_desc':
-            query = query.order_by(Sale.sale_date.desc())
-        elif sort_by == 'date_asc':
-            query = query.order_by(Sale.sale_date.asc())
-        elif sort_by == 'amount_desc':
-            query = query.order_by((Sale.price * Sale.quantity).desc())
-        elif sort_by == 'amount_asc':
-            query = query.order_by((Sale.price * Sale.quantity).asc())
-
-        # Get filtered sales
+        # Get the requested page together with the totals for the filter
         try:
-            sales = query.all()
+            sales, summary = report.page(page, per_page)
         except Exception as e:
             logger.error(f"Database query error: {str(e)}")
             return jsonify(
                 {'success': False, 'message': 'Error retrieving sales data'}), 500
 
-        # Calculate summary statistics
-        total_sales = sum(sale.quantity * sale.price for sale in sales)
-        total_items = sum(sale.quantity for sale in sales)
-        total_transactions = len(sales)
-        average_sale = total_sales / total_transactions if total_transactions > 0 else 0
-
         # Prepare sales data for response
         sales_data = [{
             'id': sale.id,
@@ -835,7 +766,7 @@ def filter_sales():
             'product_name': sale.product.name,
             'quantity': sale.quantity,
             'price': float(sale.price),
-            'total': float(sale.price * sale.quantity)
+            'total': float(sale.total)
         } for sale in sales]
 
         logger.info(f"Filtered {len(sales_data)} sales records")
@@ -843,12 +774,10 @@ def filter_sales():
         return jsonify({
             'success': True,
             'sales': sales_data,
-            'summary': {
-                'total_sales': float(total_sales),
-                'total_items': total_items,
-                'total_transactions': total_transactions,
-                'average_sale': float(average_sale)
-            }
+            'summary': summary,
+            'page': max(page, 1),
+            'per_page': per_page,
+            'total_pages': max((summary['total_transactions'] + per_page - 1) // per_page, 1)
         })
     except Exception as e:
         logger.error(f"Error in filter_sales: {str(e)}")
@@ -865,85 +794,40 @@ def export_sales(format):
         # Get filter parameters
         start_date = request.args.get('start_date')
         end_date = request.args.get('end_date')
-        shop_id = request.args.get('shop_id', type=int)
         period = request.args.get('period', 'all')
-        sort_by = request.args.get('sort_by', 'date_desc')
 
         logger.info(
-            f"Exporting sales with params: format={format}, start_date={start_date}, end_date={end_date}, shop_id={shop_id}, period={period}")
-
-        # Base query with eager loading
-        query = Sale.query.join(Shop).join(Product).options(
-            db.joinedload(Sale.shop),
-            db.joinedload(Sale.product)
-        )
+            f"Exporting sales with params: format={format}, {request.args.to_dict()}")
 
-        # Apply date filters
-        if start_date and end_date:
-            try:
-                start = datetime.strptime(start_date, '%Y-%m-%d')
-                end = datetime.strptime(
-                    end_date, '%Y-%m-%d') + timedelta(days=1)
-                query = query.filter(Sale.sale_date.between(start, end))
-            except ValueError as e:
-                logger.error(f"Invalid date format: {str(e)}")
-                return jsonify(
-                    {'success': False, 'message': 'Invalid date format'}), 400
-        elif period != 'all':
-            now = datetime.utcnow()
-            if period == 'today':
-                start = now.replace(hour=0, minute=0, second=0, microsecond=0)
-                query = query.filter(Sale.sale_date >= start)
-            elif period == 'week':
-                start = now - timedelta(days=7)
-                query = query.filter(Sale.sale_date >= start)
-            elif period == 'month':
-                start = now - timedelta(days=30)
-                query = query.filter(Sale.sale_date >= start)
-            elif period == 'year':
-                start = now.replace(
-                    month=1,
-                    day=1,
-                    hour=0,
-                    minute=0,
-                    second=0,
-                    microsecond=0)
-                query = query.filter(Sale.sale_date >= start)
+        try:
+            report = SalesReportQuery.from_args(request.args)
+        except ValueError as e:
+            logger.error(f"Invalid date format: {str(e)}")
+            return jsonify(
+                {'success': False, 'message': 'Invalid date format'}), 400
 
         # Apply shop filter
-        if shop_id:
-            shop = Shop.query.get(shop_id)
-            if not shop:
-                return jsonify(
-                    {'success': False, 'message': 'Invalid shop ID'}), 400
-            query = query.filter(Sale.shop_id == shop_id)
-
-        # Apply sorting
-        if sort_by == 'date_desc':
-            query = query.order_by(Sale.sale_date.desc())
-        elif sort_by == 'date_asc':
-            query = query.order_by(Sale.sale_date.asc())
-        elif sort_by == 'amount_desc':
-            query = query.order_by((Sale.price * Sale.quantity).desc())
-        elif sort_by == 'amount_asc':
-            query = query.order_by((Sale.price * Sale.quantity).asc())
-
-        # Get filtered sales
-        sales = query.all()
+        if report.shop_id and not Shop.query.get(report.shop_id):
+            return jsonify(
+                {'success': False, 'message': 'Invalid shop ID'}), 400
 
-        if not sales:
+        if not report.summary()['total_transactions']:
             return jsonify(
                 {'success': False, 'message': 'No data to export'}), 404
 
-        # Prepare data for export
-        data = [{
-            'Date': sale.sale_date.strftime('%Y-%m-%d %H:%M'),
-            'Shop': sale.shop.name,
-            'Product': sale.product.name,
-            'Quantity': sale.quantity,
-            'Price': float(sale.price),
-            'Total': float(sale.price * sale.quantity)
-        } for sale in sales]
+        header = ['Date', 'Shop', 'Product', 'Quantity', 'Price', 'Total']
+
+        def export_rows():
+            # Stream sales from a server-side cursor in batches
+            for sale in report.rows().yield_per(EXPORT_BATCH_SIZE):
+                yield [
+                    sale.sale_date.strftime('%Y-%m-%d %H:%M'),
+                    sale.shop.name,
+                    sale.product.name,
+                    sale.quantity,
+                    float(sale.price),
+                    float(sale.total)
+                ]
 
         # Generate filename with timestamp
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
@@ -951,38 +835,17 @@ def export_sales(format):
 
         # Export based on format
         if format == 'csv':
-            output = StringIO()
-            writer = csv.DictWriter(output, fieldnames=data[0].keys())
-            writer.writeheader()
-            writer.writerows(data)
-
-            return Response(
-                output.getvalue(),
-                mimetype='text/csv',
-                headers={
-                    'Content-Disposition': f'attachment; filename={filename}.csv',
-                    'Content-Type': 'text/csv'})
+            return stream_csv(f'{filename}.csv', header, export_rows())
         elif format == 'excel':
-            df = pd.DataFrame(data)
-            output = BytesIO()
-            with pd.ExcelWriter(output, engine='xlsxwriter') as writer:
-                df.to_excel(writer, sheet_name='Sales Report', index=False)
-                worksheet = writer.sheets['Sales Report']
-                for idx, col in enumerate(df.columns):
-                    max_length = max(
-                        df[col].astype(str).apply(len).max(), len(col)) + 2
-                    worksheet.set_column(idx, idx, max_length)
-
-            output.seek(0)
-            return Response(
-                output.getvalue(),
-                mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
-                headers={
-                    'Content-Disposition': f'attachment; filename={filename}.xlsx',
-                    'Content-Type': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
-                }
-            )
+            return send_xlsx(f'{filename}.xlsx', [
+                XlsxSheet('Sales Report', header, export_rows(),
+                          widths={'Date': 18, 'Shop': 24, 'Product': 30},
+                          formats={'Price': '#,##0.00', 'Total': '#,##0.00'})
+            ])
         elif format == 'pdf':
+            # The PDF table is laid out in memory, so it still loads every row
+            data = [dict(zip(header, row)) for row in export_rows()]
+
             buffer = BytesIO()
             doc = SimpleDocTemplate(buffer, pagesize=landscape(letter))
             elements = []
@@ -1708,33 +1571,12 @@ def bulk_update_resources():
         data = request.json
         shop_id = data['shop_id']
         updates = data['updates']
-        
-        for update in updates:
-            shop_resource = ShopResource.query.filter_by(
-                shop_id=shop_id,
-                resource_id=update['resource_id']
-            ).first()
-            
-            if shop_resource:
-                previous_quantity = shop_resource.quantity
-                shop_resource.quantity = update['quantity']
-                shop_resource.updated_by = current_user.id
-                
-                # Create history entry
-                history = ResourceHistory(
-                    resource_id=update['resource_id'],
-                    shop_id=shop_id,
-                    previous_quantity=previous_quantity,
-                    new_quantity=update['quantity'],
-                    change_type='adjust',
-                    reason=update.get('reason', ''),
-                    updated_by=current_user.id
-                )
-                db.session.add(history)
-        
-        db.session.commit()
-        return jsonify({'success': True, 'message': 'Resources updated successfully'})
-        
+
+        result = apply_resource_updates(shop_id, updates, current_user.id)
+        return jsonify({'success': True, 'message': 'Resources updated successfully', **result})
+    except ValueError as e:
+        db.session.rollback()
+        return jsonify({'success': False, 'message': str(e)}), 400
     except Exception as e:
         db.session.rollback()
         current_app.logger.error(f"Error in bulk update: {str(e)}", exc_info=True)
@@ -1900,75 +1742,27 @@ def accounts():
         else:
             start_date = end_date.replace(hour=0, minute=0, second=0, microsecond=0)
 
+        # Read the per-day rollup: one row per shop per day instead of
+        # every financial record and expense in the period
+        selected_shops = [shop for shop in shops if not selected_shop_id or shop.id == selected_shop_id]
+        daily_totals = load_daily_totals([shop.id for shop in selected_shops],
+                                         start_date.date(), end_date.date())
+
         # Initialize shop breakdown list
         shop_breakdown = []
 
-        # Process each shop
-        for shop in shops:
-            # Skip if shop is selected and this isn't it
-            if selected_shop_id and shop.id != selected_shop_id:
-                continue
+        for shop in selected_shops:
+            days = daily_totals[shop.id].values()
+            shop_totals = sum_totals(days)
 
-            # Initialize shop totals
-            shop_totals = {
-                'cash': Decimal('0.00'),
-                'till': Decimal('0.00'),
-                'bank': Decimal('0.00'),
-                'expenses': Decimal('0.00')
-            }
-
-            # Initialize daily breakdown
-            daily_breakdown = []
-            current_date = start_date
-
-            # Process each day in the period
-            while current_date <= end_date:
-                # Get financial records for this day
-                day_records = FinancialRecord.query.filter(
-                    FinancialRecord.shop_id == shop.id,
-                    db.func.date(FinancialRecord.date) == current_date.date()
-                ).all()
-
-                # Get expenses for this day
-                shop_expenses = Expense.query.filter(
-                    Expense.shop_id == shop.id,
-                    db.func.date(Expense.date) == current_date.date()
-                ).all()
-
-                # Initialize day totals
-                day_totals = {
-                    'cash': Decimal('0.00'),
-                    'till': Decimal('0.00'),
-                    'bank': Decimal('0.00'),
-                    'expenses': sum(Decimal(str(expense.amount)) for expense in shop_expenses)
-                }
-
-                # Calculate totals from financial records
-                for record in day_records:
-                    if record.type in day_totals:
-                        day_totals[record.type] += Decimal(str(record.amount or 0))
-                        shop_totals[record.type] += Decimal(str(record.amount or 0))
-
-                # Add expenses to shop total
-                shop_totals['expenses'] += day_totals['expenses']
-
-                # Calculate day total
-                day_total = sum(day_totals[method] for method in ['cash', 'till', 'bank']) - day_totals['expenses']
-
-                # Add day data to breakdown
-                daily_breakdown.append({
-                    'date': current_date.strftime('%Y-%m-%d'),
-                    'cash': float(day_totals['cash']),
-                    'till': float(day_totals['till']),
-                    'bank': float(day_totals['bank']),
-                    'expenses': float(day_totals['expenses']),
-                    'total': float(day_total)
-                })
-
-                current_date += timedelta(days=1)
-
-            # Calculate shop total
-            shop_total = sum(shop_totals[method] for method in ['cash', 'till', 'bank']) - shop_totals['expenses']
+            daily_breakdown = [{
+                'date': day['day'].strftime('%Y-%m-%d'),
+                'cash': float(day['cash']),
+                'till': float(day['till']),
+                'bank': float(day['bank']),
+                'expenses': float(day['expenses']),
+                'total': float(net_total(day))
+            } for day in days]
 
             # Add shop data to breakdown
             shop_breakdown.append({
@@ -1978,7 +1772,7 @@ def accounts():
                 'till': float(shop_totals['till']),
                 'bank': float(shop_totals['bank']),
                 'expenses': float(shop_totals['expenses']),
-                'total': float(shop_total),
+                'total': float(net_total(shop_totals)),
                 'daily_breakdown': daily_breakdown
             })
 
@@ -2060,88 +1854,26 @@ def get_accounts_summary():
             'expenses': 0
         }
 
-        # Get shop-wise breakdown
+        # Get shop-wise breakdown from the daily rollup
         shop_breakdown = []
+        selected_shops = [shop for shop in shops if not shop_ids or str(shop.id) in shop_ids]
+        daily_totals = load_daily_totals([shop.id for shop in selected_shops],
+                                         start_date.date(), end_date.date())
 
-        for shop in shops:
-            if not shop_ids or str(shop.id) in shop_ids:
-                logger.info(f"Processing shop: {shop.name} (ID: {shop.id})")
-
-                try:
-                    # Get product sales grouped by payment method
-                    sales_by_payment = db.session.query(
-                        Sale.payment_method,
-                        db.func.sum(Sale.price * Sale.quantity).label('total')
-                    ).filter(
-                        Sale.shop_id == shop.id,
-                        Sale.sale_date >= start_date,
-                        Sale.sale_date <= end_date
-                    ).group_by(Sale.payment_method).all()
-
-                    logger.info(f"Found {len(sales_by_payment)} product sales records for shop {shop.name}")
-
-                    # Get service sales grouped by payment method
-                    service_sales_by_payment = db.session.query(
-                        ServiceSale.payment_method,
-                        db.func.sum(ServiceSale.price).label('total')
-                    ).filter(
-                        ServiceSale.shop_id == shop.id,
-                        ServiceSale.sale_date >= start_date,
-                        ServiceSale.sale_date <= end_date
-                    ).group_by(ServiceSale.payment_method).all()
-
-                    logger.info(f"Found {len(service_sales_by_payment)} service sales records for shop {shop.name}")
-
-                    # Get expenses
-                    shop_expenses = Expense.query.filter(
-                        Expense.shop_id == shop.id,
-                        Expense.date >= start_date,
-                        Expense.date <= end_date
-                    ).all()
-
-                    logger.info(f"Found {len(shop_expenses)} expenses for shop {shop.name}")
-
-                    # Initialize shop totals
-                    shop_totals = {
-                        'cash': 0, 'till': 0, 'bank': 0, 'expenses': sum(
-                            expense.amount for expense in shop_expenses)}
-
-                    # Calculate totals from product sales
-                    for payment_method, total in sales_by_payment:
-                        if payment_method in shop_totals:
-                            shop_totals[payment_method] += float(total)
-                            totals[payment_method] += float(total)
-
-                    # Add service sales to totals
-                    for payment_method, total in service_sales_by_payment:
-                        if payment_method in shop_totals:
-                            shop_totals[payment_method] += float(total)
-                            totals[payment_method] += float(total)
-
-                    # Add shop expenses to total expenses
-                    totals['expenses'] += shop_totals['expenses']
-
-                    # Calculate shop total
-                    shop_total = sum(
-                        shop_totals[method] for method in [
-                            'cash', 'till', 'bank']) - shop_totals['expenses']
-
-                    shop_breakdown.append({
-                        'shop_id': shop.id,
-                        'shop_name': shop.name,
-                        'cash': shop_totals['cash'],
-                        'till': shop_totals['till'],
-                        'bank': shop_totals['bank'],
-                        'expenses': shop_totals['expenses'],
-                        'total': shop_total
-                    })
-
-                    logger.info(f"Processed shop {shop.name} totals: {shop_totals}")
+        for shop in selected_shops:
+            shop_totals = sum_totals(daily_totals[shop.id].values())
+            for key in totals:
+                totals[key] += float(shop_totals[key])
 
-                except Exception as e:
-                    logger.error(
-                        f"Error processing shop {shop.name}: {str(e)}")
-                    continue
+            shop_breakdown.append({
+                'shop_id': shop.id,
+                'shop_name': shop.name,
+                'cash': float(shop_totals['cash']),
+                'till': float(shop_totals['till']),
+                'bank': float(shop_totals['bank']),
+                'expenses': float(shop_totals['expenses']),
+                'total': float(net_total(shop_totals))
+            })
 
         # Calculate overall total
         overall_total = sum(
@@ -2193,405 +1925,184 @@ def download_accounts():
         else:
             return jsonify({'error': 'Invalid date range'}), 400
 
-        # Get product sales data
-        sales_query = Sale.query.filter(
-            Sale.sale_date >= start_date,
-            Sale.sale_date <= end_date)
-        if shop_ids:
-            sales_query = sales_query.filter(Sale.shop_id.in_(shop_ids))
-        sales = sales_query.options(
-            db.joinedload(Sale.shop),
-            db.joinedload(Sale.product)
-        ).all()
+        shop_ids = [int(shop_id) for shop_id in shop_ids]
+
+        def scoped(query, shop_col, date_col):
+            query = query.filter(date_col >= start_date, date_col <= end_date)
+            if shop_ids:
+                query = query.filter(shop_col.in_(shop_ids))
+            return query
+
+        def product_rows():
+            query = scoped(
+                Sale.query.join(Shop, Shop.id == Sale.shop_id).join(Product, Product.id == Sale.product_id)
+                .options(db.contains_eager(Sale.shop), db.contains_eager(Sale.product)),
+                Sale.shop_id, Sale.sale_date
+            ).order_by(Sale.sale_date)
+            for sale in query.yield_per(EXPORT_BATCH_SIZE):
+                yield (sale.sale_date, 'Product', sale.shop.name, sale.product.name,
+                       sale.quantity, sale.price, sale.total, sale.payment_method, sale.customer_name)
+
+        def service_rows():
+            query = scoped(
+                ServiceSale.query.join(Shop, Shop.id == ServiceSale.shop_id)
+                .join(Service, Service.id == ServiceSale.service_id)
+                .options(db.contains_eager(ServiceSale.shop), db.contains_eager(ServiceSale.service)),
+                ServiceSale.shop_id, ServiceSale.sale_date
+            ).order_by(ServiceSale.sale_date)
+            for sale in query.yield_per(EXPORT_BATCH_SIZE):
+                yield (sale.sale_date, 'Service', sale.shop.name, sale.service.name,
+                       1, sale.price, sale.price, sale.payment_method, sale.customer_name)
+
+        def sales_rows():
+            # Both cursors are already date ordered, so merge them lazily
+            merged = heapq.merge(product_rows(), service_rows(), key=lambda row: row[0])
+            for sale_date, kind, shop_name, item, quantity, price, total, method, customer in merged:
+                yield [sale_date.strftime('%Y-%m-%d %H:%M:%S'), shop_name, kind, item,
+                       quantity, price, total, method.title(), customer or 'N/A']
+
+        def expense_rows():
+            query = scoped(
+                Expense.query.join(Shop, Shop.id == Expense.shop_id)
+                .options(db.contains_eager(Expense.shop)),
+                Expense.shop_id, Expense.date
+            ).order_by(Expense.date)
+            for expense in query.yield_per(EXPORT_BATCH_SIZE):
+                yield [expense.date.strftime('%Y-%m-%d %H:%M:%S'), expense.shop.name,
+                       expense.description, float(expense.amount), expense.category]
+
+        # Summary sheet totals come from SQL aggregates
+        totals = {'cash': 0.0, 'till': 0.0, 'bank': 0.0}
+        product_totals = scoped(
+            db.session.query(Sale.payment_method, func.coalesce(func.sum(Sale.line_total), 0.0)),
+            Sale.shop_id, Sale.sale_date
+        ).group_by(Sale.payment_method)
+        service_totals = scoped(
+            db.session.query(ServiceSale.payment_method, func.coalesce(func.sum(ServiceSale.price), 0.0)),
+            ServiceSale.shop_id, ServiceSale.sale_date
+        ).group_by(ServiceSale.payment_method)
+        for method, total in list(product_totals) + list(service_totals):
+            if method in totals:
+                totals[method] += float(total)
+        total_expenses = float(scoped(
+            db.session.query(func.coalesce(func.sum(Expense.amount), 0)),
+            Expense.shop_id, Expense.date
+        ).scalar() or 0)
+        total_sales = totals['cash'] + totals['till'] + totals['bank']
+
+        summary_rows = [
+            ['Total Cash Sales', totals['cash']],
+            ['Total Till Sales', totals['till']],
+            ['Total Bank Sales', totals['bank']],
+            ['Total Sales', total_sales],
+            ['Total Expenses', total_expenses],
+            ['Net Total', total_sales - total_expenses]
+        ]
+
+        money = '#,##0.00'
+        return send_xlsx(
+            f'financial_report_{date_range}_{datetime.now().strftime("%Y%m%d_%H%M%S")}.xlsx',
+            [
+                XlsxSheet('Sales',
+                          ['Date', 'Shop', 'Type', 'Item', 'Quantity', 'Price', 'Total',
+                           'Payment Method', 'Customer'],
+                          sales_rows(),
+                          widths={'Date': 20, 'Shop': 24, 'Item': 30, 'Customer': 20},
+                          formats={'Price': money, 'Total': money}),
+                XlsxSheet('Expenses',
+                          ['Date', 'Shop', 'Description', 'Amount', 'Category'],
+                          expense_rows(),
+                          widths={'Date': 20, 'Shop': 24, 'Description': 40},
+                          formats={'Amount': money}),
+                XlsxSheet('Summary', ['Category', 'Amount'], summary_rows,
+                          widths={'Category': 20}, formats={'Amount': money}),
+            ]
+        )
 
-        # Get service sales data
-        service_sales_query = ServiceSale.query.filter(
-            ServiceSale.sale_date >= start_date,
-            ServiceSale.sale_date <= end_date)
-        if shop_ids:
-            service_sales_query = service_sales_query.filter(
-                ServiceSale.shop_id.in_(shop_ids))
-        service_sales = service_sales_query.options(
-            db.joinedload(ServiceSale.shop),
-            db.joinedload(ServiceSale.service)
-        ).all()
+    except Exception as e:
+        logger.error(f"Error downloading accounts: {str(e)}")
+        return jsonify({'error': str(e)}), 500
 
-        # Get expenses data
-        expenses_query = Expense.query.filter(
-            Expense.date >= start_date, Expense.date <= end_date)
-        if shop_ids:
-            expenses_query = expenses_query.filter(
-                Expense.shop_id.in_(shop_ids))
-        expenses = expenses_query.options(
-            db.joinedload(Expense.shop)
-        ).all()
 
-        # Prepare product sales data for Excel
-        sales_data = []
-        for sale in sales:
-            sales_data.append({
-                'Date': sale.sale_date.strftime('%Y-%m-%d %H:%M:%S'),
-                'Shop': sale.shop.name,
-                'Type': 'Product',
-                'Item': sale.product.name,
-                'Quantity': sale.quantity,
-                'Price': sale.price,
-                'Total': sale.price * sale.quantity,
-                'Payment Method': sale.payment_method.title(),
-                'Customer': sale.customer_name or 'N/A'
-            })
+def _enqueue_report_job(job_type, parameters, shop_id=None):
+    """Queue a workbook for the background pool; 202 with the job and where to poll it."""
+    if shop_id and not Shop.query.filter_by(id=shop_id, admin_id=current_user.id).first():
+        return jsonify({'error': 'Selected shop not found.'}), 404
+    try:
+        job = enqueue(job_type, parameters, current_user.id, shop_id=shop_id)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    return jsonify({
+        'job': job.to_dict(),
+        'status_url': url_for('admin.report_job_status', job_id=job.id),
+        'download_url': url_for('admin.download_report_job', job_id=job.id)
+    }), 202
+
+
+def _admin_report_job(job_id):
+    """The job if it is for one of the admin's shops, or an all-shops job they started."""
+    shop_ids = db.session.query(Shop.id).filter(Shop.admin_id == current_user.id)
+    return ReportJob.query.filter(
+        ReportJob.id == job_id,
+        db.or_(ReportJob.shop_id.in_(shop_ids),
+               db.and_(ReportJob.shop_id.is_(None), ReportJob.user_id == current_user.id))
+    ).first()
+
+
+@admin_bp.route('/api/report-jobs/<int:job_id>')
+@login_required
+@admin_required
+def report_job_status(job_id):
+    try:
+        job = _admin_report_job(job_id)
+        if not job:
+            return jsonify({'error': 'Job not found'}), 404
+        return jsonify(job.to_dict())
 
-        # Prepare service sales data for Excel
-        for sale in service_sales:
-            sales_data.append({
-                'Date': sale.sale_date.strftime('%Y-%m-%d %H:%M:%S'),
-                'Shop': sale.shop.name,
-                'Type': 'Service',
-                'Item': sale.service.name,
-                'Quantity': 1,
-                'Price': sale.price,
-                'Total': sale.price,
-                'Payment Method': sale.payment_method.title(),
-                'Customer': sale.customer_name or 'N/A'
-            })
+    except Exception as e:
+        logger.error(f"Error getting report job: {str(e)}")
+        return jsonify({'error': 'Internal server error'}), 500
 
-        # Sort sales data by date
-        sales_data.sort(key=lambda x: x['Date'])
-
-        # Prepare expenses data for Excel
-        expenses_data = []
-        for expense in expenses:
-            expenses_data.append({
-                'Date': expense.date.strftime('%Y-%m-%d %H:%M:%S'),
-                'Shop': expense.shop.name,
-                'Description': expense.description,
-                'Amount': expense.amount,
-                'Category': expense.category
-            })
 
-        # Create Excel file
-        output = BytesIO()
-        with pd.ExcelWriter(output, engine='xlsxwriter') as writer:
-            # Sales sheet
-            df_sales = pd.DataFrame(sales_data)
-            df_sales.to_excel(writer, sheet_name='Sales', index=False)
-
-            # Expenses sheet
-            df_expenses = pd.DataFrame(expenses_data)
-            df_expenses.to_excel(writer, sheet_name='Expenses', index=False)
-
-            # Summary sheet
-            total_cash = sum(
-                sale.price *
-                sale.quantity for sale in sales if sale.payment_method == 'cash')
-            total_till = sum(
-                sale.price *
-                sale.quantity for sale in sales if sale.payment_method == 'till')
-            total_bank = sum(
-                sale.price *
-                sale.quantity for sale in sales if sale.payment_method == 'bank')
-
-            # Add service sales to totals
-            total_cash += sum(
-                sale.price for sale in service_sales if sale.payment_method == 'cash')
-            total_till += sum(
-                sale.price for sale in service_sales if sale.payment_method == 'till')
-            total_bank += sum(
-                sale.price for sale in service_sales if sale.payment_method == 'bank')
-
-            total_sales = total_cash + total_till + total_bank
-            total_expenses = sum(expense.amount for expense in expenses)
-
-            summary_data = {
-                'Category': [
-                    'Total Cash Sales',
-                    'Total Till Sales',
-                    'Total Bank Sales',
-                    'Total Sales',
-                    'Total Expenses',
-                    'Net Total'
-                ],
-                'Amount': [
-                    total_cash,
-                    total_till,
-                    total_bank,
-                    total_sales,
-                    total_expenses,
-                    total_sales - total_expenses
-                ]
-            }
-            df_summary = pd.DataFrame(summary_data)
-            df_summary.to_excel(writer, sheet_name='Summary', index=False)
+@admin_bp.route('/api/report-jobs/<int:job_id>/download')
+@login_required
+@admin_required
+def download_report_job(job_id):
+    try:
+        job = _admin_report_job(job_id)
+        if not job:
+            return jsonify({'error': 'Job not found'}), 404
+        if job.status != 'succeeded':
+            return jsonify({'error': f'Job is {job.status}', 'progress': job.progress}), 409
+        if not job.artifact_path or not os.path.exists(job.artifact_path):
+            return jsonify({'error': 'Report file is no longer available'}), 410
 
-        output.seek(0)
         return send_file(
-            output,
+            job.artifact_path,
             mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
             as_attachment=True,
-            download_name=f'financial_report_{date_range}_{datetime.now().strftime("%Y%m%d_%H%M%S")}.xlsx')
+            download_name=job.artifact_name
+        )
 
     except Exception as e:
-        logger.error(f"Error downloading accounts: {str(e)}")
-        return jsonify({'error': str(e)}), 500
+        logger.error(f"Error downloading report job: {str(e)}")
+        return jsonify({'error': 'Internal server error'}), 500
 
 
 @admin_bp.route('/download-shop-accounts')
 @login_required
 @admin_required
 def download_shop_accounts():
-    """Download shop accounts report with daily breakdown for the selected period."""
+    """Queue the shop accounts workbook with daily breakdown for the selected period."""
     try:
-        logger.info("Starting download_shop_accounts")
-
-        # Get period filter and shop selection
         period = request.args.get('period', 'today')
-        selected_shop_id = request.args.get('shop_id', type=int)
-        logger.info(f"Period selected: {period}, Shop ID: {selected_shop_id}")
-
-        # Calculate date range based on period
-        end_date = datetime.now()
-        if period == 'today':
-            start_date = end_date.replace(hour=0, minute=0, second=0, microsecond=0)
-            days = 1
-        elif period == 'week':
-            start_date = end_date - timedelta(days=7)
-            days = 7
-        elif period == 'month':
-            start_date = end_date - timedelta(days=30)
-            days = 30
-        elif period == 'year':
-            start_date = end_date.replace(month=1, day=1, hour=0, minute=0, second=0, microsecond=0)
-            days = 365
-        else:
-            start_date = end_date.replace(hour=0, minute=0, second=0, microsecond=0)
-            days = 1
-
-        logger.info(f"Date range: {start_date} to {end_date}")
-
-        # Get shops based on selection
-        if selected_shop_id:
-            shops = Shop.query.filter_by(id=selected_shop_id).all()
-            if not shops:
-                logger.error(f"No shop found with ID: {selected_shop_id}")
-                flash('Selected shop not found.', 'danger')
-                return redirect(url_for('admin.accounts'))
-        else:
-            shops = Shop.query.all()
-            if not shops:
-                logger.error("No shops found in database")
-                flash('No shops found.', 'danger')
-                return redirect(url_for('admin.accounts'))
-
-        # Create a list to store all data
-        data = []
-
-        # Process each shop
-        for shop in shops:
-            try:
-                logger.info(f"Processing shop: {shop.name}")
-
-                # Add shop header
-                data.append({
-                    'Date': shop.name,
-                    'Cash': '',
-                    'Till': '',
-                    'Bank': '',
-                    'Expenses': '',
-                    'Total': ''
-                })
-
-                # Process each day in the period
-                current_date = start_date
-                while current_date <= end_date:
-                    try:
-                        logger.info(f"Processing date: {current_date.date()}")
-
-                        # Get sales for this day (join Product to use real column for price)
-                        sales_by_payment = db.session.query(
-                            Sale.payment_method,
-                            db.func.sum(Product.marked_price * Sale.quantity).label('total')
-                        ).join(Product, Product.id == Sale.product_id).filter(
-                            Sale.shop_id == shop.id,
-                            db.func.date(Sale.sale_date) == current_date.date()
-                        ).group_by(Sale.payment_method).all()
-
-                        # Get service sales for this day
-                        service_sales_by_payment = db.session.query(
-                            ServiceSale.payment_method,
-                            db.func.sum(ServiceSale.price).label('total')
-                        ).filter(
-                            ServiceSale.shop_id == shop.id,
-                            db.func.date(ServiceSale.sale_date) == current_date.date()
-                        ).group_by(ServiceSale.payment_method).all()
-
-                        # Get expenses for this day
-                        shop_expenses = Expense.query.filter(
-                            Expense.shop_id == shop.id,
-                            db.func.date(Expense.date) == current_date.date()
-                        ).all()
-
-                        # Initialize day totals with Decimal
-                        day_totals = {
-                            'cash': Decimal('0.00'),
-                            'till': Decimal('0.00'),
-                            'bank': Decimal('0.00'),
-                            'expenses': sum(Decimal(str(expense.amount)) for expense in shop_expenses)
-                        }
-
-                        # Calculate totals from product sales
-                        for payment_method, total in sales_by_payment:
-                            if payment_method in day_totals:
-                                day_totals[payment_method] += Decimal(str(total))
-
-                        # Add service sales to totals
-                        for payment_method, total in service_sales_by_payment:
-                            if payment_method in day_totals:
-                                day_totals[payment_method] += Decimal(str(total))
-
-                        # Calculate day total
-                        day_total = sum(day_totals[method] for method in ['cash', 'till', 'bank']) - day_totals['expenses']
-
-                        # Add day data to the list
-                        data.append({
-                            'Date': current_date.strftime('%Y-%m-%d'),
-                            'Cash': float(day_totals['cash']),
-                            'Till': float(day_totals['till']),
-                            'Bank': float(day_totals['bank']),
-                            'Expenses': float(day_totals['expenses']),
-                            'Total': float(day_total)
-                        })
-
-                        current_date += timedelta(days=1)
-                    except Exception as e:
-                        logger.error(f"Error processing date {current_date.date()}: {str(e)}")
-                        continue
-
-                # Calculate shop totals
-                shop_data = data[-days - 1:]
-                shop_total = {
-                    'cash': sum(Decimal(str(row['Cash'])) for row in shop_data if isinstance(row['Cash'], (int, float))),
-                    'till': sum(Decimal(str(row['Till'])) for row in shop_data if isinstance(row['Till'], (int, float))),
-                    'bank': sum(Decimal(str(row['Bank'])) for row in shop_data if isinstance(row['Bank'], (int, float))),
-                    'expenses': sum(Decimal(str(row['Expenses'])) for row in shop_data if isinstance(row['Expenses'], (int, float)))
-                }
-                shop_total['total'] = shop_total['cash'] + shop_total['till'] + shop_total['bank'] - shop_total['expenses']
-
-                # Add shop total
-                data.append({
-                    'Date': f'{shop.name} Total',
-                    'Cash': float(shop_total['cash']),
-                    'Till': float(shop_total['till']),
-                    'Bank': float(shop_total['bank']),
-                    'Expenses': float(shop_total['expenses']),
-                    'Total': float(shop_total['total'])
-                })
-
-                # Add empty row for spacing
-                data.append({
-                    'Date': '',
-                    'Cash': '',
-                    'Till': '',
-                    'Bank': '',
-                    'Expenses': '',
-                    'Total': ''
-                })
-
-            except Exception as e:
-                logger.error(f"Error processing shop {shop.name}: {str(e)}")
-                continue
-
-        if not data:
-            logger.error("No data generated for the report")
-            flash('No data available for the selected period.', 'warning')
-            return redirect(url_for('admin.accounts'))
-
-        try:
-            logger.info(f"Total rows in data: {len(data)}")
-
-            # Create Excel file
-            output = BytesIO()
-            with pd.ExcelWriter(output, engine='xlsxwriter') as writer:
-                # Convert data to DataFrame
-                df = pd.DataFrame(data)
-                logger.info(f"DataFrame shape: {df.shape}")
-
-                # Write to Excel
-                df.to_excel(writer, sheet_name='Shop Accounts', index=False)
-
-                # Get workbook and worksheet objects
-                workbook = writer.book
-                worksheet = writer.sheets['Shop Accounts']
-
-                # Add some formatting
-                header_format = workbook.add_format({
-                    'bold': True,
-                    'bg_color': '#4CAF50',
-                    'font_color': 'white',
-                    'border': 1
-                })
-
-                shop_header_format = workbook.add_format({
-                    'bold': True,
-                    'bg_color': '#E8F5E9',
-                    'border': 1
-                })
-
-                shop_total_format = workbook.add_format({
-                    'bold': True,
-                    'bg_color': '#C8E6C9',
-                    'border': 1
-                })
-
-                number_format = workbook.add_format({
-                    'num_format': 'KES #,##0.00',
-                    'border': 1
-                })
-
-                # Format headers
-                for col_num, value in enumerate(df.columns.values):
-                    worksheet.write(0, col_num, value, header_format)
-
-                # Format data
-                for row_num, row in enumerate(df.itertuples(), start=1):
-                    for col_num, value in enumerate(row[1:], start=0):
-                        if isinstance(value, (int, float)):
-                            worksheet.write(row_num, col_num, value, number_format)
-                        elif isinstance(value, str):
-                            if value.endswith('Total'):
-                                worksheet.write(row_num, col_num, value, shop_total_format)
-                            elif value and not value.isdigit():
-                                worksheet.write(row_num, col_num, value, shop_header_format)
-                            else:
-                                worksheet.write(row_num, col_num, value)
-
-                # Adjust column widths
-                worksheet.set_column('A:A', 20)  # Date column
-                worksheet.set_column('B:F', 15)  # Other columns
-
-                # Add period information
-                worksheet.write(0, 6, f'Period: {period.capitalize()}', header_format)
-                worksheet.write(1, 6, f'From: {start_date.strftime("%Y-%m-%d")}', header_format)
-                worksheet.write(2, 6, f'To: {end_date.strftime("%Y-%m-%d")}', header_format)
-
-            # Prepare the file for download
-            output.seek(0)
-            filename = f'shop_accounts_{datetime.now().strftime("%Y%m%d_%H%M%S")}.xlsx'
-
-            return send_file(
-                output,
-                mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
-                as_attachment=True,
-                download_name=filename)
-
-        except Exception as e:
-            logger.error(f"Error creating Excel file: {str(e)}")
-            flash('Error creating the report file.', 'danger')
-            return redirect(url_for('admin.accounts'))
+        shop_id = request.args.get('shop_id', type=int)
+        logger.info(f"Queueing shop accounts: period {period}, shop ID {shop_id}")
+        return _enqueue_report_job('accounts', {'period': period}, shop_id=shop_id)
 
     except Exception as e:
         logger.error(f"Error in download_shop_accounts: {str(e)}")
-        flash('Error downloading shop accounts report.', 'danger')
-        return redirect(url_for('admin.accounts'))
+        return jsonify({'error': 'Error queueing shop accounts report.'}), 500
 
 
 @admin_bp.route('/api/test-db')
@@ -2664,215 +2175,15 @@ def get_sale_details(sale_id):
 @admin_required
 def download_sales_report():
     try:
-        logger.info("Starting download_sales_report")
-        # Get filter parameters
-        start_date = request.args.get('start_date')
-        end_date = request.args.get('end_date')
-        selected_shop_id = request.args.get('shop_id', type=int)
-        sort_by = request.args.get('sort_by', 'date_desc')
-        period = request.args.get('period', 'today')
-
-        # Set default dates based on period if not provided
-        if not start_date or not end_date:
-            end_date_dt = datetime.now()
-            if period == 'today':
-                start_date_dt = end_date_dt.replace(hour=0, minute=0, second=0, microsecond=0)
-            elif period == 'week':
-                start_date_dt = end_date_dt - timedelta(days=7)
-            elif period == 'month':
-                start_date_dt = end_date_dt - timedelta(days=30)
-            elif period == 'year':
-                start_date_dt = end_date_dt - timedelta(days=365)
-            else:
-                start_date_dt = end_date_dt.replace(hour=0, minute=0, second=0, microsecond=0)
-        else:
-            try:
-                start_date_dt = datetime.strptime(start_date, '%Y-%m-%d')
-                end_date_dt = datetime.strptime(end_date, '%Y-%m-%d') + timedelta(days=1)
-            except ValueError as e:
-                logger.error(f"Invalid date format: {str(e)}")
-                flash('Invalid date format. Please use YYYY-MM-DD format.', 'danger')
-                return redirect(url_for('admin.sales_report'))
-
-        logger.info(f"Date range: {start_date_dt} to {end_date_dt}")
-
-        # Base query with eager loading
-        query = Sale.query.join(Shop).join(Product).options(
-            db.joinedload(Sale.shop),
-            db.joinedload(Sale.product)
-        )
-
-        # Apply date filter
-        query = query.filter(
-            Sale.sale_date >= start_date_dt,
-            Sale.sale_date <= end_date_dt
-        )
-
-        # Apply shop filter
-        if selected_shop_id:
-            query = query.filter(Sale.shop_id == selected_shop_id)
-
-        # Apply sorting
-        if sort_by == 'date_desc':
-            query = query.order_by(Sale.sale_date.desc())
-        elif sort_by == 'date_asc':
-            query = query.order_by(Sale.sale_date.asc())
-        elif sort_by == 'amount_desc':
-            query = query.order_by((Sale.product.marked_price * Sale.quantity).desc())
-        elif sort_by == 'amount_asc':
-            query = query.order_by((Sale.product.marked_price * Sale.quantity).asc())
-
-        # Get sales data
-        sales = query.all()
-        logger.info(f"Found {len(sales)} sales records")
-
-        if not sales:
-            flash('No sales data found for the selected period.', 'warning')
-            return redirect(url_for('admin.sales_report'))
-
-        # Create Excel file
-        output = BytesIO()
-        with pd.ExcelWriter(output, engine='xlsxwriter') as writer:
-            # Prepare detailed sales data
-            sales_data = []
-            for sale in sales:
-                sales_data.append({
-                    'Date': sale.sale_date.strftime('%Y-%m-%d %H:%M'),
-                    'Shop': sale.shop.name,
-                    'Product': sale.product.name,
-                    'Category': sale.product.category,
-                    'Quantity': sale.quantity,
-                    'Price': float(sale.product.marked_price),
-                    'Total': float(sale.product.marked_price * sale.quantity),
-                    'Payment Method': sale.payment_method.title(),
-                    'Customer': sale.customer_name or 'N/A'
-                })
-
-            # Create detailed sales sheet
-            df_sales = pd.DataFrame(sales_data)
-            df_sales.to_excel(writer, sheet_name='Detailed Sales', index=False)
-
-            # Create daily summary sheet
-            daily_summary = df_sales.groupby([pd.to_datetime(df_sales['Date']).dt.date]).agg({
-                'Total': 'sum',
-                'Quantity': 'sum',
-                'Date': 'count'
-            }).rename(columns={'Date': 'Transactions'})
-            daily_summary.index.name = 'Date'
-            daily_summary.to_excel(writer, sheet_name='Daily Summary')
-
-            # Create shop summary sheet
-            shop_summary = df_sales.groupby('Shop').agg({
-                'Total': 'sum',
-                'Quantity': 'sum',
-                'Date': 'count'
-            }).rename(columns={'Date': 'Transactions'})
-            shop_summary.to_excel(writer, sheet_name='Shop Summary')
-
-            # Create category summary sheet
-            category_summary = df_sales.groupby('Category').agg({
-                'Total': 'sum',
-                'Quantity': 'sum',
-                'Date': 'count'
-            }).rename(columns={'Date': 'Transactions'})
-            category_summary.to_excel(writer, sheet_name='Category Summary')
-
-            # Create payment method summary sheet
-            payment_summary = df_sales.groupby('Payment Method').agg({
-                'Total': 'sum',
-                'Date': 'count'
-            }).rename(columns={'Date': 'Transactions'})
-            payment_summary.to_excel(writer, sheet_name='Payment Summary')
-
-            # Create overall summary sheet
-            total_sales = df_sales['Total'].sum()
-            total_items = df_sales['Quantity'].sum()
-            total_transactions = len(df_sales)
-            average_sale = total_sales / total_transactions if total_transactions > 0 else 0
-
-            summary_data = {
-                'Metric': [
-                    'Total Sales',
-                    'Total Items Sold',
-                    'Total Transactions',
-                    'Average Sale Amount',
-                    'Period',
-                    'Start Date',
-                    'End Date'
-                ],
-                'Value': [
-                    f"KES {total_sales:.2f}",
-                    total_items,
-                    total_transactions,
-                    f"KES {average_sale:.2f}",
-                    period.capitalize(),
-                    start_date_dt.strftime('%Y-%m-%d'),
-                    end_date_dt.strftime('%Y-%m-%d')
-                ]
-            }
-
-            if selected_shop_id:
-                shop = Shop.query.get(selected_shop_id)
-                if shop:
-                    summary_data['Metric'].extend(['Shop Name', 'Shop Location'])
-                    summary_data['Value'].extend([shop.name, shop.location])
-
-            df_summary = pd.DataFrame(summary_data)
-            df_summary.to_excel(writer, sheet_name='Summary', index=False)
-
-            # Get workbook and worksheet objects
-            workbook = writer.book
-
-            # Add formatting to all sheets
-            for sheet_name in writer.sheets:
-                worksheet = writer.sheets[sheet_name]
-
-                # Add header format
-                header_format = workbook.add_format({
-                    'bold': True,
-                    'bg_color': '#4CAF50',
-                    'font_color': 'white',
-                })
-
-                # Add number format
-                number_format = workbook.add_format({
-                    'num_format': 'KES #,##0.00',
-                    'border': 1
-                })
-
-                # Add date format
-                date_format = workbook.add_format({
-                    'num_format': 'yyyy-mm-dd',
-                    'border': 1
-                })
-
-                # Format headers
-                for col_num, value in enumerate(df_sales.columns.values):
-                    worksheet.write(0, col_num, value, header_format)
-
-                # Format data
-                for row_num, row in enumerate(df_sales.itertuples(), start=1):
-                    for col_num, value in enumerate(row[1:], start=0):
-                        if isinstance(value, (int, float)):
-                            worksheet.write(row_num, col_num, value, number_format)
-                        elif isinstance(value, str) and value.replace('-', '').replace(':', '').isdigit():
-                            worksheet.write(row_num, col_num, value, date_format)
-
-        # Prepare the file for download
-        output.seek(0)
-        filename = f'sales_report_{datetime.now().strftime("%Y%m%d_%H%M%S")}.xlsx'
-
-        return send_file(
-            output,
-            mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
-            as_attachment=True,
-            download_name=filename
-        )
+        parameters = request.args.to_dict()
+        shop_id = parameters.pop('shop_id', None)
+        return _enqueue_report_job('sales', parameters, shop_id=int(shop_id) if shop_id else None)
 
+    except ValueError:
+        return jsonify({'error': 'Invalid shop.'}), 400
     except Exception as e:
         logger.error(f"Unexpected error in download_sales_report: {str(e)}")
-        flash('An unexpected error occurred. Please try again.', 'danger')
-        return redirect(url_for('admin.sales_report'))
+        return jsonify({'error': 'An unexpected error occurred. Please try again.'}), 500
 
 
 @admin_bp.route('/api/sales/summary')
@@ -3167,6 +2478,40 @@ def add_product():
     shops = Shop.query.all()
     return render_template('admin/add_product.html', shops=shops)
 
+@admin_bp.route('/api/products/import', methods=['POST'])
+@login_required
+@admin_required
+def import_products():
+    """Import a CSV/XLSX catalogue into one of the admin's shops.
+
+    Form fields: `file`, `shop_id` (the owning shop) and optionally one or
+    more `stock_shop_id` (shops whose opening stock is the file's
+    `quantity`; default the owning shop). Inventory rows are created in
+    every shop the admin owns, at zero outside the stocking shops. Rows
+    that fail validation are returned in `errors` without stopping the
+    import.
+    """
+    try:
+        upload = request.files.get('file')
+        if not upload or not upload.filename:
+            return jsonify({'error': 'No file provided'}), 400
+
+        shop_ids = [shop_id for shop_id, in db.session.query(Shop.id).filter_by(admin_id=current_user.id)]
+        shop_id = request.form.get('shop_id', type=int)
+        stock_shop_ids = request.form.getlist('stock_shop_id', type=int) or [shop_id]
+        if shop_id not in shop_ids or not set(stock_shop_ids).issubset(shop_ids):
+            return jsonify({'error': 'Shop not found'}), 404
+
+        rows = read_catalog(upload.stream, upload.filename)
+        result = import_catalog(rows, shop_id, inventory_shop_ids=shop_ids, stock_shop_ids=stock_shop_ids)
+        return jsonify(result), 200
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        logger.error(f"Error importing products: {str(e)}")
+        db.session.rollback()
+        return jsonify({'error': 'Error importing products'}), 500
+
 @admin_bp.route('/products/<int:product_id>/edit', methods=['GET', 'POST'])
 @login_required
 @admin_required
@@ -3334,168 +2679,11 @@ def get_service_category(category_id):
 @admin_required
 def download_report():
     try:
-        # Get date range from request
-        start_date = request.args.get('start_date')
-        end_date = request.args.get('end_date')
-        
-        if not start_date or not end_date:
-            return jsonify({'error': 'Start date and end date are required'}), 400
-            
-        # Convert dates to datetime objects
-        start_date = datetime.strptime(start_date, '%Y-%m-%d')
-        end_date = datetime.strptime(end_date, '%Y-%m-%d')
-        
-        # Get all shops
-        shops = Shop.query.all()
-        
-        # Create a BytesIO object to store the Excel file
-        output = BytesIO()
-        workbook = xlsxwriter.Workbook(output)
-        
-        # Add a worksheet for each shop
-        for shop in shops:
-            worksheet = workbook.add_worksheet(shop.name)
-            
-            # Add headers
-            headers = [
-                'Date', 'Total Sales', 'Cash', 'M-Pesa', 'Card', 'Other',
-                'Products Sold', 'Services Rendered', 'New Customers',
-                'Returning Customers', 'Average Transaction Value'
-            ]
-            for col, header in enumerate(headers):
-                worksheet.write(0, col, header)
-            
-            # Process each date in the range
-            current_date = start_date
-            row = 1
-            
-            while current_date <= end_date:
-                date_str = current_date.strftime('%Y-%m-%d')
-                logger.info(f"Processing date: {date_str}")
-                
-                try:
-                    # Get sales for this date
-                    sales = Sale.query.filter(
-                        Sale.shop_id == shop.id,
-                        func.date(Sale.sale_date) == date_str
-                    ).all()
-                    
-                    # Calculate totals
-                    total_sales = sum(sale.price * sale.quantity for sale in sales)
-                    
-                    # Calculate payment method totals
-                    payment_totals = {}
-                    for sale in sales:
-                        method = sale.payment_method
-                        if method not in payment_totals:
-                            payment_totals[method] = 0
-                        payment_totals[method] += sale.price * sale.quantity
-                    
-                    # Get product and service counts
-                    product_count = sum(1 for sale in sales if sale.product_id is not None)
-                    service_count = sum(1 for sale in sales if sale.service_id is not None)
-                    
-                    # Get customer counts
-                    customer_ids = {sale.customer_id for sale in sales if sale.customer_id}
-                    new_customers = sum(1 for cid in customer_ids if Customer.query.get(cid).created_at.date() == current_date.date())
-                    returning_customers = len(customer_ids) - new_customers
-                    
-                    # Calculate average transaction value
-                    avg_transaction = total_sales / len(sales) if sales else 0
-                    
-                    # Write data to worksheet
-                    worksheet.write(row, 0, date_str)
-                    worksheet.write(row, 1, total_sales)
-                    worksheet.write(row, 2, payment_totals.get('cash', 0))
-                    worksheet.write(row, 3, payment_totals.get('mpesa', 0))
-                    worksheet.write(row, 4, payment_totals.get('card', 0))
-                    worksheet.write(row, 5, payment_totals.get('other', 0))
-                    worksheet.write(row, 6, product_count)
-                    worksheet.write(row, 7, service_count)
-                    worksheet.write(row, 8, new_customers)
-                    worksheet.write(row, 9, returning_customers)
-                    worksheet.write(row, 10, avg_transaction)
-                    
-                except Exception as e:
-                    logger.error(f"Error processing date {date_str}: {str(e)}")
-                    # Write error message to worksheet
-                    worksheet.write(row, 0, date_str)
-                    worksheet.write(row, 1, f"Error: {str(e)}")
-                
-                current_date += timedelta(days=1)
-                row += 1
-            
-            # Add summary section
-            summary_row = row + 2
-            worksheet.write(summary_row, 0, 'Summary')
-            worksheet.write(summary_row + 1, 0, 'Total Sales')
-            worksheet.write(summary_row + 1, 1, f'=SUM(B2:B{row})')
-            worksheet.write(summary_row + 2, 0, 'Average Daily Sales')
-            worksheet.write(summary_row + 2, 1, f'=AVERAGE(B2:B{row})')
-            worksheet.write(summary_row + 3, 0, 'Total Products Sold')
-            worksheet.write(summary_row + 3, 1, f'=SUM(G2:G{row})')
-            worksheet.write(summary_row + 4, 0, 'Total Services Rendered')
-            worksheet.write(summary_row + 4, 1, f'=SUM(H2:H{row})')
-            worksheet.write(summary_row + 5, 0, 'Total New Customers')
-            worksheet.write(summary_row + 5, 1, f'=SUM(I2:I{row})')
-            worksheet.write(summary_row + 6, 0, 'Total Returning Customers')
-            worksheet.write(summary_row + 6, 1, f'=SUM(J2:J{row})')
-            
-            # Add charts
-            chart_sheet = workbook.add_worksheet(f'{shop.name} Charts')
-            
-            # Sales trend chart
-            sales_chart = workbook.add_chart({'type': 'line'})
-            sales_chart.add_series({
-                'name': 'Daily Sales',
-                'categories': f'={shop.name}!$A$2:$A${row}',
-                'values': f'={shop.name}!$B$2:$B${row}',
-            })
-            sales_chart.set_title({'name': 'Daily Sales Trend'})
-            sales_chart.set_x_axis({'name': 'Date'})
-            sales_chart.set_y_axis({'name': 'Amount (KES)'})
-            chart_sheet.insert_chart('A1', sales_chart)
-            
-            # Payment methods pie chart
-            payment_chart = workbook.add_chart({'type': 'pie'})
-            payment_chart.add_series({
-                'name': 'Payment Methods',
-                'categories': ['Cash', 'M-Pesa', 'Card', 'Other'],
-                'values': [
-                    f'=SUM({shop.name}!$C$2:$C${row})',
-                    f'=SUM({shop.name}!$D$2:$D${row})',
-                    f'=SUM({shop.name}!$E$2:$E${row})',
-                    f'=SUM({shop.name}!$F$2:$F${row})'
-                ],
-            })
-            payment_chart.set_title({'name': 'Payment Methods Distribution'})
-            chart_sheet.insert_chart('A17', payment_chart)
-            
-            # Customer type pie chart
-            customer_chart = workbook.add_chart({'type': 'pie'})
-            customer_chart.add_series({
-                'name': 'Customer Types',
-                'categories': ['New Customers', 'Returning Customers'],
-                'values': [
-                    f'=SUM({shop.name}!$I$2:$I${row})',
-                    f'=SUM({shop.name}!$J$2:$J${row})'
-                ],
-            })
-            customer_chart.set_title({'name': 'Customer Distribution'})
-            chart_sheet.insert_chart('I1', customer_chart)
-        
-        # Save the workbook
-        workbook.close()
-        output.seek(0)
-        
-        # Create the response
-        return send_file(
-            output,
-            mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
-            as_attachment=True,
-            download_name=f'sales_report_{start_date.strftime("%Y%m%d")}_{end_date.strftime("%Y%m%d")}.xlsx'
-        )
-        
+        return _enqueue_report_job('daily', {
+            'start_date': request.args.get('start_date'),
+            'end_date': request.args.get('end_date')
+        })
+
     except Exception as e:
         logger.error(f"Error generating report: {str(e)}")
         return jsonify({'error': str(e)}), 500
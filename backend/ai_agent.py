@@ -3,19 +3,22 @@ AI Chat Agent for Retail Analytics
 Provides intelligent insights and trend analysis for shop performance
 """
 
-import openai
-import google.generativeai as genai
 from dotenv import load_dotenv
 from pathlib import Path
 import json
 import logging
-from typing import Dict, List, Optional, Any, Tuple
+from typing import Dict, Iterator, List, Optional, Any, Tuple
 from datetime import datetime, timedelta
-import os
-from database import db, Shop, Sale, Product, Service, ServiceSale, Expense, FinancialRecord
-from database.models import Inventory, User, ResourceUpdate
-from sqlalchemy import func
+from database import db, Sale, Product, Service, ServiceSale, Expense, FinancialRecord
+from database.models import Inventory, User, ResourceUpdate, ProductAlert
+from sqlalchemy import and_, extract, func
 from ocr_service import ocr_analyzer
+from alert_engine import low_stock_products
+from ai_providers import ProviderRouter, providers_from_env
+from intent_router import IntentRouter
+from kpi_cache import kpi_cache
+from llm_cache import cache_key, llm_cache
+from performance_snapshots import performance_snapshots
 import matplotlib.pyplot as plt
 import seaborn as sns
 import plotly.graph_objects as go
@@ -24,6 +27,31 @@ from plotly.utils import PlotlyJSONEncoder
 
 logger = logging.getLogger(__name__)
 
+# Phrases (matched as lower-cased substrings) that route a chat message to a structured answer
+STRUCTURED_QUERY_INTENTS = {
+    'employees': ["how many employees", "employee count", "number of employees"],
+    'products': ["how many products", "product count", "number of products", "total products"],
+    'low_stock': ["low stock", "reorder", "below reorder", "stock low"],
+    'stock_updates': ["updating stock", "updating stocks", "stock updates", "who updated stock", "who updated stocks"],
+    'financial': ["revenue", "sales", "turnover", "profit", "expense", "expenses", "summary"],
+    'units_sold': ["products sold", "items sold", "units sold"],
+    'services_sold': ["services sold", "service count", "service transactions"],
+    'top_services': ["top service", "best service", "popular service"],
+    'average_sale': ["average sale", "avg sale", "avg transaction"],
+    'recent_products': ["recent products", "latest products"],
+    'low_stock_list': ["low stock products", "which are low stock", "list low stock"],
+    'top_categories': ["top category", "best category"],
+    'peak_hours': ["peak hours", "busy hours", "hourly distribution"],
+    # Period qualifiers, not answers on their own
+    'today': ["today"],
+    'week': ["week"],
+    'month': ["month"],
+}
+ANSWER_INTENTS = frozenset(STRUCTURED_QUERY_INTENTS) - {'today', 'week', 'month'}
+FACT_SHEET_INTENTS = frozenset({'employees', 'products', 'low_stock', 'financial', 'units_sold',
+                                'services_sold', 'average_sale'})
+STRUCTURED_QUERY_ROUTER = IntentRouter(STRUCTURED_QUERY_INTENTS)
+
 class RetailAIAgent:
     """AI Agent for retail analytics and insights"""
     
@@ -42,39 +70,15 @@ class RetailAIAgent:
             load_dotenv(dotenv_path=backend_env)
         except Exception:
             pass
-        api_key = os.getenv('OPENAI_API_KEY')
-        gemini_key = os.getenv('GEMINI_API_KEY')
-        if api_key and api_key != 'sk-placeholder-key':
-            self.client = openai.OpenAI(api_key=api_key)
-            self.model = "gpt-4o-mini"
-        elif gemini_key:
-            try:
-                genai.configure(api_key=gemini_key)
-                self.client = None
-                # Dynamically select a supported Gemini model
-                self.model = self._select_gemini_model() or "models/gemini-1.5-pro"
-                logger.info(f"Gemini configured as AI backend. Using model: {self.model}")
-            except Exception as e:
-                logger.error(f"Failed to configure Gemini: {e}")
-                self.client = None
-                self.model = "gpt-4o-mini"
-        else:
-            self.client = None
-            self.model = "gpt-4o-mini"
+        # Generative providers (OpenAI, then Gemini) behind deadlines and circuit breakers
+        self.providers = ProviderRouter(providers_from_env())
+        if not self.providers:
             logger.warning("No AI key found; AI chat disabled until key is set.")
         self.conversation_history = []
 
     def _ensure_client(self) -> bool:
-        """Attempt to (re)initialize OpenAI client from environment at runtime."""
-        if self.client is not None or os.getenv('GEMINI_API_KEY'):
-            # Ensure Gemini has a valid model name if it's the selected backend
-            if self.client is None and 'gemini' in (self.model or '').lower():
-                try:
-                    selected = self._select_gemini_model()
-                    if selected:
-                        self.model = selected
-                except Exception:
-                    pass
+        """Whether a generative provider is configured, re-reading the environment if none was."""
+        if self.providers:
             return True
         # Reload .env in case it was added after process start (both locations)
         try:
@@ -87,138 +91,44 @@ class RetailAIAgent:
             load_dotenv(dotenv_path=backend_env)
         except Exception:
             pass
-        api_key = os.getenv('OPENAI_API_KEY')
-        gemini_key = os.getenv('GEMINI_API_KEY')
-        if api_key and api_key != 'sk-placeholder-key':
-            try:
-                self.client = openai.OpenAI(api_key=api_key)
-                logger.info("OPENAI client initialized at runtime.")
-                return True
-            except Exception as e:
-                logger.error(f"Failed to initialize OpenAI client: {e}")
-        if gemini_key:
-            try:
-                genai.configure(api_key=gemini_key)
-                # Ensure model is valid
-                self.model = self._select_gemini_model() or self.model or "models/gemini-1.5-pro"
-                logger.info(f"Gemini initialized at runtime. Using model: {self.model}")
-                return True
-            except Exception as e:
-                logger.error(f"Failed to initialize Gemini: {e}")
-        return False
-
-    def _select_gemini_model(self) -> Optional[str]:
-        """Pick a supported Gemini model for generateContent, preferring flash variants.
-
-        Returns full model name (e.g., "models/gemini-1.5-flash"), or None if unavailable.
-        """
-        try:
-            models = list(genai.list_models())
-        except Exception as e:
-            logger.error(f"Failed to list Gemini models: {e}")
-            return None
-
-        def supports_generate(m) -> bool:
-            try:
-                methods = getattr(m, 'supported_generation_methods', None)
-                if not methods:
-                    return False
-                # Some SDK versions store methods as list of strings
-                return any(str(x).lower() in ("generatecontent", "streamgeneratecontent") for x in methods)
-            except Exception:
-                return False
-
-        # Prefer flash variants, then pro
-        preferred_order = [
-            'models/gemini-1.5-flash',
-            'models/gemini-1.5-flash-001',
-            'models/gemini-1.5-flash-latest',
-            'models/gemini-1.5-flash-8b',
-            'models/gemini-1.5-pro',
-            'models/gemini-1.5-pro-001',
-            'models/gemini-1.0-pro',
-            'models/gemini-pro'
-        ]
-
-        name_to_model = {getattr(m, 'name', ''): m for m in models if supports_generate(m)}
-        for name in preferred_order:
-            if name in name_to_model:
-                return name
-        # Fallback to any generate-capable model
-        for name in name_to_model.keys():
-            return name
-        return None
+        providers = providers_from_env()
+        if providers:
+            self.providers = ProviderRouter(providers)
+            logger.info(f"AI providers initialized at runtime: {', '.join(p.name for p in providers)}")
+        return bool(providers)
     
     def analyze_shop_performance(self, shop_id: int, time_period: str = "30d") -> Dict[str, Any]:
         """Analyze overall shop performance"""
         try:
-            shop = Shop.query.get(shop_id)
-            if not shop:
+            # Day-bucketed aggregates shared by every caller, refreshed from the latest day on writes
+            snapshot = performance_snapshots.get(shop_id, time_period)
+            if snapshot is None:
                 return {"error": "Shop not found"}
-            
-            # Calculate time range (use local naive to match stored timestamps)
-            end_date = datetime.now()
-            if time_period == "7d":
-                start_date = end_date - timedelta(days=7)
-            elif time_period == "30d":
-                start_date = end_date - timedelta(days=30)
-            elif time_period == "90d":
-                start_date = end_date - timedelta(days=90)
-            else:
-                start_date = end_date - timedelta(days=30)
-            
-            # Get sales data
-            sales = Sale.query.filter(
-                Sale.shop_id == shop_id,
-                Sale.sale_date >= start_date,
-                Sale.sale_date <= end_date
-            ).all()
-            
-            # Get service sales
-            service_sales = ServiceSale.query.filter(
-                ServiceSale.shop_id == shop_id,
-                ServiceSale.sale_date >= start_date,
-                ServiceSale.sale_date <= end_date
-            ).all()
-            
-            # Get expenses
-            expenses = Expense.query.filter(
-                Expense.shop_id == shop_id,
-                Expense.date >= start_date,
-                Expense.date <= end_date
-            ).all()
-            
-            # Calculate metrics
-            total_sales_revenue = sum(float(sale.total or 0) for sale in sales)
-            total_service_revenue = sum(float(sale.price or 0) for sale in service_sales)
-            total_revenue = float(total_sales_revenue + total_service_revenue)
-            total_expenses = sum(float(expense.amount or 0) for expense in expenses)
+            daily_sales = snapshot['daily_sales']
+            daily_services = snapshot['daily_services']
+
+            total_revenue = sum(daily_sales.values()) + sum(daily_services.values())
+            total_expenses = snapshot['total_expenses']
             net_profit = total_revenue - total_expenses
-            
-            # Product performance
-            product_sales = {}
-            for sale in sales:
-                product_name = sale.product.name if sale.product else "Unknown"
-                if product_name not in product_sales:
-                    product_sales[product_name] = {'quantity': 0, 'revenue': 0}
-                product_sales[product_name]['quantity'] += sale.quantity
-                product_sales[product_name]['revenue'] += sale.total
-            
+
             # Top performing products
-            top_products = sorted(product_sales.items(), 
-                                key=lambda x: x[1]['revenue'], reverse=True)[:5]
-            
+            top_products = sorted(
+                ((name, dict(totals)) for name, totals in snapshot['products'].items()),
+                key=lambda item: item[1]['revenue'], reverse=True
+            )[:5]
+
             analysis = {
-                'shop_name': shop.name,
+                'shop_name': snapshot['shop_name'],
                 'time_period': time_period,
                 'total_revenue': total_revenue,
                 'total_expenses': total_expenses,
                 'net_profit': net_profit,
                 'profit_margin': (net_profit / total_revenue * 100) if total_revenue > 0 else 0,
-                'total_sales_count': len(sales) + len(service_sales),
+                'total_sales_count': snapshot['sales_count'] + snapshot['service_count'],
                 'top_products': top_products,
-                'sales_trend': self._calculate_sales_trend(sales, time_period),
-                'revenue_by_day': self._get_revenue_by_day(sales, service_sales, start_date, end_date)
+                'sales_trend': self._calculate_sales_trend(daily_sales, time_period),
+                'revenue_by_day': self._get_revenue_by_day(daily_sales, daily_services,
+                                                           snapshot['start_date'], snapshot['end_date'])
             }
             
             return analysis
@@ -226,18 +136,16 @@ class RetailAIAgent:
             logger.error(f"Error analyzing shop performance: {str(e)}")
             return {"error": str(e)}
     
-    def _calculate_sales_trend(self, sales: List, time_period: str) -> str:
+    def _calculate_sales_trend(self, daily_sales: Dict[str, float], time_period: str) -> str:
         """Calculate sales trend direction"""
-        if len(sales) < 2:
+        if len(daily_sales) < 2:
             return "insufficient_data"
         
         # Group sales by week
         weekly_sales = {}
-        for sale in sales:
-            week = sale.sale_date.isocalendar()[1]
-            if week not in weekly_sales:
-                weekly_sales[week] = 0
-                weekly_sales[week] += float(sale.total or 0)
+        for date_str, total in daily_sales.items():
+            week = datetime.strptime(date_str, '%Y-%m-%d').isocalendar()[1]
+            weekly_sales[week] = weekly_sales.get(week, 0) + total
         
         if len(weekly_sales) < 2:
             return "insufficient_data"
@@ -254,28 +162,17 @@ class RetailAIAgent:
         else:
             return "stable"
     
-    def _get_revenue_by_day(self, sales: List, service_sales: List, start_date: datetime, end_date: datetime) -> Dict:
+    def _get_revenue_by_day(self, daily_sales: Dict[str, float], daily_services: Dict[str, float],
+                            start_date: datetime, end_date: datetime) -> Dict:
         """Get daily revenue breakdown"""
         daily_revenue = {}
         current_date = start_date
         
         while current_date <= end_date:
             date_str = current_date.strftime('%Y-%m-%d')
-            daily_revenue[date_str] = 0
+            daily_revenue[date_str] = daily_sales.get(date_str, 0) + daily_services.get(date_str, 0)
             current_date += timedelta(days=1)
         
-        # Add sales revenue
-        for sale in sales:
-            date_str = sale.sale_date.strftime('%Y-%m-%d')
-            if date_str in daily_revenue:
-                daily_revenue[date_str] += float(sale.total or 0)
-        
-        # Add service revenue
-        for sale in service_sales:
-            date_str = sale.sale_date.strftime('%Y-%m-%d')
-            if date_str in daily_revenue:
-                daily_revenue[date_str] += float(sale.price or 0)
-        
         return daily_revenue
     
     def generate_insights(self, analysis: Dict[str, Any]) -> List[str]:
@@ -326,45 +223,97 @@ class RetailAIAgent:
             logger.error(f"Error generating insights: {str(e)}")
             return [f"Error generating insights: {str(e)}"]
     
-    def chat_with_agent(self, message: str, shop_id: int, context: Dict = None) -> str:
-        """Chat with AI agent for retail insights"""
+    def _build_chat_prompt(self, shop_id: int, context: Dict = None,
+                           performance_data: Dict[str, Any] = None) -> Tuple[str, Dict[str, Any], Dict[str, Any]]:
+        """System prompt, its context data and the performance analysis for a chat turn."""
+        # Get current shop performance data
+        if performance_data is None:
+            performance_data = self.analyze_shop_performance(shop_id)
+        insights = self.generate_insights(performance_data)
+
+        # Prepare context for AI (include recent memory if provided)
+        context_data = {
+            "shop_performance": performance_data,
+            "insights": insights,
+            "timestamp": datetime.utcnow().isoformat()
+        }
+        if context and isinstance(context, dict):
+            recent_text = context.get("recent")
+            if recent_text:
+                context_data["recent_conversation"] = recent_text
+            recalled_text = context.get("recalled")
+            if recalled_text:
+                context_data["related_past_conversation"] = recalled_text
+
+        # Create system prompt
+        system_prompt = f"""
+        You are an AI retail analytics assistant for SmartRetail AI. 
+        You help shop administrators understand their business performance through data analysis and insights.
+
+        Current Shop Performance Data:
+        {json.dumps(context_data, indent=2)}
+
+        Provide helpful, actionable insights based on the data. Be conversational but professional.
+        Focus on:
+        - Revenue and profit analysis
+        - Sales trends and patterns
+        - Product performance
+        - Recommendations for improvement
+        - Answer specific questions about the data
+        """
+        return system_prompt, context_data, performance_data
+
+    def _local_chat_fallback(self, message: str, context: Optional[Dict], performance_data: Dict[str, Any]) -> str:
+        """Answer without a generative backend. If the user didn't ask an analytics question, avoid repeating summaries."""
+        msg_lower = (message or "").lower()
+        analytic_triggers = [
+            "revenue","sales","turnover","profit","expense","expenses","summary",
+            "products sold","units sold","services sold","top","trend","peak","low stock","inventory"
+        ]
+        asked_analytics = any(k in msg_lower for k in analytic_triggers)
+        if not asked_analytics:
+            # Conversational fallback using recent context if available
+            recent_text = (context or {}).get("recent") if isinstance(context, dict) else None
+            recall_line = ""
+            if recent_text:
+                # Take the last non-empty line as a brief recall
+                try:
+                    parts = [p.strip() for p in recent_text.split("\n") if p.strip()]
+                    if parts:
+                        recall_line = f"I recall: {parts[-1][:180]}"  # keep short
+                except Exception:
+                    pass
+            guide = "You can ask things like 'What are today's sales?', 'Top products this week', or 'Any items low in stock?'."
+            return (recall_line+"\n" if recall_line else "") + guide
+        else:
+            # Provide succinct local analytics summary
+            lines = [
+                f"Financial ({performance_data.get('time_period','this period')}): Revenue=KES {performance_data.get('total_revenue', 0):,.2f}, Expenses=KES {performance_data.get('total_expenses', 0):,.2f}, Profit=KES {performance_data.get('net_profit', 0):,.2f}"
+            ]
+            # Units/services counts (best-effort)
+            if performance_data.get('total_sales_count') is not None:
+                lines.append(f"Transactions: {int(performance_data['total_sales_count'])}")
+            if performance_data.get('sales_trend'):
+                lines.append(f"Trend: {performance_data['sales_trend']}")
+            if performance_data.get('top_products'):
+                tp = performance_data['top_products'][0]
+                lines.append(f"Top product: {tp[0]}")
+            return "\n".join(lines)
+
+    def chat_with_agent(self, message: str, shop_id: int, context: Dict = None,
+                        performance_data: Dict[str, Any] = None) -> str:
+        """Chat with AI agent for retail insights
+
+        Callers that already hold the shop's analysis pass it as
+        `performance_data` to avoid deriving it again.
+        """
         try:
             # Try to directly answer common DB questions BEFORE any AI calls
             direct = self._answer_structured_query(message, shop_id)
             if direct:
                 return direct
 
-            # Get current shop performance data
-            performance_data = self.analyze_shop_performance(shop_id)
-            insights = self.generate_insights(performance_data)
-            
-            # Prepare context for AI (include recent memory if provided)
-            context_data = {
-                "shop_performance": performance_data,
-                "insights": insights,
-                "timestamp": datetime.utcnow().isoformat()
-            }
-            if context and isinstance(context, dict):
-                recent_text = context.get("recent")
-                if recent_text:
-                    context_data["recent_conversation"] = recent_text
-            
-            # Create system prompt
-            system_prompt = f"""
-            You are an AI retail analytics assistant for SmartRetail AI. 
-            You help shop administrators understand their business performance through data analysis and insights.
-            
-            Current Shop Performance Data:
-            {json.dumps(context_data, indent=2)}
-            
-            Provide helpful, actionable insights based on the data. Be conversational but professional.
-            Focus on:
-            - Revenue and profit analysis
-            - Sales trends and patterns
-            - Product performance
-            - Recommendations for improvement
-            - Answer specific questions about the data
-            """
+            system_prompt, context_data, performance_data = self._build_chat_prompt(shop_id, context, performance_data)
             
             # Add to conversation history
             self.conversation_history.append({
@@ -374,69 +323,21 @@ class RetailAIAgent:
             })
             
             # If AI backend available, attempt a generative answer; else fall back to local insights
-            ai_available = self.client is not None or self._ensure_client()
             ai_response = None
-            if ai_available:
-                try:
-                    if self.client is not None:
-                        # OpenAI
-                        response = self.client.chat.completions.create(
-                            model=self.model,
-                            messages=[
-                                {"role": "system", "content": system_prompt},
-                                {"role": "user", "content": message}
-                            ],
-                            max_tokens=500,
-                            temperature=0.7
-                        )
-                        ai_response = response.choices[0].message.content
-                    else:
-                        # Gemini
-                        model = genai.GenerativeModel(self.model)
-                        resp = model.generate_content([
-                            {"text": system_prompt},
-                            {"text": message}
-                        ])
-                        ai_response = (resp.text or "").strip()
-                except Exception as gen_err:
-                    logger.error(f"Generative backend error: {gen_err}")
+            if self._ensure_client():
+                # Same question against the same data and model: reuse the earlier answer
+                ai_response = llm_cache.get(cache_key(message, *self.providers.signature, context_data))
+                if not ai_response:
+                    try:
+                        ai_response, answered_by = self.providers.complete(system_prompt, message)
+                        # Keyed by the provider that answered, which after a failover is not the primary
+                        llm_cache.set(cache_key(message, *self.providers.signature_of(answered_by), context_data),
+                                      ai_response)
+                    except Exception as gen_err:
+                        logger.error(f"Generative backend error: {gen_err}")
 
             if not ai_response:
-                # Local fallback. If the user didn't ask an analytics question, avoid repeating summaries.
-                msg_lower = (message or "").lower()
-                analytic_triggers = [
-                    "revenue","sales","turnover","profit","expense","expenses","summary",
-                    "products sold","units sold","services sold","top","trend","peak","low stock","inventory"
-                ]
-                asked_analytics = any(k in msg_lower for k in analytic_triggers)
-                if not asked_analytics:
-                    # Conversational fallback using recent context if available
-                    recent_text = (context or {}).get("recent") if isinstance(context, dict) else None
-                    recall_line = ""
-                    if recent_text:
-                        # Take the last non-empty line as a brief recall
-                        try:
-                            parts = [p.strip() for p in recent_text.split("\n") if p.strip()]
-                            if parts:
-                                recall_line = f"I recall: {parts[-1][:180]}"  # keep short
-                        except Exception:
-                            pass
-                    guide = "You can ask things like 'What are today's sales?', 'Top products this week', or 'Any items low in stock?'."
-                    ai_response = (recall_line+"\n" if recall_line else "") + guide
-                else:
-                    # Provide succinct local analytics summary
-                    lines = [
-                        f"Financial ({performance_data.get('time_period','this period')}): Revenue=KES {performance_data.get('total_revenue', 0):,.2f}, Expenses=KES {performance_data.get('total_expenses', 0):,.2f}, Profit=KES {performance_data.get('net_profit', 0):,.2f}"
-                    ]
-                    # Units/services counts (best-effort)
-                    if performance_data.get('total_sales_count') is not None:
-                        lines.append(f"Transactions: {int(performance_data['total_sales_count'])}")
-                    if performance_data.get('sales_trend'):
-                        lines.append(f"Trend: {performance_data['sales_trend']}")
-                    if performance_data.get('top_products'):
-                        tp = performance_data['top_products'][0]
-                        lines.append(f"Top product: {tp[0]}")
-                    ai_response = "\n".join(lines)
+                ai_response = self._local_chat_fallback(message, context, performance_data)
             
             # Add to conversation history
             self.conversation_history.append({
@@ -450,51 +351,63 @@ class RetailAIAgent:
         except Exception as e:
             err_text = str(e)
             logger.error(f"Error in chat with agent: {err_text}")
-            # Graceful fallback if quota exceeded or API unavailable
-            if 'insufficient_quota' in err_text or 'You exceeded your current quota' in err_text or '429' in err_text:
-                # Try Gemini as secondary if available
-                try:
-                    gemini_key = os.getenv('GEMINI_API_KEY')
-                    if gemini_key:
-                        genai.configure(api_key=gemini_key)
-                        selected = self._select_gemini_model() or 'models/gemini-1.5-pro'
-                        model = genai.GenerativeModel(selected)
-                        resp = model.generate_content([
-                            {"text": system_prompt},
-                            {"text": message}
-                        ])
-                        ai_text = (resp.text or '').strip()
-                        if ai_text:
-                            return ai_text
-                except Exception as ge:
-                    logger.error(f"Gemini fallback failed: {ge}")
-                try:
-                    fallback = self.analyze_shop_performance(shop_id)
-                    insights = self.generate_insights(fallback)
-                    summary_lines = [
-                        "AI cloud service is unavailable (quota/keys). Showing local insights instead:",
-                    ]
-                    if 'total_revenue' in fallback:
-                        summary_lines.append(f"- Total Revenue: ${fallback.get('total_revenue', 0):,.2f}")
-                    if 'net_profit' in fallback:
-                        summary_lines.append(f"- Net Profit: ${fallback.get('net_profit', 0):,.2f}")
-                    if 'profit_margin' in fallback:
-                        summary_lines.append(f"- Profit Margin: {fallback.get('profit_margin', 0):.1f}%")
-                    if fallback.get('sales_trend'):
-                        summary_lines.append(f"- Sales Trend: {fallback['sales_trend']}")
-                    if fallback.get('top_products'):
-                        tp = fallback['top_products'][0]
-                        summary_lines.append(f"- Top Product: {tp[0]} (${tp[1]['revenue']:,.2f})")
-                    if insights:
-                        summary_lines.append("- Insights:")
-                        for s in insights[:5]:
-                            summary_lines.append(f"  • {s}")
-                    summary_lines.append("Set a valid OPENAI_API_KEY or GEMINI_API_KEY to re-enable full AI chat.")
-                    return "\n".join(summary_lines)
-                except Exception as _:
-                    return "AI cloud service quota exceeded and local fallback failed. Please check API billing or try again later."
             return f"I apologize, but I encountered an error: {err_text}. Please try again."
     
+    def stream_chat_with_agent(self, message: str, shop_id: int, context: Dict = None) -> Iterator[str]:
+        """Like `chat_with_agent`, but yields the answer in pieces as the provider streams it.
+
+        Structured, cached and local fallback answers arrive as a single piece.
+        If the provider fails before its first token the local fallback is
+        yielded instead. A failure mid-stream raises RuntimeError after the
+        pieces already yielded, and the partial answer is not cached.
+        """
+        direct = self._answer_structured_query(message, shop_id)
+        if direct:
+            yield direct
+            return
+
+        system_prompt, context_data, performance_data = self._build_chat_prompt(shop_id, context)
+        self.conversation_history.append({
+            "role": "user",
+            "content": message,
+            "timestamp": datetime.utcnow().isoformat()
+        })
+
+        pieces: List[str] = []
+        interrupted = None
+        if self._ensure_client():
+            cached = llm_cache.get(cache_key(message, *self.providers.signature, context_data))
+            if cached:
+                pieces.append(cached)
+                yield cached
+            else:
+                answered_by = None
+                try:
+                    for piece, answered_by in self.providers.stream(system_prompt, message):
+                        pieces.append(piece)
+                        yield piece
+                except Exception as gen_err:
+                    logger.error(f"Generative backend error while streaming: {gen_err}")
+                    if pieces:
+                        interrupted = gen_err
+                # Only a stream that finished normally is a whole answer worth reusing
+                if pieces and interrupted is None:
+                    llm_cache.set(cache_key(message, *self.providers.signature_of(answered_by), context_data),
+                                  "".join(pieces))
+
+        if not pieces:
+            fallback = self._local_chat_fallback(message, context, performance_data)
+            pieces.append(fallback)
+            yield fallback
+
+        self.conversation_history.append({
+            "role": "assistant",
+            "content": "".join(pieces),
+            "timestamp": datetime.utcnow().isoformat()
+        })
+        if interrupted is not None:
+            raise RuntimeError(f"Answer interrupted: {interrupted}") from interrupted
+
     def analyze_uploaded_chart(self, image_path: str, shop_id: int) -> Dict[str, Any]:
         """Analyze uploaded chart/graph image"""
         try:
@@ -610,142 +523,106 @@ class RetailAIAgent:
     # =====================
     # Structured DB answers
     # =====================
+    def _shop_fact_sheet(self, shop_id: int, start: datetime, end: datetime) -> Dict[str, Any]:
+        """Every scalar fact the structured answers use, in one round trip (one SELECT of subqueries)."""
+        def scalar(query, name):
+            return query.scalar_subquery().label(name)
+
+        sales = (Sale.shop_id == shop_id, Sale.sale_date >= start, Sale.sale_date <= end)
+        services = (ServiceSale.shop_id == shop_id, ServiceSale.sale_date >= start, ServiceSale.sale_date <= end)
+        row = db.session.query(
+            scalar(db.session.query(func.count(User.id)).filter(User.role == 'employee', User.shop_id == shop_id), 'employees'),
+            scalar(db.session.query(func.count(Product.id)).filter(Product.shop_id == shop_id), 'products'),
+            scalar(db.session.query(func.count(ProductAlert.id))
+                   .filter(ProductAlert.shop_id == shop_id, ProductAlert.is_active.is_(True)), 'low_stock'),
+            scalar(db.session.query(func.coalesce(func.sum(Sale.line_total), 0.0)).filter(*sales), 'product_revenue'),
+            scalar(db.session.query(func.coalesce(func.sum(Sale.quantity), 0)).filter(*sales), 'units_sold'),
+            scalar(db.session.query(func.count(Sale.id)).filter(*sales), 'sales_count'),
+            scalar(db.session.query(func.coalesce(func.sum(ServiceSale.price), 0.0)).filter(*services), 'service_revenue'),
+            scalar(db.session.query(func.count(ServiceSale.id)).filter(*services), 'service_count'),
+            scalar(db.session.query(func.coalesce(func.sum(Expense.amount), 0.0))
+                   .filter(Expense.shop_id == shop_id, Expense.date >= start, Expense.date <= end), 'expenses'),
+        ).one()
+        return {key: value or 0 for key, value in row._asdict().items()}
+
     def _answer_structured_query(self, message: str, shop_id: int) -> Optional[str]:
         """Heuristically detect common analytics questions and answer from DB immediately.
 
-        Supports:
-        - employee count
-        - product count
-        - low stock count
-        - stock/resource updates in last 24h and by whom
-        - revenue/expenses for today, week, month
-        - products sold count and services sold count
-        - service revenue and top services
+        The message is routed to intents in one pass of STRUCTURED_QUERY_ROUTER.
+        Counts, revenue, expenses, profit, units sold and average sale all come
+        from one cached per-(shop, period) fact sheet; list answers (top
+        services and categories, recent and low-stock products, stock
+        updaters, peak hours) run one query each.
         """
         try:
-            msg = (message or "").lower()
+            intents = STRUCTURED_QUERY_ROUTER.match(message)
+            if not intents.intersection(ANSWER_INTENTS):
+                return None
             answers: List[str] = []
 
-            # Helper to pick period
-            def period_range() -> Tuple[datetime, datetime, str]:
-                now = datetime.utcnow()
-                label = 'last 30 days'
-                if 'today' in msg:
-                    start = datetime(now.year, now.month, now.day)
-                    end = now
-                    label = 'today'
-                elif 'week' in msg or 'this week' in msg:
-                    # start of ISO week (Monday)
-                    dow = (now.weekday())
-                    start = datetime(now.year, now.month, now.day) - timedelta(days=dow)
-                    end = now
-                    label = 'this week'
-                elif 'month' in msg or 'this month' in msg:
-                    start = datetime(now.year, now.month, 1)
-                    end = now
-                    label = 'this month'
-                else:
-                    start = now - timedelta(days=30)
-                    end = now
-                return start, end, label
-
-            start, end, period_label = period_range()
-
-            # Employees count
-            if any(k in msg for k in ["how many employees", "employee count", "number of employees"]):
-                employees_count = User.query.filter_by(role='employee', shop_id=shop_id).count()
-                answers.append(f"Employees: {employees_count}")
-
-            # Product count
-            if any(k in msg for k in ["how many products", "product count", "number of products", "total products"]):
-                products_count = Product.query.filter_by(shop_id=shop_id).count()
-                answers.append(f"Products: {products_count}")
-
-            # Low stock items (Inventory quantity < Product.reorder_level)
-            if any(k in msg for k in ["low stock", "reorder", "below reorder", "stock low"]):
-                low_count = (
-                    db.session.query(Inventory)
-                    .join(Product, Product.id == Inventory.product_id)
-                    .filter(Inventory.shop_id == shop_id)
-                    .filter(Inventory.quantity < Product.reorder_level)
-                    .count()
-                )
-                answers.append(f"Low stock items: {low_count}")
+            # Period named in the message
+            now = datetime.utcnow()
+            if 'today' in intents:
+                start, period_label = datetime(now.year, now.month, now.day), 'today'
+            elif 'week' in intents:
+                # start of ISO week (Monday)
+                start, period_label = datetime(now.year, now.month, now.day) - timedelta(days=now.weekday()), 'this week'
+            elif 'month' in intents:
+                start, period_label = datetime(now.year, now.month, 1), 'this month'
+            else:
+                start, period_label = now - timedelta(days=30), 'last 30 days'
+            end = now
+
+            facts = {}
+            if intents.intersection(FACT_SHEET_INTENTS):
+                facts = kpi_cache.get_or_set('ai.fact_sheet', [shop_id],
+                                             lambda: self._shop_fact_sheet(shop_id, start, end),
+                                             params=(period_label,))
+
+            if 'employees' in intents:
+                answers.append(f"Employees: {facts['employees']}")
+
+            if 'products' in intents:
+                answers.append(f"Products: {facts['products']}")
+
+            # Low stock items (active alerts: Inventory quantity < Product.reorder_level)
+            if 'low_stock' in intents:
+                answers.append(f"Low stock items: {facts['low_stock']}")
 
             # Resource stock updates (last 24h) and active updaters
-            if any(k in msg for k in ["updating stock", "updating stocks", "stock updates", "who updated stock", "who updated stocks"]):
+            if 'stock_updates' in intents:
                 since = datetime.utcnow() - timedelta(hours=24)
-                recent_updates = (
-                    ResourceUpdate.query
-                    .filter(ResourceUpdate.shop_id == shop_id)
-                    .filter(ResourceUpdate.timestamp >= since)
-                    .all()
-                )
-                updates_count = len(recent_updates)
-                updater_ids = {}
-                for ru in recent_updates:
-                    updater_ids[ru.updated_by] = updater_ids.get(ru.updated_by, 0) + 1
+                updaters = (
+                    db.session.query(User.name, func.count(ResourceUpdate.id))
+                    .outerjoin(User, User.id == ResourceUpdate.updated_by)
+                    .filter(ResourceUpdate.shop_id == shop_id, ResourceUpdate.timestamp >= since)
+                    .group_by(ResourceUpdate.updated_by, User.name)
+                    .order_by(func.count(ResourceUpdate.id).desc())
+                ).all()
+                updates_count = sum(count for _, count in updaters)
                 if updates_count == 0:
                     answers.append("Stock/resource updates in last 24h: 0")
                 else:
-                    # Map to names
-                    names = []
-                    for uid, c in sorted(updater_ids.items(), key=lambda x: x[1], reverse=True):
-                        u = User.query.get(uid)
-                        if u:
-                            names.append(f"{u.name} ({c})")
+                    names = [f"{name} ({count})" for name, count in updaters if name]
                     answers.append(f"Stock/resource updates in last 24h: {updates_count}. By: {', '.join(names)}")
 
             # Revenue (products + services) and expenses for period
-            if any(k in msg for k in ["revenue", "sales", "turnover", "profit", "expense", "expenses", "summary"]):
-                # Product revenue
-                prod_rev = (
-                    db.session.query(func.coalesce(func.sum(Sale.quantity * Product.marked_price), 0.0))
-                    .join(Product, Product.id == Sale.product_id)
-                    .filter(Sale.shop_id == shop_id)
-                    .filter(Sale.sale_date >= start)
-                    .filter(Sale.sale_date <= end)
-                ).scalar() or 0.0
-                # Services revenue
-                svc_rev = (
-                    db.session.query(func.coalesce(func.sum(ServiceSale.price), 0.0))
-                    .filter(ServiceSale.shop_id == shop_id)
-                    .filter(ServiceSale.sale_date >= start)
-                    .filter(ServiceSale.sale_date <= end)
-                ).scalar() or 0.0
-                # Expenses
-                expenses_sum = (
-                    db.session.query(func.coalesce(func.sum(Expense.amount), 0.0))
-                    .filter(Expense.shop_id == shop_id)
-                    .filter(Expense.date >= start)
-                    .filter(Expense.date <= end)
-                ).scalar() or 0.0
-                total_rev = float(prod_rev) + float(svc_rev)
-                profit = total_rev - float(expenses_sum)
-                answers.append(f"Financial ({period_label}): Revenue=KES {total_rev:,.2f} (Products {float(prod_rev):,.2f} + Services {float(svc_rev):,.2f}), Expenses=KES {float(expenses_sum):,.2f}, Profit=KES {profit:,.2f}")
-
-            # Products sold count
-            if any(k in msg for k in ["products sold", "items sold", "units sold"]):
-                units = (
-                    db.session.query(func.coalesce(func.sum(Sale.quantity), 0))
-                    .filter(Sale.shop_id == shop_id)
-                    .filter(Sale.sale_date >= start)
-                    .filter(Sale.sale_date <= end)
-                ).scalar() or 0
-                answers.append(f"Products sold ({period_label}): {int(units)} units")
-
-            # Services sold count
-            if any(k in msg for k in ["services sold", "service count", "service transactions"]):
-                svc_count = (
-                    db.session.query(func.count(ServiceSale.id))
-                    .filter(ServiceSale.shop_id == shop_id)
-                    .filter(ServiceSale.sale_date >= start)
-                    .filter(ServiceSale.sale_date <= end)
-                ).scalar() or 0
-                answers.append(f"Services sold ({period_label}): {int(svc_count)}")
+            if 'financial' in intents:
+                prod_rev = float(facts['product_revenue'])
+                svc_rev = float(facts['service_revenue'])
+                expenses_sum = float(facts['expenses'])
+                total_rev = prod_rev + svc_rev
+                profit = total_rev - expenses_sum
+                answers.append(f"Financial ({period_label}): Revenue=KES {total_rev:,.2f} (Products {prod_rev:,.2f} + Services {svc_rev:,.2f}), Expenses=KES {expenses_sum:,.2f}, Profit=KES {profit:,.2f}")
+
+            if 'units_sold' in intents:
+                answers.append(f"Products sold ({period_label}): {int(facts['units_sold'])} units")
+
+            if 'services_sold' in intents:
+                answers.append(f"Services sold ({period_label}): {int(facts['service_count'])}")
 
             # Top services by revenue
-            if any(k in msg for k in ["top service", "best service", "popular service"]):
+            if 'top_services' in intents:
                 rows = (
                     db.session.query(Service.name, func.coalesce(func.sum(ServiceSale.price), 0.0).label('rev'))
                     .join(Service, Service.id == ServiceSale.service_id)
@@ -761,72 +638,47 @@ class RetailAIAgent:
                     answers.append(f"Top services ({period_label}): {top}")
 
             # Average sale (revenue / transactions)
-            if any(k in msg for k in ["average sale", "avg sale", "avg transaction"]):
-                prod_rev = (
-                    db.session.query(func.coalesce(func.sum(Sale.quantity * Product.marked_price), 0.0))
-                    .join(Product, Product.id == Sale.product_id)
-                    .filter(Sale.shop_id == shop_id, Sale.sale_date >= start, Sale.sale_date <= end)
-                ).scalar() or 0.0
-                svc_rev = (
-                    db.session.query(func.coalesce(func.sum(ServiceSale.price), 0.0))
-                    .filter(ServiceSale.shop_id == shop_id, ServiceSale.sale_date >= start, ServiceSale.sale_date <= end)
-                ).scalar() or 0.0
-                tx = (
-                    db.session.query(func.count(Sale.id))
-                    .filter(Sale.shop_id == shop_id, Sale.sale_date >= start, Sale.sale_date <= end)
-                ).scalar() or 0
-                tx += (
-                    db.session.query(func.count(ServiceSale.id))
-                    .filter(ServiceSale.shop_id == shop_id, ServiceSale.sale_date >= start, ServiceSale.sale_date <= end)
-                ).scalar() or 0
-                avg = (float(prod_rev) + float(svc_rev)) / tx if tx else 0.0
+            if 'average_sale' in intents:
+                tx = facts['sales_count'] + facts['service_count']
+                avg = (float(facts['product_revenue']) + float(facts['service_revenue'])) / tx if tx else 0.0
                 answers.append(f"Average sale ({period_label}): KES {avg:,.2f} from {tx} transactions")
 
-            # Recent products
-            if any(k in msg for k in ["recent products", "latest products"]):
+            # Recent products with their stock in this shop
+            if 'recent_products' in intents:
                 recent = (
-                    Product.query.filter_by(shop_id=shop_id)
+                    db.session.query(Product.name, Product.category, Product.marked_price,
+                                     func.coalesce(func.sum(Inventory.quantity), 0))
+                    .outerjoin(Inventory, and_(Inventory.product_id == Product.id, Inventory.shop_id == shop_id))
+                    .filter(Product.shop_id == shop_id)
+                    .group_by(Product.id, Product.name, Product.category, Product.marked_price, Product.created_at)
                     .order_by(Product.created_at.desc())
-                    .limit(5).all()
-                )
-                items = []
-                for p in recent:
-                    qty = (
-                        db.session.query(func.coalesce(func.sum(Inventory.quantity), 0))
-                        .filter(Inventory.product_id == p.id, Inventory.shop_id == shop_id)
-                    ).scalar() or 0
-                    items.append(f"{p.name} ({p.category}) @ KES {float(p.marked_price):,.2f}, stock {int(qty)}")
+                    .limit(5)
+                ).all()
+                items = [f"{name} ({category}) @ KES {float(price):,.2f}, stock {int(qty)}"
+                         for name, category, price, qty in recent]
                 if items:
                     answers.append("Recent products: " + "; ".join(items))
 
             # Low stock products list
-            if any(k in msg for k in ["low stock products", "which are low stock", "list low stock"]):
-                lows = (
-                    db.session.query(Product)
-                    .join(Inventory, Inventory.product_id == Product.id)
-                    .filter(Product.shop_id == shop_id)
-                    .filter(Inventory.quantity < Product.reorder_level)
-                    .group_by(Product.id)
-                    .limit(10).all()
-                )
+            if 'low_stock_list' in intents:
+                lows = low_stock_products([shop_id], limit=10)
                 if lows:
-                    items = []
-                    for p in lows:
-                        qty = (
-                            db.session.query(func.coalesce(func.sum(Inventory.quantity), 0))
-                            .filter(Inventory.product_id == p.id, Inventory.shop_id == shop_id)
-                        ).scalar() or 0
-                        items.append(f"{p.name} (stock {int(qty)})")
-                    answers.append("Low stock: " + ", ".join(items))
+                    stock = dict(
+                        db.session.query(Inventory.product_id, func.coalesce(func.sum(Inventory.quantity), 0))
+                        .filter(Inventory.shop_id == shop_id, Inventory.product_id.in_([p.id for p in lows]))
+                        .group_by(Inventory.product_id)
+                    )
+                    answers.append("Low stock: " + ", ".join(f"{p.name} (stock {int(stock.get(p.id, 0))})" for p in lows))
 
             # Top product category by revenue (period)
-            if any(k in msg for k in ["top category", "best category"]):
+            if 'top_categories' in intents:
+                category_revenue = func.coalesce(func.sum(Sale.line_total), 0.0)
                 rows = (
-                    db.session.query(Product.category, func.coalesce(func.sum(Sale.quantity * Product.marked_price), 0.0).label('rev'))
+                    db.session.query(Product.category, category_revenue.label('rev'))
                     .join(Sale, Sale.product_id == Product.id)
                     .filter(Sale.shop_id == shop_id, Sale.sale_date >= start, Sale.sale_date <= end)
                     .group_by(Product.category)
-                    .order_by(func.coalesce(func.sum(Sale.quantity * Product.marked_price), 0.0).desc())
+                    .order_by(category_revenue.desc())
                     .limit(3).all()
                 )
                 if rows:
@@ -834,17 +686,18 @@ class RetailAIAgent:
                     answers.append(f"Top categories ({period_label}): {top}")
 
             # Peak hours (last 7 days)
-            if any(k in msg for k in ["peak hours", "busy hours", "hourly distribution"]):
+            if 'peak_hours' in intents:
                 since = datetime.utcnow() - timedelta(days=7)
+                hour = extract('hour', Sale.sale_date)
                 rows = (
-                    db.session.query(func.strftime('%H', Sale.sale_date).label('hr'), func.count(Sale.id))
+                    db.session.query(hour.label('hr'), func.count(Sale.id))
                     .filter(Sale.shop_id == shop_id, Sale.sale_date >= since)
-                    .group_by('hr')
+                    .group_by(hour)
                     .order_by(func.count(Sale.id).desc())
                     .limit(3).all()
                 )
                 if rows:
-                    peaks = ", ".join([f"{hr}:00 ({cnt} tx)" for hr, cnt in rows])
+                    peaks = ", ".join([f"{int(hr):02d}:00 ({cnt} tx)" for hr, cnt in rows])
                     answers.append(f"Peak hours (last 7d): {peaks}")
 
             if answers:
@@ -3,7 +3,7 @@ AI Analytics Blueprint
 Provides OCR and AI-powered analytics endpoints for admin dashboard
 """
 
-from flask import Blueprint, request, jsonify, current_app
+from flask import Blueprint, Response, request, jsonify, current_app, stream_with_context
 from flask_login import login_required, current_user
 from werkzeug.utils import secure_filename
 import os
@@ -23,9 +23,14 @@ logger = logging.getLogger(__name__)
 ai_analytics_bp = Blueprint('ai_analytics', __name__)
 
 # Memory stores (file-backed; optional mem0)
-_file_mem = FileMemoryStore(Path('instance') / 'memory.jsonl')
+_file_mem = FileMemoryStore(Path('instance') / 'memory', legacy_path=Path('instance') / 'memory.jsonl')
 _mem0 = OptionalMem0()
 
+
+@ai_analytics_bp.record_once
+def _configure_memory(state):
+    _file_mem.flush_interval = state.app.config.get('MEMORY_FLUSH_INTERVAL', _file_mem.flush_interval)
+
 # Configure upload folder
 UPLOAD_FOLDER = 'uploads/charts'
 ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif', 'bmp', 'tiff'}
@@ -127,6 +132,29 @@ def _generate_brief_from_chart_data(cd: dict) -> list:
             bullets.append(random.choice(mean_templates))
     return bullets
 
+def _memory_context(shop_id, user_id, message):
+    """Recent turns plus older related exchanges from chat memory, or None if there are none."""
+    # Read recent memory for context (last 8 entries)
+    recent = _file_mem.get_recent(shop_id, user_id, limit=8)
+    recent_text = "\n".join([f"{r.get('role','')}: {r.get('content','')}" for r in recent])
+
+    # Older exchanges related to this question (BM25 over the user's memory), minus what is already recent
+    seen = {(r.get('ts'), r.get('content')) for r in recent}
+    recalled = [r for r in _file_mem.search(shop_id, user_id, message, limit=3)
+                if (r.get('ts'), r.get('content')) not in seen]
+    recalled_text = "\n".join([f"{r.get('role','')}: {r.get('content','')}" for r in recalled])
+    return {"recent": recent_text, "recalled": recalled_text} if recent_text or recalled_text else None
+
+
+def _remember(shop_id, user_id, role, text, endpoint):
+    _file_mem.add(shop_id, user_id, role, text, meta={"endpoint": endpoint})
+    _mem0.add(text, user_id=user_id, metadata={"shop_id": shop_id, "endpoint": endpoint})
+
+
+def _sse(event, data):
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
 @ai_analytics_bp.route('/api/ai/chat', methods=['POST'])
 @login_required
 def chat_with_ai():
@@ -142,21 +170,17 @@ def chat_with_ai():
         if not shop_id:
             return jsonify({'error': 'Shop ID is required'}), 400
         
-        # Read recent memory for context (last 8 entries)
-        recent = _file_mem.get_recent(int(shop_id), int(current_user.id), limit=8)
-        recent_text = "\n".join([f"{r.get('role','')}: {r.get('content','')}" for r in recent])
+        context = _memory_context(int(shop_id), int(current_user.id), message)
 
         # Store user message to memory stores
-        _file_mem.add(int(shop_id), int(current_user.id), 'user', message, meta={"endpoint":"chat"})
-        _mem0.add(message, user_id=int(current_user.id), metadata={"shop_id": int(shop_id), "endpoint": "chat"})
+        _remember(int(shop_id), int(current_user.id), 'user', message, 'chat')
 
         # Get AI response using raw message plus separate context (avoid triggering structured answers from context words)
-        response = ai_agent.chat_with_agent(message, shop_id, context={"recent": recent_text} if recent_text else None)
+        response = ai_agent.chat_with_agent(message, shop_id, context=context)
 
         # Store assistant reply
         if isinstance(response, str) and response:
-            _file_mem.add(int(shop_id), int(current_user.id), 'assistant', response, meta={"endpoint":"chat"})
-            _mem0.add(response, user_id=int(current_user.id), metadata={"shop_id": int(shop_id), "endpoint": "chat"})
+            _remember(int(shop_id), int(current_user.id), 'assistant', response, 'chat')
         
         return jsonify({
             'response': response,
@@ -168,6 +192,58 @@ def chat_with_ai():
         logger.error(f"Error in AI chat: {str(e)}")
         return jsonify({'error': 'Internal server error'}), 500
 
+@ai_analytics_bp.route('/api/ai/chat/stream', methods=['POST'])
+@login_required
+def stream_chat_with_ai():
+    """Chat with the AI agent, streaming the answer as server-sent events.
+
+    Emits `token` events ({"text"}) as the provider generates, then one
+    `done` event with the full response and `complete`; structured and
+    fallback answers arrive as a single token. If the answer is cut off, an
+    `error` event with `incomplete: true` precedes `done` (complete false)
+    and the partial reply is not saved to memory.
+    """
+    try:
+        data = request.get_json() or {}
+        message = data.get('message', '')
+        shop_id = data.get('shop_id', current_user.shop_id)
+
+        if not message:
+            return jsonify({'error': 'Message is required'}), 400
+
+        if not shop_id:
+            return jsonify({'error': 'Shop ID is required'}), 400
+
+        shop_id, user_id = int(shop_id), int(current_user.id)
+        context = _memory_context(shop_id, user_id, message)
+        _remember(shop_id, user_id, 'user', message, 'chat_stream')
+    except Exception as e:
+        logger.error(f"Error in AI chat stream: {str(e)}")
+        return jsonify({'error': 'Internal server error'}), 500
+
+    def generate():
+        pieces = []
+        complete = True
+        try:
+            for piece in ai_agent.stream_chat_with_agent(message, shop_id, context=context):
+                pieces.append(piece)
+                yield _sse('token', {'text': piece})
+        except Exception as e:
+            logger.error(f"Error in AI chat stream: {str(e)}")
+            complete = False
+            if pieces:
+                yield _sse('error', {'error': 'The answer was cut off. Please try again.', 'incomplete': True})
+            else:
+                yield _sse('error', {'error': 'Internal server error'})
+        response = "".join(pieces)
+        if response and complete:
+            _remember(shop_id, user_id, 'assistant', response, 'chat_stream')
+        yield _sse('done', {'response': response, 'complete': complete,
+                            'timestamp': datetime.utcnow().isoformat(), 'shop_id': shop_id})
+
+    return Response(stream_with_context(generate()), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
 @ai_analytics_bp.route('/api/ai/performance', methods=['GET'])
 @login_required
 def get_shop_performance():
@@ -179,7 +255,7 @@ def get_shop_performance():
         if not shop_id:
             return jsonify({'error': 'Shop ID is required'}), 400
         
-        # Get performance analysis
+        # Get performance analysis (from the shop's shared performance snapshot)
         analysis = ai_agent.analyze_shop_performance(int(shop_id), time_period)
         insights = ai_agent.generate_insights(analysis)
         
@@ -444,7 +520,8 @@ def get_ai_insights():
         # Get AI recommendations
         recommendations = ai_agent.chat_with_agent(
             "Based on the current performance data, what specific recommendations do you have for improving this shop's performance?",
-            int(shop_id)
+            int(shop_id),
+            performance_data=analysis
         )
         
         return jsonify({
@@ -505,7 +582,8 @@ def get_trend_analysis():
         # Get trend analysis from AI
         trend_analysis = ai_agent.chat_with_agent(
             f"Provide a detailed trend analysis for this shop's performance over the last {time_period}. Include specific patterns, anomalies, and predictions.",
-            int(shop_id)
+            int(shop_id),
+            performance_data=analysis
         )
         
         return jsonify({
@@ -550,7 +628,8 @@ def compare_shops():
         
         comparison_analysis = ai_agent.chat_with_agent(
             f"Compare the performance of these shops over the last {time_period}. Provide insights on which shops are performing better and why.",
-            int(shop_ids[0])  # Use first shop as context
+            int(shop_ids[0]),  # Use first shop as context
+            performance_data=shop_comparisons[0]['analysis']
         )
         
         return jsonify({
@@ -0,0 +1,370 @@
+"""
+Generative AI providers for the retail agent.
+
+Each provider (OpenAI, Gemini, or the offline stub) answers a system
+prompt plus user message, either whole (`complete`) or as streamed text
+deltas (`stream`), within a per-call deadline passed to the SDK as its
+request timeout. `ProviderRouter` puts a circuit breaker in front of each
+provider:
+- After AI_BREAKER_FAILURES consecutive failures the provider is skipped.
+- After AI_BREAKER_RESET seconds one trial call is let through.
+Calls go to the first provider whose breaker allows it and fail over to
+the next, all within AI_PROVIDER_TIMEOUT seconds in total, so a slow or
+down provider cannot hold a worker much longer than that.
+
+With AI_HEDGE_AFTER > 0, a `complete` that has not answered within that
+many seconds also starts the next provider, and the first successful
+answer wins. The loser finishes in the background, bounded by its own
+deadline.
+
+Set AI_PROVIDER=stub to run on the local StubProvider, for example in
+development, benchmarks or offline tests. AI_STUB_LATENCY adds a delay in
+seconds.
+
+The Gemini model that supports generateContent is looked up with
+list_models once and cached for GEMINI_MODEL_TTL seconds instead of on
+every fallback.
+"""
+
+import logging
+import os
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+import google.generativeai as genai
+import openai
+from flask import current_app, has_app_context
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TIMEOUT = 20
+DEFAULT_HEDGE_AFTER = 0
+DEFAULT_BREAKER_FAILURES = 3
+DEFAULT_BREAKER_RESET = 60
+
+GEMINI_MODEL_TTL = 6 * 3600
+GEMINI_PREFERRED_MODELS = [
+    'models/gemini-1.5-flash',
+    'models/gemini-1.5-flash-001',
+    'models/gemini-1.5-flash-latest',
+    'models/gemini-1.5-flash-8b',
+    'models/gemini-1.5-pro',
+    'models/gemini-1.5-pro-001',
+    'models/gemini-1.0-pro',
+    'models/gemini-pro'
+]
+DEFAULT_GEMINI_MODEL = 'models/gemini-1.5-pro'
+
+_gemini_model = (0.0, None)  # (monotonic expiry, selected model name)
+_gemini_lock = threading.Lock()
+
+
+def _setting(key, default):
+    if has_app_context():
+        return current_app.config.get(key, default)
+    return default
+
+
+def select_gemini_model(refresh=False):
+    """Pick a supported Gemini model for generateContent, preferring flash variants.
+
+    Returns the full model name (e.g. "models/gemini-1.5-flash") or None if
+    none is available. The answer is cached for GEMINI_MODEL_TTL seconds.
+    """
+    global _gemini_model
+    expires_at, name = _gemini_model
+    if not refresh and name and expires_at > time.monotonic():
+        return name
+
+    with _gemini_lock:
+        try:
+            models = list(genai.list_models())
+        except Exception as e:
+            logger.error(f"Failed to list Gemini models: {e}")
+            return name
+
+        def supports_generate(model):
+            methods = getattr(model, 'supported_generation_methods', None) or []
+            # Some SDK versions store methods as list of strings
+            return any(str(method).lower() in ('generatecontent', 'streamgeneratecontent') for method in methods)
+
+        available = [getattr(model, 'name', '') for model in models if supports_generate(model)]
+        name = next((model for model in GEMINI_PREFERRED_MODELS if model in available), None) \
+            or next(iter(available), None)
+        if name:
+            _gemini_model = (time.monotonic() + GEMINI_MODEL_TTL, name)
+        return name
+
+
+class OpenAIProvider:
+    name = 'openai'
+
+    def __init__(self, api_key, model='gpt-4o-mini'):
+        # Retries are the router's job; the SDK's own would stretch the deadline
+        self.client = openai.OpenAI(api_key=api_key, max_retries=0)
+        self.model = model
+
+    def _create(self, system_prompt, message, timeout, stream):
+        return self.client.chat.completions.create(
+            model=self.model,
+            messages=[
+                {"role": "system", "content": system_prompt},
+                {"role": "user", "content": message}
+            ],
+            max_tokens=500,
+            temperature=0.7,
+            timeout=timeout,
+            stream=stream
+        )
+
+    def complete(self, system_prompt, message, timeout):
+        return self._create(system_prompt, message, timeout, stream=False).choices[0].message.content
+
+    def stream(self, system_prompt, message, timeout):
+        for chunk in self._create(system_prompt, message, timeout, stream=True):
+            delta = chunk.choices[0].delta.content if chunk.choices else None
+            if delta:
+                yield delta
+
+
+class GeminiProvider:
+    name = 'gemini'
+
+    def __init__(self, api_key):
+        genai.configure(api_key=api_key)
+
+    @property
+    def model(self):
+        return select_gemini_model() or DEFAULT_GEMINI_MODEL
+
+    def _generate(self, system_prompt, message, timeout, stream):
+        return genai.GenerativeModel(self.model).generate_content(
+            [{"text": system_prompt}, {"text": message}],
+            stream=stream,
+            request_options={"timeout": timeout}
+        )
+
+    def complete(self, system_prompt, message, timeout):
+        return (self._generate(system_prompt, message, timeout, stream=False).text or "").strip()
+
+    def stream(self, system_prompt, message, timeout):
+        for chunk in self._generate(system_prompt, message, timeout, stream=True):
+            try:
+                text = chunk.text
+            except ValueError:
+                continue  # a chunk without text parts (e.g. only safety ratings)
+            if text:
+                yield text
+
+
+class StubProvider:
+    """Offline provider with a canned, deterministic answer."""
+
+    def __init__(self, name='stub', latency=0.0, fail=False, reply=None):
+        self.name = name
+        self.model = 'stub'
+        self.latency = latency
+        self.fail = fail
+        self.reply = reply
+
+    def _answer(self, message):
+        if self.fail:
+            raise RuntimeError(f'{self.name} provider failure (stub)')
+        return self.reply or f"[{self.name}] You asked: {message.strip()}"
+
+    def complete(self, system_prompt, message, timeout):
+        if self.latency > timeout:
+            time.sleep(timeout)
+            raise TimeoutError(f'{self.name} timed out after {timeout:.1f}s')
+        time.sleep(self.latency)
+        return self._answer(message)
+
+    def stream(self, system_prompt, message, timeout):
+        words = self._answer(message).split(' ')
+        for index, word in enumerate(words):
+            time.sleep(self.latency / len(words))
+            yield word if index == 0 else ' ' + word
+
+
+class CircuitBreaker:
+    """Consecutive-failure breaker: closed -> open -> half-open trial -> closed."""
+
+    def __init__(self):
+        self.failures = 0
+        self.opened_at = None
+        self._trial = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return 'closed'
+        reset = _setting('AI_BREAKER_RESET', DEFAULT_BREAKER_RESET)
+        return 'half_open' if time.monotonic() - self.opened_at >= reset else 'open'
+
+    def allow(self):
+        with self._lock:
+            state = self.state
+            if state == 'closed':
+                return True
+            if state == 'half_open' and not self._trial:
+                self._trial = True  # exactly one caller probes the provider
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self._trial = False
+
+    def record_failure(self, threshold=None):
+        """Count a failure; `threshold` must be passed when called outside the app context."""
+        if threshold is None:
+            threshold = _setting('AI_BREAKER_FAILURES', DEFAULT_BREAKER_FAILURES)
+        with self._lock:
+            self.failures += 1
+            if self._trial or self.failures >= threshold:
+                self.opened_at = time.monotonic()
+            self._trial = False
+
+
+class ProviderRouter:
+    """Ordered providers behind per-provider circuit breakers."""
+
+    def __init__(self, providers):
+        self.providers = list(providers)
+        self.breakers = {provider.name: CircuitBreaker() for provider in self.providers}
+        self._executor = None
+        self._executor_lock = threading.Lock()
+
+    def __bool__(self):
+        return bool(self.providers)
+
+    @property
+    def signature(self):
+        """Provider/model a call would go to first (the first whose circuit is not open), for cache keys."""
+        for provider in self.providers:
+            if self.breakers[provider.name].state != 'open':
+                return provider.name, provider.model
+        return (None, None)
+
+    def signature_of(self, name):
+        """Provider/model of the provider called `name`, for keying the answer it gave."""
+        for provider in self.providers:
+            if provider.name == name:
+                return provider.name, provider.model
+        return (None, None)
+
+    def _call(self, provider, system_prompt, message, timeout, threshold):
+        # Runs on a pool thread, without the app context to read settings from
+        try:
+            answer = provider.complete(system_prompt, message, timeout)
+            if not answer:
+                raise RuntimeError(f'{provider.name} returned an empty answer')
+        except Exception:
+            self.breakers[provider.name].record_failure(threshold)
+            raise
+        self.breakers[provider.name].record_success()
+        return answer
+
+    def _pool(self):
+        # Created on first use, so each forked gunicorn worker gets its own threads
+        with self._executor_lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix='ai-provider')
+            return self._executor
+
+    def complete(self, system_prompt, message):
+        """(answer, provider name); raises RuntimeError when every provider failed or was skipped."""
+        timeout = _setting('AI_PROVIDER_TIMEOUT', DEFAULT_TIMEOUT)
+        hedge_after = _setting('AI_HEDGE_AFTER', DEFAULT_HEDGE_AFTER)
+        threshold = _setting('AI_BREAKER_FAILURES', DEFAULT_BREAKER_FAILURES)
+        deadline = time.monotonic() + timeout
+        pool = self._pool()
+        pending = {}
+        errors = []
+        queue = list(self.providers)
+        while queue or pending:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            if queue and (not pending or hedge_after):
+                provider = queue.pop(0)
+                # Ask the breaker only when about to call, so a half-open trial is never wasted
+                if not self.breakers[provider.name].allow():
+                    errors.append(f'{provider.name}: circuit open')
+                    continue
+                pending[pool.submit(self._call, provider, system_prompt, message, remaining, threshold)] = provider
+            # Wait for an answer, or until it is time to hedge with the next provider
+            wait_for = min(hedge_after, remaining) if queue and hedge_after else remaining
+            done, _ = wait(pending, timeout=wait_for, return_when=FIRST_COMPLETED)
+            for future in done:
+                provider = pending.pop(future)
+                try:
+                    return future.result(), provider.name
+                except Exception as e:
+                    logger.warning(f"AI provider {provider.name} failed: {e}")
+                    errors.append(f'{provider.name}: {e}')
+            if not done and not hedge_after and pending:
+                break  # sequential mode: the deadline passed while waiting
+
+        for provider in pending.values():
+            # Still running past the deadline; its own timeout ends it and records the failure
+            errors.append(f'{provider.name}: timed out')
+        raise RuntimeError('No AI provider answered: ' + ('; '.join(errors) or 'none configured'))
+
+    def stream(self, system_prompt, message):
+        """(text delta, provider name) pairs from the first provider that starts answering.
+
+        A provider that fails before its first delta is failed over; a
+        failure mid-answer is re-raised, so callers can tell the truncated
+        answer from a complete one.
+        """
+        timeout = _setting('AI_PROVIDER_TIMEOUT', DEFAULT_TIMEOUT)
+        for provider in self.providers:
+            breaker = self.breakers[provider.name]
+            if not breaker.allow():
+                continue
+            started = False
+            try:
+                for piece in provider.stream(system_prompt, message, timeout):
+                    started = True
+                    yield piece, provider.name
+            except Exception as e:
+                logger.warning(f"AI provider {provider.name} failed while streaming: {e}")
+                breaker.record_failure()
+                if started:
+                    raise
+                continue
+            if started:
+                breaker.record_success()
+                return
+            breaker.record_failure()  # finished without any text
+
+    def stats(self):
+        return {provider.name: {'state': self.breakers[provider.name].state,
+                                'failures': self.breakers[provider.name].failures}
+                for provider in self.providers}
+
+
+def providers_from_env():
+    """Configured providers in preference order: OpenAI, then Gemini; or only the stub."""
+    if os.getenv('AI_PROVIDER', '').lower() == 'stub':
+        return [StubProvider(latency=float(os.getenv('AI_STUB_LATENCY', 0) or 0))]
+
+    providers = []
+    api_key = os.getenv('OPENAI_API_KEY')
+    if api_key and api_key != 'sk-placeholder-key':
+        try:
+            providers.append(OpenAIProvider(api_key))
+        except Exception as e:
+            logger.error(f"Failed to initialize OpenAI client: {e}")
+    gemini_key = os.getenv('GEMINI_API_KEY')
+    if gemini_key:
+        try:
+            providers.append(GeminiProvider(gemini_key))
+        except Exception as e:
+            logger.error(f"Failed to configure Gemini: {e}")
+    return providers
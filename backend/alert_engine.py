@@ -0,0 +1,370 @@
+"""
+Stock alert engine.
+
+One sweep compares Inventory against Product.reorder_level (low when
+quantity < reorder level, as the dashboards always counted it) and
+ShopResource against Resource.reorder_level (low when quantity <= reorder
+level, as the resource listener did), each with a single set-based query.
+It reconciles the result with the active alert set: items that turned low
+get one ProductAlert/ResourceAlert, items that recovered have their alert
+resolved, and duplicate active alerts for the same item are resolved down
+to one. The shop's admin and employees get one Notification per sweep
+listing the newly low items.
+
+A partial unique index allows one active alert per (shop, item, type),
+and a sweep inserts its new alerts in one multi-row INSERT ... ON
+CONFLICT DO NOTHING. When two workers sweep the same shop at once, only
+the one whose insert lands raises the alert and sends its notification.
+
+Sweeps run on the write paths, never on page views. A request that
+commits a change to Inventory, ShopResource, Sale, or a product or
+resource reorder level queues the (shop, item) keys it touched, and just
+those items are reconciled once the response is ready (`init_app`,
+`sweep_items`); a basket checkout is seen through its Sale rows. Core bulk
+writes sweep themselves: the resource stock-take its changed items, the
+catalogue import its whole shops through `queue_sweep`. Run `flask
+sweep-stock-alerts` from cron to sweep every shop and catch writes made
+outside the app.
+Pages read the active alert set through `low_stock_counts` and
+`low_stock_products`.
+"""
+
+import logging
+from collections import defaultdict
+from datetime import datetime
+
+from flask import g, has_request_context
+from sqlalchemy import event, func, inspect, insert
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from database import (
+    db, Shop, User, Product, Inventory, Resource, ShopResource, Sale,
+    ProductAlert, ResourceAlert, Notification
+)
+from kpi_cache import kpi_cache
+
+logger = logging.getLogger(__name__)
+
+# Items named in a notification before it switches to "and N more"
+NOTIFICATION_ITEMS = 5
+
+# Rows whose shop's stock levels change when they are written
+WATCHED_STOCK = (Inventory, ShopResource, Sale)
+# Models whose reorder level applies to every shop stocking them
+WATCHED_LEVELS = (Product, Resource)
+
+# Alerts per multi-row INSERT, keeping SQLite under its bound-parameter limit
+INSERT_BATCH = 500
+
+# Queued in place of shop ids to sweep every shop
+EVERY_SHOP = '*'
+
+# session.info key for the (shop_id, item_id) keys touched by the current transaction
+_PENDING_KEY = 'stock_alert_items'
+# flask.g key for the shops and items to sweep when the request's response is ready
+_QUEUE_KEY = 'stock_alert_sweep'
+
+
+def _low_products(shop_ids, product_ids=None):
+    query = db.session.query(
+        Inventory.shop_id, Inventory.product_id, Product.name,
+        Inventory.quantity, Product.reorder_level
+    ).join(Product, Product.id == Inventory.product_id)\
+        .filter(Inventory.quantity < Product.reorder_level)
+    if shop_ids is not None:
+        query = query.filter(Inventory.shop_id.in_(shop_ids))
+    if product_ids is not None:
+        query = query.filter(Inventory.product_id.in_(product_ids))
+    return {(row.shop_id, row.product_id): row for row in query}
+
+
+def _low_resources(shop_ids, resource_ids=None):
+    query = db.session.query(
+        ShopResource.shop_id, ShopResource.resource_id, Resource.name,
+        ShopResource.quantity, Resource.reorder_level
+    ).join(Resource, Resource.id == ShopResource.resource_id)\
+        .filter(ShopResource.quantity <= Resource.reorder_level)
+    if shop_ids is not None:
+        query = query.filter(ShopResource.shop_id.in_(shop_ids))
+    if resource_ids is not None:
+        query = query.filter(ShopResource.resource_id.in_(resource_ids))
+    return {(row.shop_id, row.resource_id): row for row in query}
+
+
+def _in_scope(key, keys):
+    """Whether (shop_id, item_id) is one of `keys`; a None shop_id covers every shop."""
+    return keys is None or key in keys or (None, key[1]) in keys
+
+
+def _reconcile(model, item_column, find_low, scope, now):
+    """Raise alerts for newly low items and resolve the rest; returns (new low rows, resolved count).
+
+    `scope` is (shop_ids, item_ids, keys), each None for no limit.
+    """
+    shop_ids, item_ids, keys = scope
+    low = {key: row for key, row in find_low(shop_ids, item_ids).items() if _in_scope(key, keys)}
+
+    query = db.session.query(model.id, model.shop_id, item_column)\
+        .filter(model.is_active.is_(True), model.alert_type == 'low_stock')
+    if shop_ids is not None:
+        query = query.filter(model.shop_id.in_(shop_ids))
+    if item_ids is not None:
+        query = query.filter(item_column.in_(item_ids))
+
+    active = {}
+    stale = []
+    for alert_id, shop_id, item_id in query.order_by(model.id):
+        key = (shop_id, item_id)
+        if not _in_scope(key, keys):
+            continue
+        if key in low and key not in active:
+            active[key] = alert_id
+        else:
+            stale.append(alert_id)  # recovered, or a duplicate of an older active alert
+
+    if stale:
+        db.session.query(model).filter(model.id.in_(stale))\
+            .update({model.is_active: False, model.resolved_at: now}, synchronize_session=False)
+
+    raised = _insert_alerts(model, item_column, [low[key] for key in low if key not in active], now)
+    return raised, len(stale)
+
+
+def _insert_alerts(model, item_column, rows, now):
+    """Insert one active alert per low row, skipping any another sweep already raised.
+
+    Returns the rows whose alert this sweep inserted.
+    """
+    landed = set()
+    dialect = db.engine.dialect.name
+    for start in range(0, len(rows), INSERT_BATCH):
+        batch = rows[start:start + INSERT_BATCH]
+        values = [{
+            item_column.key: getattr(row, item_column.key),
+            'shop_id': row.shop_id,
+            'alert_type': 'low_stock',
+            'message': f'Low stock alert: {row.name} is below reorder level ({row.reorder_level})',
+            'is_active': True,
+            'created_at': now,
+        } for row in batch]
+        if dialect == 'postgresql':
+            statement = postgresql.insert(model).values(values).on_conflict_do_nothing()\
+                .returning(model.shop_id, item_column)
+            landed.update(tuple(key) for key in db.session.execute(statement))
+        elif dialect == 'sqlite':
+            # SQLAlchemy 1.4 cannot emit RETURNING for SQLite; the rows this sweep
+            # inserted are the active ones stamped with its timestamp
+            db.session.execute(sqlite.insert(model).values(values).on_conflict_do_nothing())
+            landed.update(tuple(key) for key in db.session.query(model.shop_id, item_column).filter(
+                model.is_active.is_(True), model.alert_type == 'low_stock', model.created_at == now,
+                model.shop_id.in_({row.shop_id for row in batch}),
+                item_column.in_({getattr(row, item_column.key) for row in batch})
+            ))
+        else:
+            for value in values:
+                try:
+                    with db.session.begin_nested():
+                        db.session.execute(insert(model).values(**value))
+                    landed.add((value['shop_id'], value[item_column.key]))
+                except IntegrityError:
+                    pass
+    return [row for row in rows if (row.shop_id, getattr(row, item_column.key)) in landed]
+
+
+def _notify(raised, now):
+    """One warning per recipient per shop naming the items that just went low."""
+    by_shop = defaultdict(list)
+    for row in raised:
+        by_shop[row.shop_id].append(row)
+    if not by_shop:
+        return 0
+
+    recipients = defaultdict(set)
+    for shop_id, admin_id in db.session.query(Shop.id, Shop.admin_id).filter(Shop.id.in_(by_shop)):
+        if admin_id:
+            recipients[shop_id].add(admin_id)
+    for user_id, shop_id in db.session.query(User.id, User.shop_id)\
+            .filter(User.shop_id.in_(by_shop), User.role == 'employee'):
+        recipients[shop_id].add(user_id)
+
+    notifications = []
+    for shop_id, rows in by_shop.items():
+        names = ', '.join(f'{row.name} ({row.quantity} left)' for row in rows[:NOTIFICATION_ITEMS])
+        if len(rows) > NOTIFICATION_ITEMS:
+            names += f' and {len(rows) - NOTIFICATION_ITEMS} more'
+        message = f'{len(rows)} item(s) fell below their reorder level: {names}'
+        notifications.extend({
+            'shop_id': shop_id,
+            'user_id': user_id,
+            'title': 'Low stock',
+            'message': message,
+            'type': 'warning',
+            'is_read': False,
+            'created_at': now,
+        } for user_id in sorted(recipients[shop_id]))
+
+    if notifications:
+        db.session.bulk_insert_mappings(Notification, notifications)
+    return len(notifications)
+
+
+def sweep(shop_ids=None, products=True, resources=True, notify=True):
+    """Reconcile stock alerts for every item in `shop_ids` (None = every shop) and commit.
+
+    Returns {'raised', 'resolved', 'notifications'}.
+    """
+    if shop_ids is not None:
+        shop_ids = sorted(set(shop_ids))
+        if not shop_ids:
+            return {'raised': 0, 'resolved': 0, 'notifications': 0}
+    scope = (shop_ids, None, None)
+    return _sweep(scope if products else None, scope if resources else None, notify)
+
+
+def sweep_items(product_keys=(), resource_keys=(), notify=True):
+    """Reconcile stock alerts for just these (shop_id, item_id) keys and commit.
+
+    A shop_id of None stands for every shop stocking the item. Returns
+    {'raised', 'resolved', 'notifications'}.
+    """
+    return _sweep(_item_scope(product_keys), _item_scope(resource_keys), notify)
+
+
+def _item_scope(keys):
+    keys = set(keys)
+    if not keys:
+        return None
+    shop_ids = {shop_id for shop_id, _ in keys}
+    return (None if None in shop_ids else sorted(shop_ids)), sorted({item_id for _, item_id in keys}), keys
+
+
+def _sweep(product_scope, resource_scope, notify):
+    now = datetime.utcnow()
+    raised = []
+    resolved = 0
+    notifications = 0
+    try:
+        if product_scope is not None:
+            new, count = _reconcile(ProductAlert, ProductAlert.product_id, _low_products, product_scope, now)
+            raised.extend(new)
+            resolved += count
+        if resource_scope is not None:
+            new, count = _reconcile(ResourceAlert, ResourceAlert.resource_id, _low_resources, resource_scope, now)
+            raised.extend(new)
+            resolved += count
+        notifications = _notify(raised, now) if notify else 0
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+
+    if raised or resolved:
+        # Alert rows are bulk-written, so the session listeners never see them
+        scopes = [scope[0] for scope in (product_scope, resource_scope) if scope is not None]
+        if None in scopes:
+            kpi_cache.clear()
+        else:
+            kpi_cache.invalidate_shops(sorted(set().union(*scopes)))
+    return {'raised': len(raised), 'resolved': resolved, 'notifications': notifications}
+
+
+def _queued():
+    return g.setdefault(_QUEUE_KEY, {'shops': set(), 'products': set(), 'resources': set()})
+
+
+def queue_sweep(shop_ids):
+    """Sweep `shop_ids` (None = every shop) once the current response is ready, or now outside a request."""
+    shop_ids = {EVERY_SHOP} if shop_ids is None else set(shop_ids)
+    if not has_request_context():
+        sweep(None if EVERY_SHOP in shop_ids else shop_ids)
+        return
+    _queued()['shops'].update(shop_ids)
+
+
+def init_app(app):
+    """Sweep the items whose stock a request committed, after its view has run."""
+
+    @app.after_request
+    def _sweep_queued(response):
+        queued = g.pop(_QUEUE_KEY, None)
+        if not queued:
+            return response
+        shop_ids = queued['shops']
+        try:
+            if shop_ids:
+                sweep(None if EVERY_SHOP in shop_ids else shop_ids)
+            if EVERY_SHOP not in shop_ids:
+                # Items in shops swept whole above are already reconciled
+                sweep_items(
+                    [key for key in queued['products'] if key[0] not in shop_ids],
+                    [key for key in queued['resources'] if key[0] not in shop_ids],
+                )
+        except Exception as e:
+            logger.error(f"Error sweeping stock alerts: {str(e)}")
+        return response
+
+
+def _stock_keys(obj, item_attr):
+    """(shop_id, item_id) keys a stock row covers, before and after the flush."""
+    state = inspect(obj)
+    shop_ids = {obj.shop_id, *state.attrs.shop_id.history.deleted}
+    item_ids = {getattr(obj, item_attr), *state.attrs[item_attr].history.deleted}
+    return {(shop_id, item_id) for shop_id in shop_ids for item_id in item_ids
+            if shop_id is not None and item_id is not None}
+
+
+@event.listens_for(Session, 'after_flush')
+def _collect_touched_items(session, flush_context):
+    touched = session.info.setdefault(_PENDING_KEY, {'products': set(), 'resources': set()})
+    dirty = session.dirty
+    for obj in dirty:
+        if isinstance(obj, WATCHED_LEVELS) and inspect(obj).attrs.reorder_level.history.has_changes():
+            kind = 'products' if isinstance(obj, Product) else 'resources'
+            touched[kind].add((None, obj.id))
+    for obj in (*session.new, *dirty, *session.deleted):
+        if not isinstance(obj, WATCHED_STOCK):
+            continue
+        item_attr = 'resource_id' if isinstance(obj, ShopResource) else 'product_id'
+        if obj in dirty and not any(inspect(obj).attrs[attr].history.has_changes()
+                                    for attr in ('quantity', 'shop_id', item_attr)):
+            continue  # touched without changing stock
+        kind = 'resources' if isinstance(obj, ShopResource) else 'products'
+        touched[kind].update(_stock_keys(obj, item_attr))
+
+
+@event.listens_for(Session, 'after_commit')
+def _queue_committed(session):
+    touched = session.info.pop(_PENDING_KEY, None)
+    # The session cannot run the sweep itself here; outside a request the cron sweep catches up
+    if touched and has_request_context():
+        queued = _queued()
+        queued['products'].update(touched['products'])
+        queued['resources'].update(touched['resources'])
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_rolled_back(session):
+    session.info.pop(_PENDING_KEY, None)
+
+
+def low_stock_counts(shop_ids):
+    """{shop_id: number of products with an active low-stock alert}."""
+    return dict(
+        db.session.query(ProductAlert.shop_id, func.count(ProductAlert.id))
+        .filter(ProductAlert.shop_id.in_(shop_ids), ProductAlert.is_active.is_(True))
+        .group_by(ProductAlert.shop_id)
+    )
+
+
+def low_stock_products(shop_ids, limit=None):
+    """Products with an active low-stock alert in any of `shop_ids`, newest alert first."""
+    query = db.session.query(Product)\
+        .join(ProductAlert, ProductAlert.product_id == Product.id)\
+        .filter(ProductAlert.shop_id.in_(shop_ids), ProductAlert.is_active.is_(True))\
+        .group_by(Product.id)\
+        .order_by(func.max(ProductAlert.created_at).desc(), Product.id)
+    if limit:
+        query = query.limit(limit)
+    return query.all()
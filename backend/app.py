@@ -7,7 +7,7 @@ from pathlib import Path
 from werkzeug.security import generate_password_hash
 from datetime import datetime
 from database import db, User, Shop, Product, Inventory, UnscannedSale
-from commands import create_test_shop, verify_database, check_database, reset_database, create_default_resources
+from commands import create_test_shop, verify_database, check_database, reset_database, create_default_resources, check_query_plans, rebuild_daily_totals, backfill_sale_prices, generate_scheduled_reports, seed_synthetic, benchmark, import_catalog, sweep_stock_alerts, compact_chat_memory, prune_llm_cache
 from flask_sqlalchemy import SQLAlchemy
 from flask_migrate import Migrate
 from config import config
@@ -30,6 +30,8 @@ from report import report_bp
 from settings import settings_bp
 from websocket import websocket_bp
 from ai_analytics import ai_analytics_bp
+import sql_metrics
+import alert_engine
 
 # Load environment variables unless explicitly skipped
 if not os.getenv("FLASK_SKIP_DOTENV"):
@@ -60,6 +62,8 @@ def create_app(config_name='default'):
     CORS(app)
     JWTManager(app)
     db.init_app(app)
+    sql_metrics.init_app(app)
+    alert_engine.init_app(app)
     migrate = Migrate(app, db)
     login_manager = LoginManager(app)
     login_manager.login_view = 'auth.login'
@@ -71,6 +75,16 @@ def create_app(config_name='default'):
     app.cli.add_command(check_database)
     app.cli.add_command(reset_database)
     app.cli.add_command(create_default_resources)
+    app.cli.add_command(check_query_plans)
+    app.cli.add_command(rebuild_daily_totals)
+    app.cli.add_command(backfill_sale_prices)
+    app.cli.add_command(generate_scheduled_reports)
+    app.cli.add_command(seed_synthetic)
+    app.cli.add_command(benchmark)
+    app.cli.add_command(import_catalog)
+    app.cli.add_command(sweep_stock_alerts)
+    app.cli.add_command(compact_chat_memory)
+    app.cli.add_command(prune_llm_cache)
 
     # Register blueprints
     app.register_blueprint(admin_bp, url_prefix='/admin')
@@ -0,0 +1,137 @@
+"""
+In-process LRU cache for barcode scans.
+
+Maps a barcode to the product's id, name, barcode, category and marked
+price, so a scan that hits the cache costs one keyed stock query on
+inventory's (shop_id, product_id) index. A miss resolves the product and
+its stock together in one LEFT JOIN and fills the cache. Only found
+barcodes are cached, so products created by any path (including Core bulk
+inserts) are visible to the next scan.
+
+Committing an insert, update or delete of a Product evicts its current
+and previous barcode; rolled-back changes evict nothing. Edits committed
+by another gunicorn worker are not seen, so entries also expire after
+BARCODE_CACHE_TTL seconds.
+"""
+
+import threading
+import time
+from collections import Counter, OrderedDict
+
+from flask import current_app
+from sqlalchemy import and_, event, inspect
+from sqlalchemy.orm import Session
+
+from database import db, Product, Inventory
+
+DEFAULT_SIZE = 4096
+DEFAULT_TTL = 300
+
+# session.info key for barcodes touched by the current transaction
+_PENDING_KEY = 'barcode_cache_barcodes'
+
+
+class BarcodeCache:
+    """Bounded barcode -> product dict mapping with least-recently-used eviction."""
+
+    def __init__(self):
+        self._entries = OrderedDict()  # barcode -> (expires_at, product)
+        self._lock = threading.Lock()
+        self.counters = Counter()
+
+    def get(self, barcode):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(barcode)
+            if entry is None or entry[0] <= now:
+                self._entries.pop(barcode, None)
+                self.counters['misses'] += 1
+                return None
+            self._entries.move_to_end(barcode)
+            self.counters['hits'] += 1
+            return entry[1]
+
+    def set(self, barcode, product):
+        ttl = current_app.config.get('BARCODE_CACHE_TTL', DEFAULT_TTL)
+        size = current_app.config.get('BARCODE_CACHE_SIZE', DEFAULT_SIZE)
+        with self._lock:
+            self._entries[barcode] = (time.monotonic() + ttl, product)
+            self._entries.move_to_end(barcode)
+            while len(self._entries) > size:
+                self._entries.popitem(last=False)
+                self.counters['evictions'] += 1
+
+    def invalidate(self, barcodes):
+        with self._lock:
+            for barcode in barcodes:
+                if self._entries.pop(barcode, None) is not None:
+                    self.counters['invalidations'] += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        lookups = self.counters['hits'] + self.counters['misses']
+        return {
+            'entries': len(self._entries),
+            'hits': self.counters['hits'],
+            'misses': self.counters['misses'],
+            'evictions': self.counters['evictions'],
+            'invalidations': self.counters['invalidations'],
+            'hit_rate': round(self.counters['hits'] / lookups, 3) if lookups else None,
+        }
+
+
+barcode_cache = BarcodeCache()
+
+
+def lookup(barcode, shop_id):
+    """Product fields plus the shop's stock as `quantity`, or None if the barcode is unknown."""
+    product = barcode_cache.get(barcode)
+    if product is not None:
+        quantity = db.session.query(Inventory.quantity).filter(
+            Inventory.shop_id == shop_id,
+            Inventory.product_id == product['id']
+        ).scalar()
+        return dict(product, quantity=quantity or 0)
+
+    row = db.session.query(
+        Product.id, Product.name, Product.barcode, Product.category,
+        Product.marked_price, Inventory.quantity
+    ).outerjoin(Inventory, and_(Inventory.product_id == Product.id,
+                                Inventory.shop_id == shop_id))\
+        .filter(Product.barcode == barcode).first()
+    if row is None:
+        return None
+
+    product = {
+        'id': row.id,
+        'name': row.name,
+        'barcode': row.barcode,
+        'category': row.category,
+        'marked_price': row.marked_price,
+    }
+    barcode_cache.set(barcode, product)
+    return dict(product, quantity=row.quantity or 0)
+
+
+@event.listens_for(Session, 'after_flush')
+def _collect_touched_barcodes(session, flush_context):
+    touched = session.info.setdefault(_PENDING_KEY, set())
+    for obj in (*session.new, *session.dirty, *session.deleted):
+        if isinstance(obj, Product):
+            history = inspect(obj).attrs.barcode.history
+            touched.update(barcode for barcode in (obj.barcode, *history.deleted) if barcode)
+
+
+@event.listens_for(Session, 'after_commit')
+def _invalidate_committed(session):
+    touched = session.info.pop(_PENDING_KEY, None)
+    if touched:
+        barcode_cache.invalidate(touched)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_rolled_back(session):
+    session.info.pop(_PENDING_KEY, None)
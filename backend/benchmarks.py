@@ -0,0 +1,214 @@
+"""
+Route-level benchmarks against a seeded SQLite database.
+
+Each case drives one hot view through the Flask test client (or calls the
+AI agent's structured-query path directly) as the synthetic admin or one
+of its employees, repeats it and records median/p95 wall time and the
+number of SQL statements. LLM backends are switched off for the run so
+only local work is timed.
+
+The KPI, performance-snapshot and AI response caches are cleared before
+every timed iteration, so each case measures the cold path its queries
+take. Cases that are normally served from those caches are timed a second
+time without clearing and reported as `<name>.warm`.
+
+Results are compared with a stored JSON baseline: a case whose median is
+more than `threshold` slower than its baseline median is a regression.
+Baselines are machine-specific; record them with `--save` on the machine
+that will run the comparison.
+"""
+
+import json
+import os
+import platform
+import statistics
+import time
+from contextlib import contextmanager
+from datetime import datetime
+
+from database import db, User, Shop, Product, Inventory
+from kpi_cache import kpi_cache
+from llm_cache import llm_cache
+from performance_snapshots import performance_snapshots
+from sql_metrics import collect
+
+STRUCTURED_QUERIES = [
+    'How many employees and products do we have?',
+    'What is our revenue and expenses this month?',
+    'How many products sold today and which services sold most this week?',
+    'Show low stock items',
+]
+
+
+class BenchmarkCase:
+    """One timed operation. `run(client, context)` performs it once.
+
+    `cached` cases are also timed warm, with the caches left populated.
+    """
+
+    def __init__(self, name, role, run, cached=False):
+        self.name = name
+        self.role = role
+        self.run = run
+        self.cached = cached
+
+
+def _get(url):
+    def run(client, context):
+        response = client.get(url.format(**context))
+        response.get_data()  # drain streamed responses
+        if response.status_code >= 400:
+            raise RuntimeError(f'GET {url} returned {response.status_code}')
+    return run
+
+
+def _new_sale(client, context):
+    response = client.post('/employee/sales/new', data={
+        'product_id': context['product_id'],
+        'quantity': 1,
+        'payment_method': 'cash',
+    })
+    if response.status_code >= 400:
+        raise RuntimeError(f'POST /employee/sales/new returned {response.status_code}')
+
+
+def _structured_queries(client, context):
+    from ai_agent import ai_agent
+    for message in STRUCTURED_QUERIES:
+        ai_agent._answer_structured_query(message, context['shop_id'])
+
+
+CASES = [
+    BenchmarkCase('admin.dashboard', 'admin', _get('/admin/dashboard'), cached=True),
+    BenchmarkCase('admin.analytics_data', 'admin', _get('/admin/analytics/data?period=month')),
+    BenchmarkCase('admin.accounts', 'admin', _get('/admin/accounts?period=month')),
+    BenchmarkCase('admin.export_sales', 'admin', _get('/admin/sales-report/export/csv?period=month')),
+    BenchmarkCase('employee.dashboard', 'employee', _get('/employee/dashboard'), cached=True),
+    BenchmarkCase('employee.new_sale', 'employee', _new_sale),
+    BenchmarkCase('ai.performance', 'admin', _get('/ai_analytics/api/ai/performance?shop_id={shop_id}&time_period=30d'),
+                  cached=True),
+    BenchmarkCase('ai.structured_query', None, _structured_queries, cached=True),
+]
+
+
+@contextmanager
+def llm_disabled():
+    """Keep the AI agent on its local code paths for the duration."""
+    from ai_agent import ai_agent
+    saved = ai_agent._ensure_client
+    ai_agent._ensure_client = lambda: False
+    try:
+        yield
+    finally:
+        ai_agent._ensure_client = saved
+
+
+def benchmark_context():
+    """Users, shop and product the cases run as; None if nothing is seeded."""
+    admin = User.query.filter(User.email.like('synthetic-admin-%'))\
+        .order_by(User.id.desc()).first()
+    if admin is None:
+        return None
+    shop = Shop.query.filter_by(admin_id=admin.id).order_by(Shop.id).first()
+    employee = User.query.filter_by(role='employee', shop_id=shop.id).order_by(User.id).first()
+    product = db.session.query(Product.id).join(Inventory, Inventory.product_id == Product.id)\
+        .filter(Product.shop_id == shop.id, Inventory.quantity > 0).order_by(Product.id).first()
+    return {
+        'admin_id': admin.id,
+        'employee_id': employee.id,
+        'shop_id': shop.id,
+        'product_id': product.id,
+    }
+
+
+def _login(client, user_id):
+    with client.session_transaction() as session:
+        session['_user_id'] = str(user_id)
+        session['_fresh'] = True
+
+
+def reset_caches():
+    """Drop every per-worker cache a case could be answered from."""
+    kpi_cache.clear()
+    performance_snapshots.clear()
+    llm_cache.clear()
+
+
+def _time_case(case, client, context, repeat, cold):
+    timings = []
+    statements = 0
+    for _ in range(repeat):
+        if cold:
+            reset_caches()
+        with collect() as stats:
+            started = time.perf_counter()
+            case.run(client, context)
+            timings.append((time.perf_counter() - started) * 1000)
+        statements = stats.count
+        db.session.remove()
+
+    timings.sort()
+    return {
+        'median_ms': round(statistics.median(timings), 2),
+        'p95_ms': round(timings[min(len(timings) - 1, int(len(timings) * 0.95))], 2),
+        'mean_ms': round(statistics.mean(timings), 2),
+        'min_ms': round(timings[0], 2),
+        'statements': statements,
+    }
+
+
+def run_benchmarks(app, context, repeat=5, warmup=1, only=None):
+    """Time every case; returns {name: {median_ms, p95_ms, mean_ms, min_ms, statements}}.
+
+    Every case is timed cold under its own name; cached cases are also
+    timed warm under `<name>.warm`.
+    """
+    results = {}
+    with llm_disabled():
+        for case in CASES:
+            if only and case.name not in only:
+                continue
+            client = app.test_client()
+            if case.role:
+                _login(client, context[f'{case.role}_id'])
+
+            for _ in range(warmup):
+                case.run(client, context)
+
+            results[case.name] = _time_case(case, client, context, repeat, cold=True)
+            if case.cached:
+                case.run(client, context)  # repopulate what the cold runs cleared
+                results[f'{case.name}.warm'] = _time_case(case, client, context, repeat, cold=False)
+    return results
+
+
+def compare(results, baseline, threshold=0.2):
+    """[(name, baseline_ms, current_ms, change)] for cases slower than baseline by more than `threshold`."""
+    regressions = []
+    for name, current in results.items():
+        previous = baseline.get('results', {}).get(name)
+        if not previous or not previous.get('median_ms'):
+            continue
+        change = current['median_ms'] / previous['median_ms'] - 1
+        if change > threshold:
+            regressions.append((name, previous['median_ms'], current['median_ms'], change))
+    return regressions
+
+
+def load_baseline(path):
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return json.load(f)
+
+
+def save_baseline(path, results, repeat):
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, 'w') as f:
+        json.dump({
+            'recorded_at': datetime.utcnow().isoformat(),
+            'python': platform.python_version(),
+            'machine': platform.node(),
+            'repeat': repeat,
+            'results': results,
+        }, f, indent=2, sort_keys=True)
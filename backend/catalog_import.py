@@ -0,0 +1,191 @@
+"""
+Bulk product catalogue import from CSV or XLSX.
+
+Rows are validated up front and checked against existing barcodes with one
+IN query per batch; rows that fail are reported with their line number and
+the rest are imported. Each batch inserts its products with
+bulk_insert_mappings and then creates the inventory rows for every target
+shop in a single INSERT ... SELECT over product x shop (the row's opening
+quantity only in the stocking shops, zero elsewhere), so onboarding
+thousands of SKUs costs a handful of statements per batch rather than a
+round trip per product and shop. Batches commit independently; a batch
+that fails at the database is rolled back and its rows reported.
+
+Bulk inserts bypass the ORM session listeners, so the KPI cache is
+invalidated and a stock alert sweep queued explicitly for the shops that
+received stock.
+"""
+
+import csv
+import io
+import os
+from datetime import datetime
+
+from openpyxl import load_workbook
+from sqlalchemy import case, literal, select, true
+
+from alert_engine import queue_sweep
+from database import db, Product, Inventory, Shop
+from kpi_cache import kpi_cache
+
+ALLOWED_EXTENSIONS = {'csv', 'xlsx'}
+REQUIRED_COLUMNS = ('name', 'barcode', 'category', 'marked_price')
+OPTIONAL_COLUMNS = ('reorder_level', 'quantity')
+DEFAULT_BATCH_SIZE = 5000
+
+
+def _column(header):
+    return str(header).strip().lower().replace(' ', '_')
+
+
+def _cell(value):
+    # Numeric cells come back as floats; 5012345.0 should import as barcode 5012345
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return '' if value is None else str(value)
+
+
+def read_catalog(stream, filename):
+    """Rows of a CSV/XLSX upload as dicts keyed by normalised column name."""
+    extension = os.path.splitext(filename or '')[1].lower().lstrip('.')
+    if extension not in ALLOWED_EXTENSIONS:
+        raise ValueError('Catalog must be a .csv or .xlsx file')
+
+    data = stream.read()
+    if extension == 'csv':
+        try:
+            text = data.decode('utf-8-sig')
+        except UnicodeDecodeError:
+            raise ValueError('CSV files must be UTF-8 encoded')
+        rows = [{_column(key): value for key, value in row.items() if key is not None}
+                for row in csv.DictReader(io.StringIO(text, newline=''))]
+    else:
+        sheet = load_workbook(io.BytesIO(data), read_only=True, data_only=True).active
+        values = sheet.iter_rows(values_only=True)
+        header = [_column(column) if column is not None else None for column in next(values, ())]
+        rows = [{column: _cell(value) for column, value in zip(header, row) if column}
+                for row in values if any(value is not None for value in row)]
+
+    columns = set(rows[0]) if rows else set()
+    missing = [column for column in REQUIRED_COLUMNS if column not in columns]
+    if rows and missing:
+        raise ValueError(f"Missing required columns: {', '.join(missing)}")
+    return rows
+
+
+def _parse_row(row):
+    """Product mapping plus initial quantity for one row; raises ValueError."""
+    values = {key: str(row.get(key) or '').strip() for key in REQUIRED_COLUMNS + OPTIONAL_COLUMNS}
+    for column in REQUIRED_COLUMNS:
+        if not values[column]:
+            raise ValueError(f'{column} is required')
+    if len(values['barcode']) > 50:
+        raise ValueError('barcode is longer than 50 characters')
+    if len(values['name']) > 100 or len(values['category']) > 50:
+        raise ValueError('name or category is too long')
+
+    try:
+        marked_price = float(values['marked_price'])
+        reorder_level = int(float(values['reorder_level'])) if values['reorder_level'] else 10
+        quantity = int(float(values['quantity'])) if values['quantity'] else 0
+    except ValueError:
+        raise ValueError('marked_price, reorder_level and quantity must be numbers')
+    if marked_price < 0 or reorder_level < 0 or quantity < 0:
+        raise ValueError('marked_price, reorder_level and quantity cannot be negative')
+
+    return {
+        'name': values['name'],
+        'barcode': values['barcode'],
+        'category': values['category'],
+        'marked_price': marked_price,
+        'reorder_level': reorder_level,
+    }, quantity
+
+
+def import_catalog(rows, shop_id, inventory_shop_ids=None, stock_shop_ids=None,
+                   batch_size=DEFAULT_BATCH_SIZE):
+    """Import parsed catalogue rows into `shop_id`.
+
+    Every new product gets an inventory row in each of `inventory_shop_ids`
+    (default: just `shop_id`). The row's `quantity` (default 0) is the
+    opening stock of each shop in `stock_shop_ids` (default: just
+    `shop_id`); the other shops start at zero. Returns {'created',
+    'inventory_rows', 'errors': [{'row', 'barcode', 'error'}]} where `row`
+    is the spreadsheet line number.
+    """
+    if not Shop.query.get(shop_id):
+        raise ValueError('Shop not found')
+    stock_shop_ids = sorted(set(stock_shop_ids or [shop_id]))
+    inventory_shop_ids = sorted(set(inventory_shop_ids or [shop_id]).union(stock_shop_ids))
+
+    errors = []
+    parsed = []
+    seen = set()
+    for line, row in enumerate(rows, start=2):  # line 1 is the header
+        try:
+            mapping, quantity = _parse_row(row)
+        except ValueError as e:
+            errors.append({'row': line, 'barcode': row.get('barcode'), 'error': str(e)})
+            continue
+        if mapping['barcode'] in seen:
+            errors.append({'row': line, 'barcode': mapping['barcode'], 'error': 'Duplicate barcode in file'})
+            continue
+        seen.add(mapping['barcode'])
+        mapping['shop_id'] = shop_id
+        mapping['created_at'] = datetime.utcnow()
+        parsed.append((line, mapping, quantity))
+
+    created = 0
+    inventory_rows = 0
+    for begin in range(0, len(parsed), batch_size):
+        batch = parsed[begin:begin + batch_size]
+        barcodes = [mapping['barcode'] for _, mapping, _ in batch]
+        existing = {barcode for barcode, in db.session.query(Product.barcode)
+                    .filter(Product.barcode.in_(barcodes))}
+
+        new = []
+        for line, mapping, quantity in batch:
+            if mapping['barcode'] in existing:
+                errors.append({'row': line, 'barcode': mapping['barcode'],
+                               'error': 'A product with this barcode already exists'})
+            else:
+                new.append((line, mapping, quantity))
+        if not new:
+            continue
+
+        try:
+            db.session.bulk_insert_mappings(Product, [mapping for _, mapping, _ in new])
+            inventory_rows += _insert_inventory(new, inventory_shop_ids, stock_shop_ids)
+            db.session.commit()
+            created += len(new)
+        except Exception as e:
+            db.session.rollback()
+            errors.extend({'row': line, 'barcode': mapping['barcode'], 'error': f'Batch failed: {e}'}
+                          for line, mapping, _ in new)
+
+    if created:
+        kpi_cache.invalidate_shops(inventory_shop_ids)
+        queue_sweep(inventory_shop_ids)
+    errors.sort(key=lambda error: error['row'])
+    return {'created': created, 'inventory_rows': inventory_rows, 'errors': errors}
+
+
+def _insert_inventory(new, shop_ids, stock_shop_ids):
+    """Create inventory for the batch's products in every shop with one INSERT ... SELECT.
+
+    Only `stock_shop_ids` receive the rows' quantities; the rest start at zero.
+    """
+    quantities = {mapping['barcode']: quantity for _, mapping, quantity in new if quantity}
+    if quantities:
+        quantity = case((Shop.id.in_(stock_shop_ids), case(quantities, value=Product.barcode, else_=0)),
+                        else_=0)
+    else:
+        quantity = literal(0)
+    selected = select(Shop.id, Product.id, quantity, literal(datetime.utcnow()))\
+        .select_from(Shop.__table__.join(Product.__table__, true()))\
+        .where(Shop.id.in_(shop_ids),
+               Product.barcode.in_([mapping['barcode'] for _, mapping, _ in new]))
+    result = db.session.execute(
+        Inventory.__table__.insert().from_select(['shop_id', 'product_id', 'quantity', 'updated_at'], selected)
+    )
+    return result.rowcount
@@ -0,0 +1,136 @@
+"""
+Basket checkout for the POS.
+
+Stock is taken with one conditional UPDATE per line
+(`... SET quantity = quantity - :qty WHERE quantity >= :qty`), so two
+tills selling the last unit can never both succeed and no update is lost
+to a read-modify-write race. The stock updates, every sale line and a
+single FinancialRecord for the basket are committed together; if any line
+is short, nothing is written.
+"""
+
+from collections import OrderedDict
+from datetime import datetime
+
+from sqlalchemy import update
+
+from database import db, Product, Inventory, Sale, FinancialRecord
+
+PAYMENT_METHODS = ('cash', 'till', 'bank')
+
+
+def _merge_lines(lines, allow_price_override=False):
+    """[(product_id, quantity, unit_price or None)] with repeated products combined.
+
+    A line's unit_price is only read when `allow_price_override` is set;
+    otherwise the product's marked price always applies.
+    """
+    merged = OrderedDict()
+    for line in lines:
+        try:
+            product_id = int(line['product_id'])
+            quantity = int(line['quantity'])
+        except (KeyError, TypeError, ValueError):
+            raise ValueError('Each item needs a product_id and a quantity')
+        if quantity <= 0:
+            raise ValueError('Quantity must be greater than zero')
+        unit_price = line.get('unit_price') if allow_price_override else None
+        if unit_price is not None:
+            try:
+                unit_price = float(unit_price)
+            except (TypeError, ValueError):
+                raise ValueError('Price must be a number')
+            if not unit_price > 0:
+                raise ValueError('Price must be greater than zero')
+
+        if product_id in merged:
+            previous_quantity, previous_price = merged[product_id]
+            if unit_price is not None and previous_price not in (None, unit_price):
+                raise ValueError('The same product cannot be sold at two prices in one basket')
+            merged[product_id] = (previous_quantity + quantity,
+                                  previous_price if previous_price is not None else unit_price)
+        else:
+            merged[product_id] = (quantity, unit_price)
+    return [(product_id, quantity, unit_price) for product_id, (quantity, unit_price) in merged.items()]
+
+
+def checkout(shop_id, user_id, lines, payment_method='cash', customer_name=None,
+             sale_date=None, record_payment=True, allow_price_override=False):
+    """Sell a basket atomically.
+
+    `lines` is an iterable of dicts with product_id and quantity, priced at
+    the product's marked price. Only callers that have checked the user may
+    set prices pass `allow_price_override`, in which case a line's positive
+    unit_price replaces the marked price. Returns (sales, financial_record,
+    total). Raises ValueError, with nothing written, on invalid input or
+    when any line is out of stock.
+    """
+    if payment_method not in PAYMENT_METHODS:
+        raise ValueError('Invalid payment method')
+    items = _merge_lines(lines, allow_price_override)
+    if not items:
+        raise ValueError('The basket is empty')
+
+    sale_date = sale_date or datetime.now()
+    products = {product.id: product for product in
+                Product.query.filter(Product.id.in_([product_id for product_id, _, _ in items]))}
+    missing = [product_id for product_id, _, _ in items if product_id not in products]
+    if missing:
+        raise ValueError(f'Product not found: {missing[0]}')
+
+    try:
+        # Lock inventory rows in a fixed order so concurrent baskets cannot deadlock
+        for product_id, quantity, _ in sorted(items):
+            result = db.session.execute(
+                update(Inventory)
+                .where(Inventory.shop_id == shop_id,
+                       Inventory.product_id == product_id,
+                       Inventory.quantity >= quantity)
+                .values(quantity=Inventory.quantity - quantity, updated_at=sale_date)
+                .execution_options(synchronize_session=False)
+            )
+            if result.rowcount != 1:
+                raise ValueError(f'Not enough stock available for {products[product_id].name}')
+
+        sales = []
+        total = 0.0
+        for product_id, quantity, unit_price in items:
+            product = products[product_id]
+            if unit_price is None:
+                unit_price = product.marked_price
+            line_total = unit_price * quantity
+            total += line_total
+            sales.append(Sale(
+                shop_id=shop_id,
+                product_id=product_id,
+                quantity=quantity,
+                unit_price=unit_price,
+                line_total=line_total,
+                customer_name=customer_name,
+                payment_method=payment_method,
+                sale_date=sale_date
+            ))
+        db.session.add_all(sales)
+
+        financial_record = None
+        if record_payment:
+            if len(sales) == 1:
+                description = f'Sale of {sales[0].quantity} {products[sales[0].product_id].name}'
+            else:
+                description = f'Sale of {sum(sale.quantity for sale in sales)} items ({len(sales)} products)'
+            financial_record = FinancialRecord(
+                shop_id=shop_id,
+                type=payment_method,
+                amount=total,
+                description=description,
+                date=sale_date,
+                created_by=user_id
+            )
+            db.session.add(financial_record)
+
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+
+    return sales, financial_record, total
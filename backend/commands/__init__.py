@@ -1,4 +1,5 @@
 import click
+import os
 from flask.cli import with_appcontext
 from database import db, Shop, User, Resource
 from datetime import datetime
@@ -185,4 +186,266 @@ def create_default_resources():
     except Exception as e:
         logger.error(f"Error creating default resources: {str(e)}")
         db.session.rollback()
-        raise click.ClickException(str(e)) 
\ No newline at end of file
+        raise click.ClickException(str(e)) 
+
+@click.command()
+@with_appcontext
+def check_query_plans():
+    """Fail if a hot shop/date query falls back to a full table scan."""
+    from query_plans import check_query_plans as run_checks, hot_queries
+
+    failures = run_checks()
+    for name, _ in hot_queries():
+        if name in failures:
+            click.echo(f"FAIL {name}: {'; '.join(failures[name])}")
+        else:
+            click.echo(f"ok   {name}")
+
+    if failures:
+        raise click.ClickException(f"{len(failures)} queries fall back to a full table scan")
+    click.echo("All hot queries use an index.")
+
+
+@click.command()
+@click.option('--shop-id', 'shop_ids', type=int, multiple=True, help='Limit the rebuild to these shops.')
+@click.option('--start', type=click.DateTime(formats=['%Y-%m-%d']), help='First day to rebuild (inclusive).')
+@click.option('--end', type=click.DateTime(formats=['%Y-%m-%d']), help='Last day to rebuild (inclusive).')
+@with_appcontext
+def rebuild_daily_totals(shop_ids, start, end):
+    """Recompute shop_daily_totals from raw sales, service sales and expenses."""
+    from database.daily_totals import rebuild_daily_totals as rebuild
+
+    try:
+        written = rebuild(
+            shop_ids=list(shop_ids) or None,
+            start_day=start.date() if start else None,
+            end_day=end.date() if end else None
+        )
+        click.echo(f"Rebuilt {written} daily total rows.")
+    except Exception as e:
+        logger.error(f"Error rebuilding daily totals: {str(e)}")
+        db.session.rollback()
+        raise click.ClickException(str(e))
+
+
+@click.command()
+@click.option('--batch-size', default=1000, show_default=True, help='Sales updated per transaction.')
+@with_appcontext
+def backfill_sale_prices(batch_size):
+    """Fill unit_price/line_total on sales recorded before prices were stored."""
+    from database import Sale, Product
+
+    price = db.select(Product.marked_price).where(Product.id == Sale.product_id).scalar_subquery()
+    updated = 0
+    last_id = 0
+    try:
+        while True:
+            ids = [row.id for row in db.session.query(Sale.id).filter(
+                Sale.id > last_id,
+                Sale.unit_price.is_(None)
+            ).order_by(Sale.id).limit(batch_size)]
+            if not ids:
+                break
+
+            db.session.execute(
+                Sale.__table__.update()
+                .where(Sale.id.in_(ids))
+                .values(unit_price=price, line_total=Sale.quantity * price)
+            )
+            db.session.commit()
+
+            updated += len(ids)
+            last_id = ids[-1]
+            click.echo(f"Backfilled {updated} sales (up to id {last_id})")
+
+        click.echo(f"Done. {updated} sales backfilled.")
+    except Exception as e:
+        logger.error(f"Error backfilling sale prices: {str(e)}")
+        db.session.rollback()
+        raise click.ClickException(str(e))
+
+
+@click.command()
+@click.option('--report-id', 'report_ids', type=int, multiple=True, help='Only consider these reports.')
+@click.option('--at', 'now', type=click.DateTime(formats=['%Y-%m-%d', '%Y-%m-%dT%H:%M']),
+              help='Pretend the current time is this (for catching up missed periods).')
+@with_appcontext
+def generate_scheduled_reports(report_ids, now):
+    """Precompute daily/weekly/monthly reports for their last closed period (run from cron, off-peak)."""
+    from report_scheduler import generate_due_reports
+
+    generated, skipped, failed = generate_due_reports(now=now, report_ids=list(report_ids) or None)
+    click.echo(f"Generated {generated} reports, {skipped} already up to date, {failed} failed.")
+    if failed:
+        raise click.ClickException(f"{failed} scheduled reports failed; see the log for details.")
+
+
+@click.command()
+@click.option('--shops', default=5, show_default=True, help='Shops to create.')
+@click.option('--products', 'products_per_shop', default=1000, show_default=True, help='Products per shop.')
+@click.option('--days', default=365, show_default=True, help='Days of history ending today.')
+@click.option('--sales-per-day', default=300, show_default=True, help='Average product sales per shop per day.')
+@click.option('--seed', default=42, show_default=True, help='Random seed; the same seed gives the same data.')
+@click.option('--batch-size', default=5000, show_default=True, help='Rows per insert batch and commit.')
+@with_appcontext
+def seed_synthetic(shops, products_per_shop, days, sales_per_day, seed, batch_size):
+    """Bulk-generate a multi-shop dataset with seasonal sales history for load testing."""
+    from synthetic_data import SyntheticDataGenerator, DEFAULT_PASSWORD
+
+    started = datetime.now()
+    generator = SyntheticDataGenerator(
+        shops=shops, products_per_shop=products_per_shop, days=days,
+        sales_per_day=sales_per_day, seed=seed, batch_size=batch_size, echo=click.echo
+    )
+    try:
+        shop_ids = generator.run()
+    except Exception as e:
+        logger.error(f"Error generating synthetic data: {str(e)}")
+        db.session.rollback()
+        raise click.ClickException(str(e))
+
+    for table, count in sorted(generator.counts.items()):
+        click.echo(f"  {table}: {count} rows")
+    click.echo(f"Created shops {shop_ids} in {(datetime.now() - started).total_seconds():.1f}s. "
+               f"Staff accounts use the password '{DEFAULT_PASSWORD}'.")
+
+
+@click.command()
+@click.option('--repeat', default=5, show_default=True, help='Timed runs per case.')
+@click.option('--warmup', default=1, show_default=True, help='Untimed runs per case.')
+@click.option('--case', 'cases', multiple=True, help='Only run these cases (e.g. admin.dashboard).')
+@click.option('--baseline', 'baseline_path', default=os.path.join('instance', 'benchmark_baseline.json'),
+              show_default=True, help='Baseline JSON to compare with or write.')
+@click.option('--save', is_flag=True, help='Store this run as the new baseline.')
+@click.option('--threshold', default=0.2, show_default=True, help='Allowed median slowdown before failing (0.2 = 20%).')
+@with_appcontext
+def benchmark(repeat, warmup, cases, baseline_path, save, threshold):
+    """Time the hot routes against a seeded SQLite database and compare with the baseline."""
+    from benchmarks import benchmark_context, run_benchmarks, compare, load_baseline, save_baseline
+    from flask import current_app
+    from synthetic_data import SyntheticDataGenerator
+
+    if db.engine.dialect.name != 'sqlite':
+        raise click.ClickException("Benchmarks write sales; point DEV_DATABASE_URL at a SQLite file first.")
+
+    context = benchmark_context()
+    if context is None:
+        click.echo("No synthetic data found; seeding 3 shops (this takes a minute)...")
+        SyntheticDataGenerator(shops=3, products_per_shop=500, days=180, sales_per_day=200).run()
+        context = benchmark_context()
+
+    results = run_benchmarks(current_app, context, repeat=repeat, warmup=warmup, only=set(cases) or None)
+    baseline = load_baseline(baseline_path)
+
+    click.echo(f"{'case':<28}{'median ms':>12}{'p95 ms':>10}{'queries':>9}{'baseline':>11}")
+    for name, result in results.items():
+        previous = ((baseline or {}).get('results', {}).get(name) or {}).get('median_ms')
+        click.echo(f"{name:<28}{result['median_ms']:>12.2f}{result['p95_ms']:>10.2f}{result['statements']:>9}"
+                   f"{previous if previous is not None else '-':>11}")
+
+    if save:
+        save_baseline(baseline_path, results, repeat)
+        click.echo(f"Baseline written to {baseline_path}")
+    elif baseline:
+        regressions = compare(results, baseline, threshold)
+        for name, before, after, change in regressions:
+            click.echo(f"REGRESSION {name}: {before:.2f} ms -> {after:.2f} ms (+{change:.0%})")
+        if regressions:
+            raise click.ClickException(f"{len(regressions)} cases slower than baseline by more than {threshold:.0%}.")
+    else:
+        click.echo(f"No baseline at {baseline_path}; rerun with --save to record one.")
+
+
+@click.command()
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--shop-id', required=True, type=int, help='Shop that owns the imported products.')
+@click.option('--inventory-shop', 'inventory_shop_ids', type=int, multiple=True,
+              help="Shops to create stock rows in (default: every shop of the owning shop's admin).")
+@click.option('--stock-shop', 'stock_shop_ids', type=int, multiple=True,
+              help="Shops whose opening stock is the file's quantity column (default: --shop-id); others start at 0.")
+@click.option('--batch-size', default=5000, show_default=True, help='Products inserted per transaction.')
+@with_appcontext
+def import_catalog(path, shop_id, inventory_shop_ids, stock_shop_ids, batch_size):
+    """Bulk-import products from a CSV/XLSX catalogue (name, barcode, category, marked_price[, reorder_level, quantity])."""
+    from catalog_import import read_catalog, import_catalog as run_import
+
+    shop = Shop.query.get(shop_id)
+    if not shop:
+        raise click.ClickException(f"Shop {shop_id} not found.")
+    if not inventory_shop_ids:
+        inventory_shop_ids = [s.id for s in Shop.query.filter_by(admin_id=shop.admin_id)] or [shop_id]
+
+    try:
+        with open(path, 'rb') as f:
+            result = run_import(read_catalog(f, path), shop_id, inventory_shop_ids=inventory_shop_ids,
+                                stock_shop_ids=stock_shop_ids or [shop_id], batch_size=batch_size)
+    except ValueError as e:
+        raise click.ClickException(str(e))
+    except Exception as e:
+        logger.error(f"Error importing catalog: {str(e)}")
+        db.session.rollback()
+        raise click.ClickException(str(e))
+
+    for error in result['errors']:
+        click.echo(f"  row {error['row']} ({error['barcode']}): {error['error']}")
+    click.echo(f"Imported {result['created']} products with {result['inventory_rows']} inventory rows; "
+               f"{len(result['errors'])} rows skipped.")
+
+
+@click.command()
+@click.option('--shop-id', 'shop_ids', type=int, multiple=True, help='Limit the sweep to these shops.')
+@click.option('--no-notify', is_flag=True, help='Reconcile alerts without writing notifications.')
+@with_appcontext
+def sweep_stock_alerts(shop_ids, no_notify):
+    """Raise and resolve product and resource low-stock alerts (run from cron every few minutes)."""
+    from alert_engine import sweep
+
+    try:
+        result = sweep(shop_ids=list(shop_ids) or None, notify=not no_notify)
+    except Exception as e:
+        logger.error(f"Error sweeping stock alerts: {str(e)}")
+        raise click.ClickException(str(e))
+    click.echo(f"Raised {result['raised']} alerts, resolved {result['resolved']}, "
+               f"sent {result['notifications']} notifications.")
+
+
+@click.command('compact-chat-memory')
+@click.option('--retention-days', type=int, default=None, help='Drop entries older than this (default MEMORY_RETENTION_DAYS, 0 keeps all).')
+@click.option('--max-entries', type=int, default=None, help='Keep at most this many entries per shop/user (default MEMORY_MAX_ENTRIES).')
+@with_appcontext
+def compact_chat_memory(retention_days, max_entries):
+    """Rewrite chat memory segments without expired, excess or corrupt entries (run from cron daily)."""
+    from pathlib import Path
+    from flask import current_app
+    from memory_store import FileMemoryStore
+
+    if retention_days is None:
+        retention_days = current_app.config.get('MEMORY_RETENTION_DAYS', 180)
+    if max_entries is None:
+        max_entries = current_app.config.get('MEMORY_MAX_ENTRIES', 2000)
+    try:
+        result = FileMemoryStore(Path('instance') / 'memory').compact(
+            retention_days=retention_days or None, max_entries=max_entries or None)
+    except Exception as e:
+        logger.error(f"Error compacting chat memory: {str(e)}")
+        raise click.ClickException(str(e))
+    click.echo(f"Rewrote {result['segments']} segments: kept {result['kept']} entries, removed {result['removed']}.")
+
+
+@click.command('prune-llm-cache')
+@click.option('--max-files', type=int, default=None, help='Keep at most this many cached responses (default LLM_CACHE_MAX_FILES).')
+@with_appcontext
+def prune_llm_cache(max_files):
+    """Delete expired and excess AI responses from LLM_CACHE_DIR (run from cron)."""
+    from flask import current_app
+    from llm_cache import llm_cache
+
+    if not current_app.config.get('LLM_CACHE_DIR'):
+        click.echo("LLM_CACHE_DIR is not set; nothing to prune.")
+        return
+    try:
+        result = llm_cache.prune_disk(max_files=max_files)
+    except Exception as e:
+        logger.error(f"Error pruning LLM cache: {str(e)}")
+        raise click.ClickException(str(e))
+    click.echo(f"Kept {result['kept']} cached responses, removed {result['removed']}.")
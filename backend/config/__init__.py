@@ -11,7 +11,47 @@ class Config:
     # File upload settings
     MAX_CONTENT_LENGTH = 16 * 1024 * 1024  # 16MB max file size
     UPLOAD_FOLDER = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'uploads')
-    
+
+    # Background report jobs (0 workers runs jobs inline in the request)
+    REPORT_JOB_WORKERS = int(os.environ.get('REPORT_JOB_WORKERS', 2))
+    REPORT_ARTIFACT_DIR = os.environ.get('REPORT_ARTIFACT_DIR') or \
+        os.path.join(os.path.abspath('instance'), 'report_artifacts')
+
+    # Seconds a cached dashboard/KPI payload may live without a write to its shop
+    KPI_CACHE_TTL = int(os.environ.get('KPI_CACHE_TTL', 60))
+
+    # Barcode scan cache: entries kept per worker and seconds before a recheck
+    BARCODE_CACHE_SIZE = int(os.environ.get('BARCODE_CACHE_SIZE', 4096))
+    BARCODE_CACHE_TTL = int(os.environ.get('BARCODE_CACHE_TTL', 300))
+
+    # Seconds before an AI performance snapshot is rebuilt over its whole window
+    PERFORMANCE_SNAPSHOT_TTL = int(os.environ.get('PERFORMANCE_SNAPSHOT_TTL', 3600))
+
+    # AI response cache: entries per worker, seconds to live, and an optional
+    # directory shared by all workers (empty disables the disk tier) holding at
+    # most LLM_CACHE_MAX_FILES entries
+    LLM_CACHE_SIZE = int(os.environ.get('LLM_CACHE_SIZE', 512))
+    LLM_CACHE_TTL = int(os.environ.get('LLM_CACHE_TTL', 600))
+    LLM_CACHE_DIR = os.environ.get('LLM_CACHE_DIR', '')
+    LLM_CACHE_MAX_FILES = int(os.environ.get('LLM_CACHE_MAX_FILES', 10000))
+
+    # AI providers: total seconds a chat answer may take across failover, seconds
+    # before a slow provider is hedged with the next one (0 disables hedging), and
+    # consecutive failures that open a provider's circuit for AI_BREAKER_RESET seconds
+    AI_PROVIDER_TIMEOUT = float(os.environ.get('AI_PROVIDER_TIMEOUT', 20))
+    AI_HEDGE_AFTER = float(os.environ.get('AI_HEDGE_AFTER', 0))
+    AI_BREAKER_FAILURES = int(os.environ.get('AI_BREAKER_FAILURES', 3))
+    AI_BREAKER_RESET = int(os.environ.get('AI_BREAKER_RESET', 60))
+
+    # Chat memory: seconds buffered writes may wait for a group flush, and what
+    # `flask compact-chat-memory` keeps per (shop, user) segment
+    MEMORY_FLUSH_INTERVAL = float(os.environ.get('MEMORY_FLUSH_INTERVAL', 0.2))
+    MEMORY_RETENTION_DAYS = int(os.environ.get('MEMORY_RETENTION_DAYS', 180))
+    MEMORY_MAX_ENTRIES = int(os.environ.get('MEMORY_MAX_ENTRIES', 2000))
+
+    # Per-request SQL counters, X-SQL-* headers and /debug/sql
+    SQL_METRICS_ENABLED = os.environ.get('SQL_METRICS_ENABLED', '0') == '1'
+
     # Security settings
     SESSION_COOKIE_SECURE = True
     SESSION_COOKIE_HTTPONLY = True
@@ -24,6 +64,7 @@ class Config:
 
 class DevelopmentConfig(Config):
     DEBUG = True
+    SQL_METRICS_ENABLED = os.environ.get('SQL_METRICS_ENABLED', '1') == '1'
     SQLALCHEMY_DATABASE_URI = os.environ.get('DEV_DATABASE_URL') or \
         'sqlite:///' + os.path.join(os.path.dirname(os.path.abspath(__file__)), 'dev.db')
 
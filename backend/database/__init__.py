@@ -10,7 +10,8 @@ from .models import (
     ServiceSale, Resource, ShopResource, Expense, 
     ResourceHistory, ResourceAlert, ResourceCategory, 
     ServiceCategory, FinancialRecord, UnscannedSale,
-    Notification, Report, Settings
+    Notification, Report, Settings, ShopDailyTotal,
+    ReportJob, ProductAlert
 )
 
 __all__ = [
@@ -19,9 +20,13 @@ __all__ = [
     'ShopResource', 'Expense', 'ResourceHistory', 
     'ResourceAlert', 'ResourceCategory', 'ServiceCategory', 
     'FinancialRecord', 'UnscannedSale', 'Notification',
-    'Report', 'Settings'
+    'Report', 'Settings', 'ShopDailyTotal', 'ReportJob',
+    'ProductAlert'
 ]
 
+# Register the shop_daily_totals rollup listeners
+from . import daily_totals  # noqa: E402,F401
+
 def init_db(app):
     app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///smart_retail.db'
     app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
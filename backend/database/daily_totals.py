@@ -0,0 +1,298 @@
+# backend/database/daily_totals.py
+"""
+Incrementally maintained per-shop daily totals.
+
+Every Sale, ServiceSale and Expense insert/update/delete adjusts the
+matching shop_daily_totals row on the flush connection, so the rollup is
+written in the same transaction as the source row. Account views read
+O(days) rollup rows instead of O(transactions) raw rows.
+"""
+
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+from sqlalchemy import event, func, select
+
+from . import db
+from .models import Sale, ServiceSale, Expense, Product, ShopDailyTotal
+
+PAYMENT_METHODS = ('cash', 'till', 'bank')
+MONEY_COLUMNS = ('cash', 'till', 'bank', 'product_revenue', 'service_revenue', 'expenses')
+COUNT_COLUMNS = ('units_sold', 'sale_count', 'service_count')
+TOTAL_COLUMNS = MONEY_COLUMNS + COUNT_COLUMNS
+
+_table = ShopDailyTotal.__table__
+
+
+def _as_day(value):
+    if value is None:
+        return datetime.utcnow().date()
+    if isinstance(value, datetime):
+        return value.date()
+    return value
+
+
+def apply_delta(connection, shop_id, day, deltas):
+    """Add `deltas` to the (shop_id, day) rollup row, creating it if needed."""
+    deltas = {k: v for k, v in deltas.items() if k in TOTAL_COLUMNS and v}
+    if shop_id is None or not deltas:
+        return
+
+    dialect = connection.dialect.name
+    if dialect in ('sqlite', 'postgresql'):
+        if dialect == 'sqlite':
+            from sqlalchemy.dialects.sqlite import insert
+        else:
+            from sqlalchemy.dialects.postgresql import insert
+        values = {col: 0 for col in TOTAL_COLUMNS}
+        values.update(deltas)
+        stmt = insert(_table).values(shop_id=shop_id, day=day, **values)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=['shop_id', 'day'],
+            set_={col: _table.c[col] + stmt.excluded[col] for col in deltas}
+        )
+        connection.execute(stmt)
+        return
+
+    # Generic fallback: update first, insert when the row does not exist yet
+    result = connection.execute(
+        _table.update()
+        .where(_table.c.shop_id == shop_id, _table.c.day == day)
+        .values({col: _table.c[col] + value for col, value in deltas.items()})
+    )
+    if result.rowcount == 0:
+        values = {col: 0 for col in TOTAL_COLUMNS}
+        values.update(deltas)
+        connection.execute(_table.insert().values(shop_id=shop_id, day=day, **values))
+
+
+def _negate(deltas):
+    return {k: -v for k, v in deltas.items()}
+
+
+def _sale_contribution(connection, shop_id, product_id, quantity, line_total, payment_method, sale_date):
+    if line_total is None:
+        # Rows written before unit prices were stored on the sale
+        price = connection.execute(
+            select(Product.marked_price).where(Product.id == product_id)
+        ).scalar() or 0
+        line_total = price * int(quantity or 0)
+    total = Decimal(str(line_total))
+    deltas = {'product_revenue': total, 'units_sold': int(quantity or 0), 'sale_count': 1}
+    if payment_method in PAYMENT_METHODS:
+        deltas[payment_method] = total
+    return shop_id, _as_day(sale_date), deltas
+
+
+def _service_contribution(shop_id, price, payment_method, sale_date):
+    amount = Decimal(str(price or 0))
+    deltas = {'service_revenue': amount, 'service_count': 1}
+    if payment_method in PAYMENT_METHODS:
+        deltas[payment_method] = amount
+    return shop_id, _as_day(sale_date), deltas
+
+
+def _expense_contribution(shop_id, amount, expense_date):
+    return shop_id, _as_day(expense_date), {'expenses': Decimal(str(amount or 0))}
+
+
+def _previous(target, attr):
+    """Value of `attr` before the pending change (current value if unchanged)."""
+    history = db.inspect(target).attrs[attr].history
+    if history.deleted:
+        return history.deleted[0]
+    return getattr(target, attr)
+
+
+def _changed(target, attrs):
+    state = db.inspect(target)
+    return any(state.attrs[attr].history.has_changes() for attr in attrs)
+
+
+def _contribution(connection, target, value):
+    if isinstance(target, Sale):
+        return _sale_contribution(connection, value('shop_id'), value('product_id'), value('quantity'),
+                                  value('line_total'), value('payment_method'), value('sale_date'))
+    if isinstance(target, ServiceSale):
+        return _service_contribution(value('shop_id'), value('price'), value('payment_method'),
+                                     value('sale_date'))
+    return _expense_contribution(value('shop_id'), value('amount'), value('date'))
+
+
+_TRACKED_ATTRS = {
+    Sale: ('shop_id', 'product_id', 'quantity', 'line_total', 'payment_method', 'sale_date'),
+    ServiceSale: ('shop_id', 'price', 'payment_method', 'sale_date'),
+    Expense: ('shop_id', 'amount', 'date'),
+}
+
+
+def _after_insert(mapper, connection, target):
+    shop_id, day, deltas = _contribution(connection, target, lambda attr: getattr(target, attr))
+    apply_delta(connection, shop_id, day, deltas)
+
+
+def _after_delete(mapper, connection, target):
+    shop_id, day, deltas = _contribution(connection, target, lambda attr: _previous(target, attr))
+    apply_delta(connection, shop_id, day, _negate(deltas))
+
+
+def _after_update(mapper, connection, target):
+    if not _changed(target, _TRACKED_ATTRS[type(target)]):
+        return
+    shop_id, day, deltas = _contribution(connection, target, lambda attr: _previous(target, attr))
+    apply_delta(connection, shop_id, day, _negate(deltas))
+    _after_insert(mapper, connection, target)
+
+
+def _load_old_value(target, value, oldvalue, initiator):
+    pass  # registered only for active_history
+
+
+for _model, _attrs in _TRACKED_ATTRS.items():
+    # Load the old value before assignment, even on an expired instance, so
+    # _previous can take the old contribution back out of its rollup row
+    for _attr in _attrs:
+        event.listen(getattr(_model, _attr), 'set', _load_old_value, active_history=True)
+    event.listen(_model, 'after_insert', _after_insert)
+    event.listen(_model, 'after_update', _after_update)
+    event.listen(_model, 'after_delete', _after_delete)
+
+
+def rebuild_daily_totals(shop_ids=None, start_day=None, end_day=None):
+    """Recompute rollup rows from raw sales, service sales and expenses.
+
+    Scoped by optional shop ids and an inclusive day range. Returns the
+    number of rollup rows written.
+    """
+    def scoped(query, shop_col, date_col):
+        if shop_ids:
+            query = query.filter(shop_col.in_(shop_ids))
+        if start_day:
+            query = query.filter(date_col >= datetime.combine(start_day, datetime.min.time()))
+        if end_day:
+            query = query.filter(date_col < datetime.combine(end_day + timedelta(days=1), datetime.min.time()))
+        return query
+
+    rows = {}
+
+    def row_for(shop_id, day):
+        day = _as_day(day) if not isinstance(day, str) else datetime.strptime(day, '%Y-%m-%d').date()
+        key = (shop_id, day)
+        if key not in rows:
+            rows[key] = {col: 0 for col in TOTAL_COLUMNS}
+        return rows[key]
+
+    sale_day = func.date(Sale.sale_date)
+    sale_total = func.coalesce(Sale.line_total, Sale.quantity * Product.marked_price)
+    sales = scoped(
+        db.session.query(
+            Sale.shop_id, sale_day, Sale.payment_method,
+            func.coalesce(func.sum(sale_total), 0),
+            func.coalesce(func.sum(Sale.quantity), 0),
+            func.count(Sale.id)
+        ).join(Product, Product.id == Sale.product_id),
+        Sale.shop_id, Sale.sale_date
+    ).group_by(Sale.shop_id, sale_day, Sale.payment_method)
+    for shop_id, day, method, total, units, count in sales:
+        row = row_for(shop_id, day)
+        row['product_revenue'] += Decimal(str(total))
+        row['units_sold'] += int(units)
+        row['sale_count'] += int(count)
+        if method in PAYMENT_METHODS:
+            row[method] += Decimal(str(total))
+
+    service_day = func.date(ServiceSale.sale_date)
+    services = scoped(
+        db.session.query(
+            ServiceSale.shop_id, service_day, ServiceSale.payment_method,
+            func.coalesce(func.sum(ServiceSale.price), 0),
+            func.count(ServiceSale.id)
+        ),
+        ServiceSale.shop_id, ServiceSale.sale_date
+    ).group_by(ServiceSale.shop_id, service_day, ServiceSale.payment_method)
+    for shop_id, day, method, total, count in services:
+        row = row_for(shop_id, day)
+        row['service_revenue'] += Decimal(str(total))
+        row['service_count'] += int(count)
+        if method in PAYMENT_METHODS:
+            row[method] += Decimal(str(total))
+
+    expense_day = func.date(Expense.date)
+    expenses = scoped(
+        db.session.query(Expense.shop_id, expense_day, func.coalesce(func.sum(Expense.amount), 0)),
+        Expense.shop_id, Expense.date
+    ).group_by(Expense.shop_id, expense_day)
+    for shop_id, day, total in expenses:
+        row_for(shop_id, day)['expenses'] += Decimal(str(total))
+
+    delete = ShopDailyTotal.query
+    if shop_ids:
+        delete = delete.filter(ShopDailyTotal.shop_id.in_(shop_ids))
+    if start_day:
+        delete = delete.filter(ShopDailyTotal.day >= start_day)
+    if end_day:
+        delete = delete.filter(ShopDailyTotal.day <= end_day)
+    delete.delete(synchronize_session=False)
+
+    db.session.bulk_insert_mappings(ShopDailyTotal, [
+        dict(shop_id=shop_id, day=day, **totals) for (shop_id, day), totals in rows.items()
+    ])
+    db.session.commit()
+    return len(rows)
+
+
+def _empty_day(day):
+    totals = {col: Decimal('0.00') for col in MONEY_COLUMNS}
+    totals.update({col: 0 for col in COUNT_COLUMNS})
+    totals['day'] = day
+    return totals
+
+
+def load_daily_totals(shop_ids, start_day, end_day):
+    """Return {shop_id: OrderedDict(day -> totals)} with a zero row for every day.
+
+    One indexed query over shop_daily_totals regardless of how many
+    transactions the range covers.
+    """
+    result = {}
+    for shop_id in shop_ids:
+        days = OrderedDict()
+        day = start_day
+        while day <= end_day:
+            days[day] = _empty_day(day)
+            day += timedelta(days=1)
+        result[shop_id] = days
+
+    if not shop_ids:
+        return result
+
+    rows = ShopDailyTotal.query.filter(
+        ShopDailyTotal.shop_id.in_(list(shop_ids)),
+        ShopDailyTotal.day >= start_day,
+        ShopDailyTotal.day <= end_day
+    ).all()
+    for row in rows:
+        totals = result[row.shop_id].get(row.day)
+        if totals is None:
+            continue
+        for col in MONEY_COLUMNS:
+            totals[col] = Decimal(str(getattr(row, col) or 0))
+        for col in COUNT_COLUMNS:
+            totals[col] = int(getattr(row, col) or 0)
+    return result
+
+
+def sum_totals(days):
+    """Sum an iterable of per-day totals dicts into a single totals dict."""
+    summary = _empty_day(None)
+    del summary['day']
+    for totals in days:
+        for col in TOTAL_COLUMNS:
+            summary[col] += totals[col]
+    return summary
+
+
+def net_total(totals):
+    """Cash + till + bank less expenses, as used by every accounts view."""
+    return totals['cash'] + totals['till'] + totals['bank'] - totals['expenses']
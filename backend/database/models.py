@@ -22,6 +22,10 @@ class Shop(db.Model):
     expenses = db.relationship('Expense', back_populates='shop', lazy=True)
     financial_records = db.relationship('FinancialRecord', back_populates='shop', lazy=True)
 
+    __table_args__ = (
+        db.Index('ix_shop_admin_id', 'admin_id'),
+    )
+
     def __repr__(self):
         return f'<Shop {self.name}>'
 
@@ -41,6 +45,10 @@ class User(UserMixin, db.Model):
     managed_employees = db.relationship('User', backref=db.backref('admin', remote_side=[id]), 
                                       foreign_keys=[admin_id])
 
+    __table_args__ = (
+        db.Index('ix_user_admin_id', 'admin_id'),
+    )
+
     def __repr__(self):
         return f'<User {self.email}>'
 
@@ -58,6 +66,10 @@ class Product(db.Model):
 
     shop = db.relationship('Shop', lazy=True)
 
+    __table_args__ = (
+        db.Index('ix_product_shop_created', 'shop_id', 'created_at'),
+    )
+
     def __repr__(self):
         return f'<Product {self.name}>'
 
@@ -69,6 +81,10 @@ class Inventory(db.Model):
     quantity = db.Column(db.Integer, default=0)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
+    __table_args__ = (
+        db.Index('uq_inventory_shop_product', 'shop_id', 'product_id', unique=True),
+    )
+
     def __repr__(self):
         return f'<Inventory {self.shop_id}:{self.product_id}>'
 
@@ -92,16 +108,26 @@ class Sale(db.Model):
     customer_name = db.Column(db.String(100), nullable=True)
     payment_method = db.Column(db.String(20), nullable=False, default='cash')  # cash, till, bank
     sale_date = db.Column(db.DateTime, default=datetime.utcnow)
+    unit_price = db.Column(db.Float, nullable=True)  # Product price captured at checkout
+    line_total = db.Column(db.Float, nullable=True)  # unit_price * quantity
 
     shop = db.relationship('Shop', backref=db.backref('sales', lazy=True))
     product = db.relationship('Product', backref=db.backref('sales', lazy=True))
 
+    __table_args__ = (
+        db.Index('ix_sale_shop_date', 'shop_id', 'sale_date'),
+    )
+
     @property
     def price(self):
+        if self.unit_price is not None:
+            return self.unit_price
         return self.product.marked_price
 
     @property
     def total(self):
+        if self.line_total is not None:
+            return self.line_total
         return self.price * self.quantity
 
     def __repr__(self):
@@ -125,6 +151,10 @@ class Service(db.Model):
     category = db.relationship('ServiceCategory', backref=db.backref('services', lazy=True))
     providers = db.relationship('ServiceProvider', backref='service', lazy=True, cascade='all, delete-orphan')
 
+    __table_args__ = (
+        db.Index('ix_service_shop_id', 'shop_id'),
+    )
+
     def __repr__(self):
         return f'<Service {self.name}>'
 
@@ -159,6 +189,10 @@ class ServiceSale(db.Model):
     shop = db.relationship('Shop', backref=db.backref('service_sales', lazy=True))
     employee = db.relationship('User', backref=db.backref('service_sales', lazy=True))
 
+    __table_args__ = (
+        db.Index('ix_service_sale_shop_date', 'shop_id', 'sale_date'),
+    )
+
     def __repr__(self):
         return f'<ServiceSale {self.id}>'
 
@@ -205,6 +239,10 @@ class ShopResource(db.Model):
     resource = db.relationship('Resource', backref=db.backref('shop_quantities', lazy=True))
     updater = db.relationship('User', backref=db.backref('shop_resource_updates', lazy=True))
 
+    __table_args__ = (
+        db.Index('ix_shop_resource_shop_resource', 'shop_id', 'resource_id'),
+    )
+
     def __repr__(self):
         return f'<ShopResource {self.resource.name} at {self.shop.name}>'
 
@@ -245,6 +283,10 @@ class Expense(db.Model):
     shop = db.relationship('Shop', back_populates='expenses')
     creator = db.relationship('User', backref=db.backref('created_expenses', lazy=True))
 
+    __table_args__ = (
+        db.Index('ix_expense_shop_date', 'shop_id', 'date'),
+    )
+
     def __repr__(self):
         return f'<Expense {self.id}: {self.description}>'
 
@@ -285,9 +327,42 @@ class ResourceAlert(db.Model):
     resource = db.relationship('Resource', backref=db.backref('alerts', lazy=True))
     shop = db.relationship('Shop', backref=db.backref('resource_alerts', lazy=True))
     
+    __table_args__ = (
+        db.Index('ix_resource_alerts_shop_active', 'shop_id', 'is_active'),
+        # One open alert per item; alert_engine inserts with ON CONFLICT DO NOTHING
+        db.Index('uq_resource_alerts_open', 'shop_id', 'resource_id', 'alert_type', unique=True,
+                 postgresql_where=db.text('is_active'), sqlite_where=db.text('is_active')),
+    )
+
     def __repr__(self):
         return f'<ResourceAlert {self.resource_id}:{self.alert_type}>'
 
+class ProductAlert(db.Model):
+    """Low-stock alert for a product in one shop, raised and resolved by alert_engine."""
+    __tablename__ = 'product_alert'
+
+    id = db.Column(db.Integer, primary_key=True)
+    product_id = db.Column(db.Integer, db.ForeignKey('product.id', ondelete='CASCADE'), nullable=False)
+    shop_id = db.Column(db.Integer, db.ForeignKey('shop.id'), nullable=False)
+    alert_type = db.Column(db.String(20), nullable=False, default='low_stock')
+    message = db.Column(db.Text, nullable=False)
+    is_active = db.Column(db.Boolean, default=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    resolved_at = db.Column(db.DateTime)
+
+    # Relationships
+    product = db.relationship('Product', backref=db.backref('alerts', lazy=True, passive_deletes=True))
+
+    __table_args__ = (
+        db.Index('ix_product_alert_shop_active', 'shop_id', 'is_active'),
+        # One open alert per item; alert_engine inserts with ON CONFLICT DO NOTHING
+        db.Index('uq_product_alert_open', 'shop_id', 'product_id', 'alert_type', unique=True,
+                 postgresql_where=db.text('is_active'), sqlite_where=db.text('is_active')),
+    )
+
+    def __repr__(self):
+        return f'<ProductAlert {self.product_id}:{self.alert_type}>'
+
 class ResourceCategory(db.Model):
     __tablename__ = 'resource_categories'
     
@@ -315,10 +390,48 @@ class FinancialRecord(db.Model):
     # Relationships
     shop = db.relationship('Shop', back_populates='financial_records')
     creator = db.relationship('User', backref=db.backref('created_financial_records', lazy=True))
+
+    __table_args__ = (
+        db.Index('ix_financial_record_shop_date', 'shop_id', 'date'),
+    )
     
     def __repr__(self):
         return f'<FinancialRecord {self.id}: {self.type} {self.amount}>'
 
+class ShopDailyTotal(db.Model):
+    """Per-shop, per-day rollup of revenue, expenses and transaction counts.
+
+    Maintained incrementally by the listeners in database/daily_totals.py; rebuild
+    with `flask rebuild-daily-totals`.
+    """
+    __tablename__ = 'shop_daily_totals'
+
+    id = db.Column(db.Integer, primary_key=True)
+    shop_id = db.Column(db.Integer, db.ForeignKey('shop.id'), nullable=False)
+    day = db.Column(db.Date, nullable=False)
+    cash = db.Column(db.Numeric(12, 2), nullable=False, default=0)
+    till = db.Column(db.Numeric(12, 2), nullable=False, default=0)
+    bank = db.Column(db.Numeric(12, 2), nullable=False, default=0)
+    product_revenue = db.Column(db.Numeric(12, 2), nullable=False, default=0)
+    service_revenue = db.Column(db.Numeric(12, 2), nullable=False, default=0)
+    expenses = db.Column(db.Numeric(12, 2), nullable=False, default=0)
+    units_sold = db.Column(db.Integer, nullable=False, default=0)
+    sale_count = db.Column(db.Integer, nullable=False, default=0)
+    service_count = db.Column(db.Integer, nullable=False, default=0)
+
+    shop = db.relationship('Shop', backref=db.backref('daily_totals', lazy=True))
+
+    __table_args__ = (
+        db.UniqueConstraint('shop_id', 'day', name='uq_shop_daily_totals_shop_day'),
+    )
+
+    @property
+    def revenue(self):
+        return (self.cash or 0) + (self.till or 0) + (self.bank or 0)
+
+    def __repr__(self):
+        return f'<ShopDailyTotal {self.shop_id}:{self.day}>'
+
 class Notification(db.Model):
     """Model for shop notifications."""
     __tablename__ = 'notification'
@@ -360,6 +473,49 @@ class Report(db.Model):
     def __repr__(self):
         return f'<Report {self.id}: {self.title}>'
 
+class ReportJob(db.Model):
+    """A report or export generated in the background job pool."""
+    __tablename__ = 'report_job'
+
+    id = db.Column(db.Integer, primary_key=True)
+    report_id = db.Column(db.Integer, db.ForeignKey('report.id', ondelete='SET NULL'))
+    shop_id = db.Column(db.Integer, db.ForeignKey('shop.id'))
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    type = db.Column(db.String(50), nullable=False)  # key into report_builders.REPORT_BUILDERS
+    parameters = db.Column(db.JSON)
+    status = db.Column(db.String(20), nullable=False, default='queued')  # 'queued', 'running', 'succeeded', 'failed'
+    progress = db.Column(db.Integer, nullable=False, default=0)  # percent
+    message = db.Column(db.String(255))
+    artifact_path = db.Column(db.String(500))
+    artifact_name = db.Column(db.String(255))
+    summary = db.Column(db.JSON)
+    error = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
+    started_at = db.Column(db.DateTime)
+    finished_at = db.Column(db.DateTime)
+
+    # Relationships
+    report = db.relationship('Report', backref=db.backref('jobs', lazy=True, passive_deletes=True))
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'report_id': self.report_id,
+            'type': self.type,
+            'parameters': self.parameters,
+            'status': self.status,
+            'progress': self.progress,
+            'message': self.message,
+            'summary': self.summary,
+            'error': self.error,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'started_at': self.started_at.isoformat() if self.started_at else None,
+            'finished_at': self.finished_at.isoformat() if self.finished_at else None
+        }
+
+    def __repr__(self):
+        return f'<ReportJob {self.id}: {self.type} {self.status}>'
+
 class Settings(db.Model):
     __tablename__ = 'settings'
     id = db.Column(db.Integer, primary_key=True)
@@ -377,25 +533,27 @@ class Settings(db.Model):
 # Event listeners for resource tracking
 @event.listens_for(ShopResource, 'after_update')
 def track_resource_changes(mapper, connection, target):
-    """Track changes to resource quantities"""
-    if db.inspect(target).attrs.quantity.history.has_changes():
-        history = ResourceHistory(
+    """Track changes to resource quantities (low-stock alerts are raised by alert_engine)"""
+    history = db.inspect(target).attrs.quantity.history
+    if history.has_changes():
+        # Write through the flush's connection; adding objects to the session mid-flush is unsupported
+        connection.execute(ResourceHistory.__table__.insert().values(
             resource_id=target.resource_id,
             shop_id=target.shop_id,
-            previous_quantity=db.inspect(target).attrs.quantity.history.deleted[0],
+            previous_quantity=history.deleted[0] if history.deleted else 0,
             new_quantity=target.quantity,
             change_type='adjust',
             updated_by=target.updated_by
-        )
-        db.session.add(history)
-        
-        # Check for low stock alerts
-        resource = Resource.query.get(target.resource_id)
-        if target.quantity <= resource.reorder_level:
-            alert = ResourceAlert(
-                resource_id=target.resource_id,
-                shop_id=target.shop_id,
-                alert_type='low_stock',
-                message=f'Low stock alert: {resource.name} is below reorder level ({resource.reorder_level})'
-            )
-            db.session.add(alert)
+        ))
+
+# Event listeners for sale pricing
+@event.listens_for(Sale, 'before_insert')
+@event.listens_for(Sale, 'before_update')
+def capture_sale_price(mapper, connection, target):
+    """Persist the unit price at checkout and keep line_total in step with quantity"""
+    if target.unit_price is None and target.product_id is not None:
+        target.unit_price = connection.execute(
+            db.select(Product.marked_price).where(Product.id == target.product_id)
+        ).scalar()
+    if target.unit_price is not None:
+        target.line_total = target.unit_price * (target.quantity or 0)
@@ -1,16 +1,17 @@
 from flask import Blueprint, render_template, redirect, url_for, flash, request, current_app, jsonify
 from flask_login import login_required, current_user
 from database.models import db, Shop, Product, Inventory, Sale, Service, ServiceSale, User, Resource, ShopResource, ResourceUpdate, Expense, ResourceAlert, ResourceHistory, ServiceCategory, FinancialRecord, ServiceProvider
+from database.daily_totals import load_daily_totals, net_total
+from exports import EXPORT_BATCH_SIZE, XlsxSheet, send_xlsx
+from kpi_cache import kpi_cache
+from checkout import checkout
+from barcode_cache import lookup as lookup_barcode
+from alert_engine import low_stock_counts, low_stock_products
 from datetime import datetime, timedelta
 import logging
 from sqlalchemy import func, desc, text
-import pandas as pd
-from io import BytesIO
-from werkzeug.utils import send_file
 import json
 from config import Config
-from decimal import Decimal
-import xlsxwriter
 
 employee_bp = Blueprint('employee', __name__)
 
@@ -23,61 +24,65 @@ logger = logging.getLogger(__name__)
 @login_required
 def dashboard():
     try:
-        # Get the shop
-        shop = Shop.query.get(current_user.shop_id)
+        shop_id = current_user.shop_id
+        context = kpi_cache.get_or_set('employee.dashboard', [shop_id],
+                                       lambda: _dashboard_context(shop_id))
+        return render_template('employee/dashboard.html', **context)
 
-        # Get today's date
-        today = datetime.now().date()
+    except Exception as e:
+        logger.error(f"Error loading dashboard: {str(e)}")
+        flash('Error loading dashboard. Please try again.', 'error')
+        return redirect(url_for('employee.dashboard'))
 
-        # Get today's sales
-        today_sales = Sale.query.filter(
-            Sale.shop_id == current_user.shop_id,
-            db.func.date(Sale.sale_date) == today
-        ).all()
 
-        # Get today's service income
-        today_service_sales = ServiceSale.query.filter(
-            ServiceSale.shop_id == current_user.shop_id,
-            db.func.date(ServiceSale.sale_date) == today
-        ).all()
+def _dashboard_context(shop_id):
+    """Template context for the employee dashboard, as plain data so it can be cached."""
+    # Get the shop
+    shop = Shop.query.get(shop_id)
 
-        # Calculate today's totals
-        today_sales_total = sum(sale.product.marked_price * sale.quantity for sale in today_sales)
-        today_service_income = sum(sale.price for sale in today_service_sales)
-        today_transactions = len(today_sales) + len(today_service_sales)
+    # Today's totals come from the daily rollup row
+    today = datetime.now().date()
+    totals = load_daily_totals([shop_id], today, today)[shop_id][today]
+    today_transactions = totals['sale_count'] + totals['service_count']
 
-        # Get active services
-        active_services = ServiceSale.query.filter(
-            ServiceSale.shop_id == current_user.shop_id,
-            ServiceSale.status == 'active'
-        ).order_by(ServiceSale.sale_date.desc()).all()
+    # Get active services
+    active_services = ServiceSale.query.options(db.joinedload(ServiceSale.service)).filter(
+        ServiceSale.shop_id == shop_id,
+        ServiceSale.status == 'active'
+    ).order_by(ServiceSale.sale_date.desc()).all()
 
-        # Get recent sales (last 5)
-        recent_sales = Sale.query.filter_by(shop_id=current_user.shop_id)\
-            .order_by(Sale.sale_date.desc())\
-            .limit(5)\
-            .all()
+    # Get recent sales (last 5)
+    recent_sales = Sale.query.options(db.joinedload(Sale.product))\
+        .filter_by(shop_id=shop_id)\
+        .order_by(Sale.sale_date.desc())\
+        .limit(5)\
+        .all()
 
-        # Get low stock items
-        low_stock_items = Inventory.query.filter_by(
-            shop_id=current_user.shop_id) .filter(
-            Inventory.quantity < 10) .all()
-
-        return render_template('employee/dashboard.html',
-                               shop=shop,
-                               today_sales=today_sales_total,
-                               today_service_income=today_service_income,
-                               today_transactions=today_transactions,
-                               active_services=active_services,
-                               active_services_count=len(active_services),
-                               recent_sales=recent_sales,
-                               low_stock_items=low_stock_items,
-                               low_stock_count=len(low_stock_items))
-
-    except Exception as e:
-        logger.error(f"Error loading dashboard: {str(e)}")
-        flash('Error loading dashboard. Please try again.', 'error')
-        return redirect(url_for('employee.dashboard'))
+    # Count products with an active low-stock alert
+    low_stock_count = low_stock_counts([shop_id]).get(shop_id, 0)
+
+    return dict(
+        shop={'id': shop.id, 'name': shop.name} if shop else None,
+        today_sales=float(totals['product_revenue']),
+        today_service_income=float(totals['service_revenue']),
+        today_transactions=today_transactions,
+        active_services=[{
+            'id': service_sale.id,
+            'service': {'name': service_sale.service.name},
+            'customer_name': service_sale.customer_name,
+            'status': service_sale.status,
+            'sale_date': service_sale.sale_date
+        } for service_sale in active_services],
+        active_services_count=len(active_services),
+        recent_sales=[{
+            'id': sale.id,
+            'product': {'name': sale.product.name},
+            'quantity': sale.quantity,
+            'price': sale.price,
+            'sale_date': sale.sale_date
+        } for sale in recent_sales],
+        low_stock_count=low_stock_count
+    )
 
 
 @employee_bp.route('/products')
@@ -100,19 +105,11 @@ def employee_scan_product():
         if not barcode:
             return jsonify({'error': 'No barcode provided'}), 400
 
-        product = Product.query.filter_by(barcode=barcode).first()
+        product = lookup_barcode(barcode, current_user.shop_id)
         if not product:
             return jsonify({'error': 'Product not found'}), 404
 
-        inventory = Inventory.query.filter_by(product_id=product.id, shop_id=current_user.shop_id).first()
-        return jsonify({
-            'id': product.id,
-            'name': product.name,
-            'barcode': product.barcode,
-            'category': product.category,
-            'marked_price': product.marked_price,
-            'quantity': inventory.quantity if inventory else 0
-        })
+        return jsonify(product)
     except Exception as e:
         current_app.logger.error(f"Scan error: {str(e)}")
         return jsonify({'error': 'Error processing barcode'}), 500
@@ -245,58 +242,17 @@ def new_sale():
                 flash('Please fill in all required fields', 'danger')
                 return redirect(url_for('employee.new_sale'))
 
-            # Validate payment method
-            valid_payment_methods = ['cash', 'till', 'bank']
-            if payment_method not in valid_payment_methods:
-                flash('Invalid payment method', 'danger')
-                return redirect(url_for('employee.new_sale'))
-
-            # Get the product and inventory
-            product = Product.query.get_or_404(product_id)
-            inventory_item = Inventory.query.filter_by(
-                product_id=product_id,
-                shop_id=current_user.shop_id
-            ).first_or_404()
-
-            # Check if we have enough stock
-            if inventory_item.quantity < quantity:
-                flash('Not enough stock available', 'danger')
-                return redirect(url_for('employee.new_sale'))
-
-            # Calculate total amount
-            total_amount = product.marked_price * quantity
-
-            # Create the sale
-            sale = Sale(
-                product_id=product_id,
-                shop_id=current_user.shop_id,
-                quantity=quantity,
-                customer_name=customer_name,
-                payment_method=payment_method,
-                sale_date=datetime.now()
-            )
-
-            # Create financial record
-            financial_record = FinancialRecord(
-                shop_id=current_user.shop_id,
-                type=payment_method,
-                amount=total_amount,
-                description=f'Sale of {quantity} {product.name}',
-                date=datetime.now(),
-                created_by=current_user.id
-            )
-
-            # Update inventory
-            inventory_item.quantity -= quantity
-
-            # Add records to session
-            db.session.add(sale)
-            db.session.add(financial_record)
-            db.session.commit()
+            checkout(current_user.shop_id, current_user.id,
+                     [{'product_id': product_id, 'quantity': quantity}],
+                     payment_method=payment_method,
+                     customer_name=customer_name)
 
             flash('Sale recorded successfully', 'success')
             return redirect(url_for('employee.dashboard'))
 
+        except ValueError as e:
+            flash(str(e), 'danger')
+            return redirect(url_for('employee.new_sale'))
         except Exception as e:
             db.session.rollback()
             flash('Error recording sale', 'danger')
@@ -314,17 +270,42 @@ def new_sale():
                            products=products)
 
 
+@employee_bp.route('/sales/checkout', methods=['POST'])
+@login_required
+def checkout_basket():
+    """Sell a whole basket: {"items": [{"product_id", "quantity"}], "payment_method", "customer_name"}."""
+    try:
+        payload = request.get_json(silent=True) or {}
+        sales, _, total = checkout(current_user.shop_id, current_user.id,
+                                   payload.get('items') or [],
+                                   payment_method=payload.get('payment_method', 'cash'),
+                                   customer_name=payload.get('customer_name'))
+        return jsonify({
+            'sale_ids': [sale.id for sale in sales],
+            'items': len(sales),
+            'total_amount': total
+        }), 201
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        current_app.logger.error(f"Checkout error: {str(e)}", exc_info=True)
+        return jsonify({'error': 'Error recording sale'}), 500
+
+
 @employee_bp.route('/sales')
 @login_required
 def sales_list():
     shop = Shop.query.get(current_user.shop_id)
     sales = Sale.query.filter_by(shop_id=current_user.shop_id)\
+        .options(db.joinedload(Sale.product))\
         .order_by(Sale.sale_date.desc())\
         .all()
 
-    # Calculate total sales and items
-    total_sales = sum(sale.product.marked_price * sale.quantity for sale in sales)
-    total_items = len(sales)
+    # Calculate total sales and items in SQL from the stored line totals
+    total_sales, total_items = db.session.query(
+        func.coalesce(func.sum(Sale.line_total), 0.0),
+        func.count(Sale.id)
+    ).filter(Sale.shop_id == current_user.shop_id).one()
 
     return render_template('employee/sales.html',
                            shop=shop,
@@ -378,10 +359,7 @@ def ai_assistant():
         ).all()
 
         # Get stock status
-        low_stock_items = Inventory.query.filter(
-            Inventory.shop_id == current_user.shop_id,
-            Inventory.quantity < 10
-        ).all()
+        low_stock_items = low_stock_products([current_user.shop_id])
 
         # Calculate metrics
         def calculate_metrics(sales, services):
@@ -425,7 +403,7 @@ def ai_assistant():
             'week_metrics': week_metrics,
             'month_metrics': month_metrics,
             'low_stock_count': len(low_stock_items),
-            'low_stock_items': [item.product.name for item in low_stock_items],
+            'low_stock_items': [product.name for product in low_stock_items],
             'current_date': today.strftime("%B %d, %Y")
         }
 
@@ -632,10 +610,7 @@ def analytics():
         }
 
         # Get stock status insights
-        low_stock_items = Inventory.query.filter(
-            Inventory.shop_id == current_user.shop_id,
-            Inventory.quantity < 10
-        ).count()
+        low_stock_items = low_stock_counts([current_user.shop_id]).get(current_user.shop_id, 0)
         
         stock_status = f"{low_stock_items} items are running low on stock" if low_stock_items > 0 else "All items are well stocked"
 
@@ -926,15 +901,12 @@ def handle_time_query(message):
 def get_stock_status_insights():
     """Generate stock status insights."""
     try:
-        low_stock_items = Inventory.query.filter(
-            Inventory.shop_id == current_user.shop_id,
-            Inventory.quantity < 10
-        ).all()
+        low_stock_items = low_stock_counts([current_user.shop_id]).get(current_user.shop_id, 0)
         total_items = Inventory.query.filter_by(
             shop_id=current_user.shop_id).count()
 
         if low_stock_items:
-            return f"{len(low_stock_items)} out of {total_items} items need restocking"
+            return f"{low_stock_items} out of {total_items} items need restocking"
         return f"All {total_items} items are well-stocked"
 
     except Exception as e:
@@ -1340,50 +1312,34 @@ def export_resources():
             flash('No shop found for this user.', 'error')
             return redirect(url_for('employee.resources'))
 
-        # Get all resources
-        resources = Resource.query.all()
-        
-        # Create DataFrame
-        data = []
-        for resource in resources:
-            shop_resource = ShopResource.query.filter_by(
-                shop_id=shop.id,
-                resource_id=resource.id
-            ).first()
-            
-            row = {
-                'Resource ID': resource.id,
-                'Name': resource.name,
-                'Category': resource.category,
-                'Unit': resource.unit,
-                'Reorder Level': resource.reorder_level,
-                'Current Quantity': shop_resource.quantity if shop_resource else 0,
-                'Last Updated': shop_resource.updated_at.strftime('%Y-%m-%d %H:%M') if shop_resource and shop_resource.updated_at else 'Never',
-                'Updated By': User.query.get(shop_resource.updated_by).name if shop_resource and shop_resource.updated_by else 'N/A'
-            }
-            data.append(row)
-        
-        df = pd.DataFrame(data)
-        
-        # Create Excel file
-        output = BytesIO()
-        with pd.ExcelWriter(output, engine='xlsxwriter') as writer:
-            df.to_excel(writer, sheet_name='Resources', index=False)
-            
-            # Auto-adjust columns width
-            worksheet = writer.sheets['Resources']
-            for i, col in enumerate(df.columns):
-                max_length = max(df[col].astype(str).apply(len).max(), len(col)) + 2
-                worksheet.set_column(i, i, max_length)
-        
-        output.seek(0)
-        current_app.logger.info("Successfully exported resources data")
-        
-        return send_file(
-            output,
-            mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
-            as_attachment=True,
-            download_name=f'resources_export_{datetime.now().strftime("%Y%m%d_%H%M%S")}.xlsx'
+        # One outer-joined query streams every resource with this shop's stock
+        query = db.session.query(
+            Resource.id, Resource.name, Resource.category, Resource.unit, Resource.reorder_level,
+            ShopResource.quantity, ShopResource.last_updated, User.name
+        ).outerjoin(ShopResource, db.and_(
+            ShopResource.resource_id == Resource.id,
+            ShopResource.shop_id == shop.id
+        )).outerjoin(User, User.id == ShopResource.updated_by).order_by(Resource.id)
+
+        def export_rows():
+            for (resource_id, name, category, unit, reorder_level,
+                 quantity, last_updated, updated_by) in query.yield_per(EXPORT_BATCH_SIZE):
+                yield [
+                    resource_id, name, category, unit, reorder_level,
+                    quantity or 0,
+                    last_updated.strftime('%Y-%m-%d %H:%M') if last_updated else 'Never',
+                    updated_by or 'N/A'
+                ]
+
+        current_app.logger.info("Streaming resources export")
+
+        return send_xlsx(
+            f'resources_export_{datetime.now().strftime("%Y%m%d_%H%M%S")}.xlsx',
+            [XlsxSheet('Resources',
+                       ['Resource ID', 'Name', 'Category', 'Unit', 'Reorder Level',
+                        'Current Quantity', 'Last Updated', 'Updated By'],
+                       export_rows(),
+                       widths={'Name': 30, 'Category': 20, 'Last Updated': 18, 'Updated By': 20})]
         )
         
     except Exception as e:
@@ -1405,78 +1361,35 @@ def accounts():
         # Get today's date
         today = datetime.now().date()
 
-        # Get today's financial records
-        today_records = FinancialRecord.query.filter(
-            FinancialRecord.shop_id == shop.id,
-            func.date(FinancialRecord.date) == today
-        ).all()
-
         # Get today's expenses
         today_expenses = Expense.query.filter(
             Expense.shop_id == shop.id,
             func.date(Expense.date) == today
         ).order_by(Expense.date.desc()).all()
 
-        # Calculate today's totals
-        totals = {
-            'cash': 0,
-            'till': 0,
-            'bank': 0,
-            'expenses': 0
-        }
-
-        # Process today's records
-        for record in today_records:
-            totals[record.type] += float(record.amount or 0)
-
-        # Process today's expenses
-        for expense in today_expenses:
-            totals['expenses'] += float(expense.amount or 0)
-
-        # Calculate grand total
-        totals['grand_total'] = totals['cash'] + totals['till'] + totals['bank'] - totals['expenses']
-
-        # Get historical data (last 30 days)
+        # Read today and the last 30 days from the daily rollup
         start_date = today - timedelta(days=30)
-        historical_records = FinancialRecord.query.filter(
-            FinancialRecord.shop_id == shop.id,
-            FinancialRecord.date >= start_date,
-            FinancialRecord.date < today + timedelta(days=1)
-        ).all()
+        daily_totals = load_daily_totals([shop.id], start_date, today)[shop.id]
 
-        # Get historical expenses
-        historical_expenses = Expense.query.filter(
-            Expense.shop_id == shop.id,
-            Expense.date >= start_date,
-            Expense.date < today + timedelta(days=1)
-        ).all()
-
-        # Process historical data
-        daily_data = {}
-        for record in historical_records:
-            record_date = record.date.date()
-            if record_date not in daily_data:
-                daily_data[record_date] = {
-                    'date': record_date,
-                    'cash': 0,
-                    'till': 0,
-                    'bank': 0,
-                    'expenses': 0
-                }
-            daily_data[record_date][record.type] += float(record.amount or 0)
+        def as_row(day):
+            return {
+                'cash': float(day['cash']),
+                'till': float(day['till']),
+                'bank': float(day['bank']),
+                'expenses': float(day['expenses']),
+                'grand_total': float(net_total(day))
+            }
 
-        # Process historical expenses
-        for expense in historical_expenses:
-            expense_date = expense.date.date()
-            if expense_date in daily_data:
-                daily_data[expense_date]['expenses'] += float(expense.amount or 0)
+        # Calculate today's totals
+        totals = as_row(daily_totals[today])
 
-        # Calculate grand totals and convert to list
+        # Historical data lists only days with activity, newest first
         historical_data = []
-        for date in sorted(daily_data.keys(), reverse=True):
-            data = daily_data[date]
-            data['grand_total'] = data['cash'] + data['till'] + data['bank'] - data['expenses']
-            data['date'] = date.strftime('%Y-%m-%d')  # Convert date to string
+        for day in reversed(list(daily_totals.values())):
+            if not (day['sale_count'] or day['service_count'] or day['expenses']):
+                continue
+            data = as_row(day)
+            data['date'] = day['day'].strftime('%Y-%m-%d')
             historical_data.append(data)
 
         return render_template('employee/accounts.html',
@@ -0,0 +1,61 @@
+"""
+Multi-pattern keyword matcher for routing chat messages to intents.
+
+The phrases of every intent are compiled once into an Aho-Corasick
+automaton (a character trie with failure links), so a message is mapped
+to all intents whose phrases occur in it with a single pass over its
+characters, however many phrases there are. Matching is on lower-cased
+substrings, the same as `phrase in message.lower()`.
+"""
+
+from collections import deque
+
+
+class IntentRouter:
+    """Maps text to the set of intents with at least one phrase occurring in it."""
+
+    def __init__(self, intents):
+        """`intents` is a mapping of intent name to an iterable of phrases."""
+        self._goto = [{}]  # node -> {character: child node}
+        self._fail = [0]
+        self._output = [set()]  # node -> intents whose phrase ends here
+
+        for intent, phrases in intents.items():
+            for phrase in phrases:
+                node = 0
+                for character in phrase.lower():
+                    child = self._goto[node].get(character)
+                    if child is None:
+                        child = len(self._goto)
+                        self._goto[node][character] = child
+                        self._goto.append({})
+                        self._fail.append(0)
+                        self._output.append(set())
+                    node = child
+                self._output[node].add(intent)
+
+        # Breadth-first, so a node's failure target is final before its children need it
+        queue = deque(self._goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for character, child in self._goto[node].items():
+                fail = self._fail[node]
+                while fail and character not in self._goto[fail]:
+                    fail = self._fail[fail]
+                self._fail[child] = self._goto[fail].get(character, 0)
+                self._output[child] |= self._output[self._fail[child]]
+                queue.append(child)
+        self._output = [frozenset(output) for output in self._output]
+
+    def match(self, text):
+        """Intents with a phrase in `text`."""
+        found = set()
+        node = 0
+        goto, fail, output = self._goto, self._fail, self._output
+        for character in (text or '').lower():
+            while node and character not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(character, 0)
+            if output[node]:
+                found.update(output[node])
+        return found
@@ -0,0 +1,152 @@
+"""
+Background job runner for report generation.
+
+Jobs are rows in the report_job table, so their status survives the
+worker that ran them and can be polled from any gunicorn worker. Each
+web process owns a small process pool; a job runs in a pool process with
+its own app context and database session, reports progress by committing
+to its row, and leaves the generated workbook in REPORT_ARTIFACT_DIR.
+With REPORT_JOB_WORKERS set to 0 jobs run inline, which is handy for the
+CLI and for debugging.
+"""
+
+import logging
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+from flask import Flask, current_app
+
+from database import db, ReportJob
+from report_builders import REPORT_BUILDERS
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+_executor_lock = threading.Lock()
+
+# Set in pool processes by _init_worker
+_worker_app = None
+
+
+def _init_worker(config):
+    """Give a pool process a bare app bound to the parent's database."""
+    global _worker_app
+    _worker_app = Flask(__name__)
+    _worker_app.config.update(config)
+    db.init_app(_worker_app)
+
+
+def _get_executor(app):
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            config = {
+                'SQLALCHEMY_DATABASE_URI': app.config['SQLALCHEMY_DATABASE_URI'],
+                'SQLALCHEMY_TRACK_MODIFICATIONS': False,
+                'REPORT_ARTIFACT_DIR': app.config['REPORT_ARTIFACT_DIR'],
+            }
+            # spawn, so children never inherit the parent's pooled DB connections
+            _executor = ProcessPoolExecutor(
+                max_workers=app.config['REPORT_JOB_WORKERS'],
+                mp_context=multiprocessing.get_context('spawn'),
+                initializer=_init_worker,
+                initargs=(config,)
+            )
+        return _executor
+
+
+def enqueue(job_type, parameters, user_id, shop_id=None, report_id=None):
+    """Persist a queued job and hand it to the pool. Returns the job."""
+    if job_type not in REPORT_BUILDERS:
+        raise ValueError(f'Unsupported report type: {job_type}')
+
+    job = ReportJob(
+        report_id=report_id,
+        shop_id=shop_id,
+        user_id=user_id,
+        type=job_type,
+        parameters=parameters or {},
+        status='queued',
+        progress=0
+    )
+    db.session.add(job)
+    db.session.commit()
+
+    app = current_app._get_current_object()
+    if app.config.get('REPORT_JOB_WORKERS', 0) > 0:
+        future = _get_executor(app).submit(run_job, job.id)
+        future.add_done_callback(_log_crash)
+    else:
+        _run(job.id, app.config['REPORT_ARTIFACT_DIR'])
+        db.session.refresh(job)
+    return job
+
+
+def _log_crash(future):
+    error = future.exception()
+    if error is not None:
+        logger.error(f"Report job process failed: {str(error)}")
+
+
+def run_job(job_id):
+    """Pool entry point: run one job inside the worker's app context."""
+    with _worker_app.app_context():
+        try:
+            _run(job_id, _worker_app.config['REPORT_ARTIFACT_DIR'])
+        finally:
+            db.session.remove()
+
+
+def _run(job_id, artifact_dir):
+    job = ReportJob.query.get(job_id)
+    if job is None:
+        logger.error(f"Report job {job_id} not found")
+        return
+
+    builder, prefix = REPORT_BUILDERS[job.type]
+    parameters = dict(job.parameters or {})
+    if job.shop_id:
+        parameters['shop_id'] = job.shop_id
+
+    job.status = 'running'
+    job.started_at = datetime.utcnow()
+    job.message = 'Started'
+    db.session.commit()
+
+    def progress(percent, message=None):
+        job.progress = max(0, min(int(percent), 100))
+        if message:
+            job.message = message[:255]
+        db.session.commit()
+
+    os.makedirs(artifact_dir, exist_ok=True)
+    path = os.path.join(artifact_dir, f'job_{job.id}.xlsx')
+    try:
+        with open(path, 'wb') as output:
+            summary = builder(output, parameters, progress)
+    except Exception as e:
+        db.session.rollback()
+        if os.path.exists(path):
+            os.remove(path)
+        if not isinstance(e, ValueError):
+            logger.error(f"Error running report job {job_id}: {str(e)}")
+        job.status = 'failed'
+        job.error = str(e)
+        job.message = 'Failed'
+        job.finished_at = datetime.utcnow()
+        db.session.commit()
+        return
+
+    job.status = 'succeeded'
+    job.progress = 100
+    job.message = 'Completed'
+    job.summary = summary
+    job.artifact_path = path
+    job.artifact_name = f'{prefix}_{datetime.now().strftime("%Y%m%d_%H%M%S")}.xlsx'
+    job.finished_at = datetime.utcnow()
+    if job.report is not None:
+        job.report.last_generated = job.finished_at
+    db.session.commit()
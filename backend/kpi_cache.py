@@ -0,0 +1,124 @@
+"""
+In-process cache for dashboard and KPI payloads.
+
+Entries are keyed by view, the shops they summarise and any view
+parameters. Committing a change to a Sale, ServiceSale, Expense, Inventory
+or FinancialRecord row drops every entry that covers that row's shop (an
+entry built over all shops is dropped by any such change); the session
+collects the touched shop ids at flush time and applies them only once
+the transaction commits, so rolled-back writes invalidate nothing.
+
+Writes that bypass the ORM session (Core bulk inserts, the backfill
+commands) and writes served by another gunicorn worker are not seen, so
+every entry also expires after KPI_CACHE_TTL seconds.
+
+Cached values are shared between requests and must be treated as
+read-only: build them from plain dicts and lists, not ORM instances.
+"""
+
+import threading
+import time
+from collections import Counter
+
+from flask import current_app
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session
+
+from database import Sale, ServiceSale, Expense, Inventory, FinancialRecord
+
+WATCHED_MODELS = (Sale, ServiceSale, Expense, Inventory, FinancialRecord)
+
+DEFAULT_TTL = 60
+
+# session.info key for shop ids touched by the current transaction
+_PENDING_KEY = 'kpi_cache_shops'
+
+
+class KPICache:
+    """Dictionary cache with per-shop invalidation and hit/miss counters."""
+
+    def __init__(self):
+        self._entries = {}  # key -> (expires_at, value)
+        self._lock = threading.Lock()
+        self.counters = Counter()
+
+    @staticmethod
+    def _key(view, shop_ids, params):
+        shops = None if shop_ids is None else tuple(sorted(set(shop_ids)))
+        return view, shops, tuple(params)
+
+    def get_or_set(self, view, shop_ids, builder, params=(), ttl=None):
+        """Return the cached value for (view, shops, params) or build and store it.
+
+        `shop_ids=None` means the value depends on every shop.
+        """
+        key = self._key(view, shop_ids, params)
+        now = time.monotonic()
+        entry = self._entries.get(key)
+        if entry is not None and entry[0] > now:
+            self.counters['hits'] += 1
+            return entry[1]
+
+        self.counters['misses'] += 1
+        value = builder()
+        if ttl is None:
+            ttl = current_app.config.get('KPI_CACHE_TTL', DEFAULT_TTL)
+        with self._lock:
+            self._entries[key] = (now + ttl, value)
+        return value
+
+    def invalidate_shops(self, shop_ids):
+        shop_ids = set(shop_ids)
+        with self._lock:
+            stale = [key for key in self._entries
+                     if key[1] is None or shop_ids.intersection(key[1])]
+            for key in stale:
+                del self._entries[key]
+        self.counters['invalidations'] += len(stale)
+        return len(stale)
+
+    def clear(self):
+        with self._lock:
+            cleared = len(self._entries)
+            self._entries.clear()
+        self.counters['invalidations'] += cleared
+
+    def stats(self):
+        lookups = self.counters['hits'] + self.counters['misses']
+        return {
+            'entries': len(self._entries),
+            'hits': self.counters['hits'],
+            'misses': self.counters['misses'],
+            'invalidations': self.counters['invalidations'],
+            'hit_rate': round(self.counters['hits'] / lookups, 3) if lookups else None,
+        }
+
+
+kpi_cache = KPICache()
+
+
+def _shop_ids(obj):
+    """Current and (if changed in this flush) previous shop id of a row."""
+    state = inspect(obj)
+    history = state.attrs.shop_id.history
+    return {shop_id for shop_id in (obj.shop_id, *history.deleted) if shop_id is not None}
+
+
+@event.listens_for(Session, 'after_flush')
+def _collect_touched_shops(session, flush_context):
+    touched = session.info.setdefault(_PENDING_KEY, set())
+    for obj in (*session.new, *session.dirty, *session.deleted):
+        if isinstance(obj, WATCHED_MODELS):
+            touched.update(_shop_ids(obj))
+
+
+@event.listens_for(Session, 'after_commit')
+def _invalidate_committed(session):
+    touched = session.info.pop(_PENDING_KEY, None)
+    if touched:
+        kpi_cache.invalidate_shops(touched)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_rolled_back(session):
+    session.info.pop(_PENDING_KEY, None)
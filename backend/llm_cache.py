@@ -0,0 +1,200 @@
+"""
+Response cache for the AI agent's generative calls.
+
+A response is keyed by the normalised user message (lower-cased, runs of
+whitespace collapsed, trailing punctuation dropped), the provider and
+model that produced it, and a SHA-256 fingerprint of the performance
+context embedded in the system prompt. The fingerprint excludes the
+context's timestamp. Lookups use the provider a call would go to first,
+so an answer from a failover provider is only reused while the primary's
+circuit is open. A repeated question against unchanged shop data, such as the fixed
+dashboard recommendation prompt, is then answered without a request to
+OpenAI or Gemini. Once a sale or expense changes the analysis, the
+fingerprint changes and the next call goes to the provider again.
+
+Entries live in a per-worker LRU bounded by LLM_CACHE_SIZE and expire
+after LLM_CACHE_TTL seconds. If LLM_CACHE_DIR is set, entries are also
+written there as one JSON file each. Other gunicorn workers and restarts
+then reuse them, and a disk hit is promoted into the worker's LRU. Only
+provider responses are cached, never the local fallbacks.
+
+The directory is pruned by each worker at most once per LLM_CACHE_TTL,
+after a write, and by `flask prune-llm-cache`. Pruning removes expired
+files and then the oldest ones beyond LLM_CACHE_MAX_FILES.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import re
+import threading
+import time
+from collections import Counter, OrderedDict
+
+from flask import current_app
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SIZE = 512
+DEFAULT_TTL = 600
+DEFAULT_MAX_FILES = 10000
+
+_WHITESPACE_RE = re.compile(r'\s+')
+
+
+def normalize_message(message):
+    return _WHITESPACE_RE.sub(' ', (message or '').lower()).strip().rstrip('?!. ')
+
+
+def context_fingerprint(context):
+    """Stable hash of the prompt context, ignoring when it was generated."""
+    stable = {key: value for key, value in (context or {}).items() if key != 'timestamp'}
+    encoded = json.dumps(stable, sort_keys=True, default=str, separators=(',', ':'))
+    return hashlib.sha256(encoded.encode('utf-8')).hexdigest()
+
+
+def cache_key(message, provider, model, context):
+    parts = (normalize_message(message), provider or '', model or '', context_fingerprint(context))
+    return hashlib.sha256('\x1f'.join(parts).encode('utf-8')).hexdigest()
+
+
+class LLMResponseCache:
+    """Bounded key -> response text mapping with TTL and an optional directory tier."""
+
+    def __init__(self):
+        self._entries = OrderedDict()  # key -> (expires_at monotonic, response)
+        self._lock = threading.Lock()
+        self._pruned_at = time.monotonic()
+        self.counters = Counter()
+
+    def get(self, key):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > now:
+                self._entries.move_to_end(key)
+                self.counters['hits'] += 1
+                return entry[1]
+            self._entries.pop(key, None)
+
+        response = self._read_disk(key)
+        if response is not None:
+            self.counters['disk_hits'] += 1
+            self._remember(key, response)
+            return response
+        self.counters['misses'] += 1
+        return None
+
+    def set(self, key, response):
+        if not response:
+            return
+        self._remember(key, response)
+        self._write_disk(key, response)
+        self.counters['stores'] += 1
+        if time.monotonic() - self._pruned_at >= current_app.config.get('LLM_CACHE_TTL', DEFAULT_TTL):
+            self._pruned_at = time.monotonic()
+            self.prune_disk()
+
+    def _remember(self, key, response):
+        ttl = current_app.config.get('LLM_CACHE_TTL', DEFAULT_TTL)
+        size = current_app.config.get('LLM_CACHE_SIZE', DEFAULT_SIZE)
+        with self._lock:
+            self._entries[key] = (time.monotonic() + ttl, response)
+            self._entries.move_to_end(key)
+            while len(self._entries) > size:
+                self._entries.popitem(last=False)
+                self.counters['evictions'] += 1
+
+    @staticmethod
+    def _disk_path(key):
+        directory = current_app.config.get('LLM_CACHE_DIR')
+        return os.path.join(directory, key[:2], f'{key}.json') if directory else None
+
+    def _read_disk(self, key):
+        path = self._disk_path(key)
+        if not path:
+            return None
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if entry.get('expires_at', 0) <= time.time():
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            return None
+        return entry.get('response')
+
+    def _write_disk(self, key, response):
+        path = self._disk_path(key)
+        if not path:
+            return
+        ttl = current_app.config.get('LLM_CACHE_TTL', DEFAULT_TTL)
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            temporary = f'{path}.{os.getpid()}.tmp'
+            with open(temporary, 'w', encoding='utf-8') as f:
+                json.dump({'expires_at': time.time() + ttl, 'response': response}, f)
+            os.replace(temporary, path)
+        except OSError as e:
+            logger.warning(f"Could not write LLM cache entry: {e}")
+
+    def prune_disk(self, max_files=None):
+        """Delete expired and excess files from LLM_CACHE_DIR; returns {'kept', 'removed'}."""
+        directory = current_app.config.get('LLM_CACHE_DIR')
+        if not directory or not os.path.isdir(directory):
+            return {'kept': 0, 'removed': 0}
+        ttl = current_app.config.get('LLM_CACHE_TTL', DEFAULT_TTL)
+        if max_files is None:
+            max_files = current_app.config.get('LLM_CACHE_MAX_FILES', DEFAULT_MAX_FILES)
+
+        now = time.time()
+        doomed = []
+        entries = []  # (mtime, path) of live entries
+        for root, _, names in os.walk(directory):
+            for name in names:
+                path = os.path.join(root, name)
+                try:
+                    modified = os.path.getmtime(path)
+                except OSError:
+                    continue
+                # An entry expires TTL seconds after it was written; a .tmp left by a crashed write is dead
+                if modified + ttl <= now or (name.endswith('.tmp') and modified + 60 <= now):
+                    doomed.append(path)
+                elif name.endswith('.json'):
+                    entries.append((modified, path))
+        if max_files and len(entries) > max_files:
+            entries.sort()
+            doomed.extend(path for _, path in entries[:len(entries) - max_files])
+            entries = entries[len(entries) - max_files:]
+
+        removed = 0
+        for path in doomed:
+            try:
+                os.remove(path)
+                removed += 1
+            except OSError:
+                pass
+        return {'kept': len(entries), 'removed': removed}
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        lookups = self.counters['hits'] + self.counters['disk_hits'] + self.counters['misses']
+        return {
+            'entries': len(self._entries),
+            'hits': self.counters['hits'],
+            'disk_hits': self.counters['disk_hits'],
+            'misses': self.counters['misses'],
+            'stores': self.counters['stores'],
+            'evictions': self.counters['evictions'],
+            'hit_rate': round((self.counters['hits'] + self.counters['disk_hits']) / lookups, 3) if lookups else None,
+        }
+
+
+llm_cache = LLMResponseCache()
@@ -1,6 +1,24 @@
 """
 Lightweight persistent memory store for chat conversations.
-Stores JSONL under instance/memory.jsonl and provides simple retrieval.
+
+Entries are appended to one JSONL segment per (shop, user) under
+instance/memory/<shop_id>/<user_id>.jsonl. Each process keeps an in-memory
+index of line offsets per segment and catches up on lines other workers
+appended by reading only the bytes past its last indexed offset, so
+`get_recent` reads just the last `limit` lines instead of the whole store.
+`search` ranks entries with BM25 over per-segment inverted indexes that
+are extended incrementally as lines are appended. A legacy single-file
+instance/memory.jsonl is split into segments once, the first time the
+store is opened.
+
+`add` buffers records and a background timer flushes them at most
+`flush_interval` seconds later, one write per segment under an exclusive
+flock, so concurrent gunicorn workers never interleave partial lines and a
+chat turn does not pay an open/write/close per message. Reads flush the
+worker's own buffer first. `compact` (run by `flask compact-chat-memory`)
+rewrites each segment without expired, excess or unparseable lines and
+swaps it in atomically; writers that locked the old file notice the new
+inode and retry against the new one.
 
 If MEM0 is available (optional) and MEM0_ENABLED=1, a best-effort
 integration shim will add/search memory via mem0 as well.
@@ -8,24 +26,264 @@ integration shim will add/search memory via mem0 as well.
 
 from __future__ import annotations
 
+import atexit
+import heapq
 import json
+import logging
+import math
 import os
+import re
+import threading
 import time
+from collections import Counter
 from pathlib import Path
-from typing import Dict, List, Optional
+from typing import Dict, Iterable, List, Optional, Tuple
+
+try:
+    import fcntl
+except ImportError:  # Windows development machines: rely on O_APPEND alone
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_FLUSH_INTERVAL = 0.2
+DEFAULT_MAX_PENDING = 64
+
+
+def _segment_key(value) -> str:
+    return str(int(value)) if value is not None else "none"
+
+
+# BM25 parameters: term-frequency saturation and document-length normalisation
+BM25_K1 = 1.5
+BM25_B = 0.75
+
+STOP_WORDS = frozenset("""
+a about an and any are as at be been but by can could did do does for from had has have how i if in
+into is it its just me my no not of on or our please show so than that the their them then there
+these they this to us was we were what when where which who why will with would you your
+""".split())
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+
+def _stem(token: str) -> str:
+    """Light suffix stripping so sale/sales/selling-style variants share a term."""
+    if len(token) <= 3 or token.isdigit():
+        return token
+    if token.endswith("ies") and len(token) > 4:
+        token = token[:-3] + "y"
+    elif token.endswith("es") and not token.endswith(("aes", "ees", "oes")):
+        token = token[:-1]
+    elif token.endswith("s") and not token.endswith(("us", "ss")):
+        token = token[:-1]
+    if token.endswith("ing") and len(token) > 5:
+        token = token[:-3]
+    elif token.endswith("ed") and len(token) > 4:
+        token = token[:-2]
+    if len(token) > 4 and token[-1] == token[-2] and token[-1] not in "lsz":
+        token = token[:-1]  # stopp -> stop
+    if token.endswith("e") and len(token) > 3:
+        token = token[:-1]  # price/priced -> pric
+    return token
+
+
+def tokenize(text: str) -> List[str]:
+    """Lower-cased, stop-word filtered, stemmed terms of `text`."""
+    return [_stem(token) for token in _TOKEN_RE.findall((text or "").lower()) if token not in STOP_WORDS]
+
+
+def _lock(fd: int) -> None:
+    if fcntl is not None:
+        fcntl.flock(fd, fcntl.LOCK_EX)
+
+
+def _open_locked(path: Path, flags: int) -> Optional[int]:
+    """An exclusively locked fd for the file currently at `path`, or None if it does not exist.
+
+    Compaction replaces segment files, so after waiting for the lock we
+    check the fd still refers to the file at `path` and reopen if not.
+    """
+    while True:
+        try:
+            fd = os.open(path, flags, 0o644)
+        except FileNotFoundError:
+            return None
+        _lock(fd)
+        try:
+            if os.stat(path).st_ino == os.fstat(fd).st_ino:
+                return fd
+        except FileNotFoundError:
+            pass
+        os.close(fd)
+
+
+def _locked_append(path: Path, data: bytes) -> None:
+    """Append whole lines to `path` under an exclusive lock."""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd = _open_locked(path, os.O_RDWR | os.O_APPEND | os.O_CREAT)
+    try:
+        size = os.fstat(fd).st_size
+        if size and os.pread(fd, 1, size - 1) != b"\n":
+            data = b"\n" + data  # a writer died mid-line; keep our first record intact
+        while data:
+            data = data[os.write(fd, data):]
+    finally:
+        os.close(fd)  # releases the lock
+
+
+class _Segment:
+    """Byte offsets of the complete lines in one segment file, plus their BM25 postings."""
+
+    def __init__(self, path: Path):
+        self.path = path
+        self.lock = threading.Lock()
+        self._reset(None)
+
+    def _reset(self, inode) -> None:
+        self.offsets: List[int] = []
+        self.size = 0  # bytes indexed so far (always ends on a line boundary)
+        self.inode = inode
+        self.postings: Dict[str, Dict[int, int]] = {}  # term -> {line: term frequency}
+        self.lengths: List[int] = []  # terms per indexed line
+        self.total_length = 0
+        self._norms: Tuple[float, List[float]] = (0.0, [])  # (average length, BM25 length norm per line)
+
+    def refresh(self) -> None:
+        """Index lines appended since the last call (by any process)."""
+        try:
+            stat = self.path.stat()
+        except FileNotFoundError:
+            self._reset(None)
+            return
+        if stat.st_ino != self.inode or stat.st_size < self.size:
+            # New or rewritten file: index from the start
+            self._reset(stat.st_ino)
+        if stat.st_size == self.size:
+            return
+        with self.path.open("rb") as f:
+            f.seek(self.size)
+            data = f.read(stat.st_size - self.size)
+        position = 0
+        while True:
+            end = data.find(b"\n", position)
+            if end < 0:
+                break  # a partial line still being written; pick it up next time
+            if end > position:
+                self.offsets.append(self.size + position)
+            position = end + 1
+        self.size += position
+
+    def index_terms(self) -> None:
+        """Add postings for lines indexed by `refresh` but not yet tokenized."""
+        start = len(self.lengths)
+        if start == len(self.offsets):
+            return
+        for line, record in enumerate(self.read(start), start):
+            terms = Counter(tokenize(record.get("content") if record else ""))
+            for term, frequency in terms.items():
+                self.postings.setdefault(term, {})[line] = frequency
+            length = sum(terms.values())
+            self.lengths.append(length)
+            self.total_length += length
+
+    def norms(self, average_length: float) -> List[float]:
+        """BM25 length normalisation per line, cached until the average or the line count changes."""
+        cached_average, norms = self._norms
+        if cached_average != average_length or len(norms) != len(self.lengths):
+            scale = BM25_K1 * BM25_B / average_length
+            base = BM25_K1 * (1 - BM25_B)
+            norms = [base + scale * length for length in self.lengths]
+            self._norms = (average_length, norms)
+        return norms
+
+    def read(self, start: int, stop: Optional[int] = None) -> List[Optional[Dict]]:
+        """Parsed records for lines offsets[start:stop]; None for a line that is not valid JSON."""
+        offsets = self.offsets[start:stop]
+        if not offsets:
+            return []
+        first = start if start >= 0 else max(len(self.offsets) + start, 0)
+        end = self.offsets[first + len(offsets)] if first + len(offsets) < len(self.offsets) else self.size
+        with self.path.open("rb") as f:
+            f.seek(offsets[0])
+            data = f.read(end - offsets[0])
+        bounds = [offset - offsets[0] for offset in offsets] + [len(data)]
+        records = []
+        for begin, finish in zip(bounds, bounds[1:]):
+            try:
+                records.append(json.loads(data[begin:finish]))
+            except ValueError:
+                records.append(None)
+        return records
 
 
 class FileMemoryStore:
-    """Simple JSONL file-backed memory store per user and shop.
+    """JSONL memory store split into one segment file per (shop, user).
 
     Each line: {"ts": float, "shop_id": int, "user_id": int, "role": str, "content": str, "meta": {}}
     """
 
-    def __init__(self, path: Path):
-        self.path = Path(path)
-        self.path.parent.mkdir(parents=True, exist_ok=True)
-        if not self.path.exists():
-            self.path.write_text("")
+    def __init__(self, root: Path, legacy_path: Optional[Path] = None,
+                 flush_interval: float = DEFAULT_FLUSH_INTERVAL, max_pending: int = DEFAULT_MAX_PENDING):
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self._segments: Dict[Tuple[str, str], _Segment] = {}
+        self._lock = threading.Lock()
+        self._pending: List[Dict] = []
+        self._pending_lock = threading.Lock()
+        self._timer: Optional[threading.Timer] = None
+        atexit.register(self.flush)
+        if legacy_path is not None:
+            self.migrate_legacy(Path(legacy_path))
+
+    def _path(self, shop_key: str, user_key: str) -> Path:
+        return self.root / shop_key / f"{user_key}.jsonl"
+
+    def _segment(self, shop_key: str, user_key: str) -> _Segment:
+        with self._lock:
+            segment = self._segments.get((shop_key, user_key))
+            if segment is None:
+                segment = self._segments[(shop_key, user_key)] = _Segment(self._path(shop_key, user_key))
+            return segment
+
+    def _matching(self, shop_id: Optional[int], user_id: Optional[int]) -> Iterable[_Segment]:
+        """Segments for a (shop, user) filter where None matches any."""
+        if shop_id is not None and user_id is not None:
+            yield self._segment(_segment_key(shop_id), _segment_key(user_id))
+            return
+        shop_dirs = [self.root / _segment_key(shop_id)] if shop_id is not None else \
+            [path for path in self.root.iterdir() if path.is_dir()]
+        for shop_dir in shop_dirs:
+            if user_id is not None:
+                files = [shop_dir / f"{_segment_key(user_id)}.jsonl"]
+            else:
+                files = shop_dir.glob("*.jsonl") if shop_dir.is_dir() else []
+            for path in files:
+                yield self._segment(shop_dir.name, path.stem)
+
+    def _append(self, records: List[Dict]) -> None:
+        by_segment: Dict[Tuple[str, str], List[Dict]] = {}
+        for record in records:
+            key = (_segment_key(record.get("shop_id")), _segment_key(record.get("user_id")))
+            by_segment.setdefault(key, []).append(record)
+        for (shop_key, user_key), items in by_segment.items():
+            data = "".join(json.dumps(item, ensure_ascii=False) + "\n" for item in items)
+            _locked_append(self._path(shop_key, user_key), data.encode("utf-8"))
+
+    def flush(self) -> None:
+        """Write every buffered record now."""
+        with self._pending_lock:
+            records, self._pending = self._pending, []
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+        if records:
+            try:
+                self._append(records)
+            except OSError as e:
+                logger.error(f"Failed to write {len(records)} chat memory entries: {e}")
 
     def add(self, shop_id: int, user_id: int, role: str, content: str, meta: Optional[Dict] = None) -> None:
         record = {
@@ -36,49 +294,151 @@ class FileMemoryStore:
             "content": str(content or ""),
             "meta": meta or {},
         }
-        with self.path.open("a", encoding="utf-8") as f:
-            f.write(json.dumps(record, ensure_ascii=False) + "\n")
+        with self._pending_lock:
+            self._pending.append(record)
+            flush_now = self.flush_interval <= 0 or len(self._pending) >= self.max_pending
+            if not flush_now and self._timer is None:
+                self._timer = threading.Timer(self.flush_interval, self.flush)
+                self._timer.daemon = True
+                self._timer.start()
+        if flush_now:
+            self.flush()
 
     def get_recent(self, shop_id: int, user_id: int, limit: int = 8) -> List[Dict]:
-        lines = []
-        try:
-            with self.path.open("r", encoding="utf-8") as f:
-                for line in f:
-                    try:
-                        obj = json.loads(line)
-                        if (shop_id is None or obj.get("shop_id") == shop_id) and (
-                            user_id is None or obj.get("user_id") == user_id
-                        ):
-                            lines.append(obj)
-                    except Exception:
-                        pass
-        except FileNotFoundError:
-            return []
-        return sorted(lines, key=lambda x: x.get("ts", 0.0))[-limit:]
+        self.flush()
+        lines: List[Dict] = []
+        for segment in self._matching(shop_id, user_id):
+            with segment.lock:
+                segment.refresh()
+                if limit > 0:
+                    lines.extend(record for record in segment.read(-limit) if record)
+        return sorted(lines, key=lambda x: x.get("ts", 0.0))[-limit:] if limit > 0 else []
 
     def search(self, shop_id: int, user_id: int, query: str, limit: int = 5) -> List[Dict]:
-        """Naive keyword search by token overlap. Best-effort, fast."""
-        q_tokens = set((query or "").lower().split())
-        scored: List[Dict] = []
+        """Top entries for `query` ranked by BM25 over the matching segments, best first.
+
+        Each segment keeps an inverted index that is extended with the lines
+        appended since the last search, so only new entries are tokenized.
+        Document frequencies and the average length are taken over the
+        filtered segments. Results carry their score in "_score".
+        """
+        terms = set(tokenize(query))
+        if not terms or limit <= 0:
+            return []
+        self.flush()
+        segments = list(self._matching(shop_id, user_id))
+        for segment in segments:
+            with segment.lock:
+                segment.refresh()
+                segment.index_terms()
+
+        documents = sum(len(segment.lengths) for segment in segments)
+        if not documents:
+            return []
+        average_length = (sum(segment.total_length for segment in segments) / documents) or 1.0
+        idf = {}
+        for term in terms:
+            frequency = sum(len(segment.postings.get(term, ())) for segment in segments)
+            if frequency:
+                idf[term] = math.log(1 + (documents - frequency + 0.5) / (frequency + 0.5))
+
+        candidates = []
+        for number, segment in enumerate(segments):
+            scores: Dict[int, float] = {}
+            with segment.lock:
+                norms = segment.norms(average_length)
+                for term, weight in idf.items():
+                    weight *= BM25_K1 + 1
+                    for line, tf in segment.postings.get(term, {}).items():
+                        scores[line] = scores.get(line, 0.0) + weight * tf / (tf + norms[line])
+            candidates.extend(heapq.nlargest(limit, ((score, number, line) for line, score in scores.items())))
+
+        results = []
+        for score, number, line in heapq.nlargest(limit, candidates):
+            segment = segments[number]
+            with segment.lock:
+                record = segment.read(line, line + 1)[0] if line < len(segment.offsets) else None
+            if record:
+                record["_score"] = round(score, 4)
+                results.append(record)
+        return results
+
+    def compact(self, retention_days: Optional[float] = None, max_entries: Optional[int] = None) -> Dict[str, int]:
+        """Rewrite segments without entries older than `retention_days`, beyond the newest
+        `max_entries`, or not valid JSON. Returns {"segments", "kept", "removed"}.
+        """
+        self.flush()
+        cutoff = time.time() - retention_days * 86400 if retention_days else None
+        stats = {"segments": 0, "kept": 0, "removed": 0}
+        for shop_dir in [path for path in self.root.iterdir() if path.is_dir()]:
+            for path in shop_dir.glob("*.jsonl"):
+                kept, removed = self._compact_segment(path, cutoff, max_entries)
+                stats["kept"] += kept
+                stats["removed"] += removed
+                stats["segments"] += 1 if removed else 0
+        return stats
+
+    def _compact_segment(self, path: Path, cutoff: Optional[float], max_entries: Optional[int]) -> Tuple[int, int]:
+        fd = _open_locked(path, os.O_RDONLY)
+        if fd is None:
+            return 0, 0
+        try:
+            with os.fdopen(os.dup(fd), "rb") as f:
+                lines = f.read().splitlines()
+            records = []
+            for line in lines:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue
+                if isinstance(record, dict) and (cutoff is None or record.get("ts", 0.0) >= cutoff):
+                    records.append(line)
+            if max_entries is not None and len(records) > max_entries:
+                records = records[len(records) - max_entries:] if max_entries > 0 else []
+            removed = len(lines) - len(records)
+            if not removed:
+                return len(records), 0
+
+            if records:
+                temporary = path.with_name(path.name + ".compacting")
+                with temporary.open("wb") as f:
+                    f.write(b"".join(line + b"\n" for line in records))
+                    f.flush()
+                    os.fsync(f.fileno())
+                os.replace(temporary, path)  # while still holding the old file's lock
+            else:
+                path.unlink()
+            return len(records), removed
+        finally:
+            os.close(fd)
+
+    def migrate_legacy(self, legacy_path: Path) -> int:
+        """Split a single-file memory.jsonl into segments; returns the number of entries moved.
+
+        The file is first renamed aside, so when several workers start at
+        once exactly one of them performs the migration.
+        """
+        claimed = legacy_path.with_name(legacy_path.name + ".migrating")
         try:
-            with self.path.open("r", encoding="utf-8") as f:
-                for line in f:
-                    try:
-                        obj = json.loads(line)
-                        if (shop_id is None or obj.get("shop_id") == shop_id) and (
-                            user_id is None or obj.get("user_id") == user_id
-                        ):
-                            text = (obj.get("content") or "").lower()
-                            score = len(q_tokens.intersection(text.split()))
-                            if score > 0:
-                                obj["_score"] = score
-                                scored.append(obj)
-                    except Exception:
-                        pass
+            if legacy_path.stat().st_size == 0:
+                legacy_path.unlink()
+                return 0
+            legacy_path.rename(claimed)
         except FileNotFoundError:
-            return []
-        scored.sort(key=lambda x: x.get("_score", 0), reverse=True)
-        return scored[:limit]
+            return 0
+
+        records = []
+        with claimed.open("r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    records.append(json.loads(line))
+                except ValueError:
+                    pass
+        records.sort(key=lambda x: x.get("ts", 0.0))
+        self._append(records)
+        claimed.rename(legacy_path.with_name(legacy_path.name + ".migrated"))
+        logger.info(f"Migrated {len(records)} chat memory entries from {legacy_path} into {self.root}")
+        return len(records)
 
 
 class OptionalMem0:
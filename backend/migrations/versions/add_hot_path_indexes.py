@@ -0,0 +1,33 @@
+"""add indexes for the dashboard and stock alert lookups
+
+Revision ID: add_hot_path_indexes
+Revises: add_open_alert_unique
+Create Date: 2026-10-17 12:00:00.000000
+
+"""
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = 'add_hot_path_indexes'
+down_revision = 'add_open_alert_unique'
+branch_labels = None
+depends_on = None
+
+HOT_PATH_INDEXES = [
+    ('ix_shop_admin_id', 'shop', ['admin_id']),
+    ('ix_user_admin_id', 'user', ['admin_id']),
+    ('ix_product_shop_created', 'product', ['shop_id', 'created_at']),
+    ('ix_service_shop_id', 'service', ['shop_id']),
+    ('ix_shop_resource_shop_resource', 'shop_resource', ['shop_id', 'resource_id']),
+    ('ix_resource_alerts_shop_active', 'resource_alerts', ['shop_id', 'is_active']),
+]
+
+
+def upgrade():
+    for name, table, columns in HOT_PATH_INDEXES:
+        op.create_index(name, table, columns)
+
+
+def downgrade():
+    for name, table, _ in reversed(HOT_PATH_INDEXES):
+        op.drop_index(name, table_name=table)
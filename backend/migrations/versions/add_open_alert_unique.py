@@ -0,0 +1,47 @@
+"""allow one open stock alert per item
+
+Revision ID: add_open_alert_unique
+Revises: add_product_alert
+Create Date: 2026-10-17 18:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'add_open_alert_unique'
+down_revision = 'add_product_alert'
+branch_labels = None
+depends_on = None
+
+# (table, item column, index name)
+ALERT_TABLES = (
+    ('product_alert', 'product_id', 'uq_product_alert_open'),
+    ('resource_alerts', 'resource_id', 'uq_resource_alerts_open'),
+)
+
+
+def upgrade():
+    for table_name, item_column, index_name in ALERT_TABLES:
+        alerts = sa.table(table_name, sa.column('id'), sa.column('shop_id'), sa.column(item_column),
+                          sa.column('alert_type'), sa.column('is_active', sa.Boolean),
+                          sa.column('resolved_at', sa.DateTime))
+        kept = alerts.alias('kept')
+        # Resolve duplicate open alerts down to the oldest so the unique index can be built
+        op.execute(
+            alerts.update()
+            .where(alerts.c.is_active == sa.true(),
+                   alerts.c.id.notin_(
+                       sa.select(sa.func.min(kept.c.id))
+                       .where(kept.c.is_active == sa.true())
+                       .group_by(kept.c.shop_id, kept.c[item_column], kept.c.alert_type)
+                       .scalar_subquery()))
+            .values(is_active=False, resolved_at=sa.func.now())
+        )
+        op.create_index(index_name, table_name, ['shop_id', item_column, 'alert_type'], unique=True,
+                        postgresql_where=sa.text('is_active'), sqlite_where=sa.text('is_active'))
+
+
+def downgrade():
+    for table_name, _, index_name in ALERT_TABLES:
+        op.drop_index(index_name, table_name=table_name)
@@ -0,0 +1,38 @@
+"""add product_alert table for the stock alert engine
+
+Revision ID: add_product_alert
+Revises: add_report_job
+Create Date: 2026-10-17 15:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'add_product_alert'
+down_revision = 'add_report_job'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'product_alert',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('product_id', sa.Integer(), nullable=False),
+        sa.Column('shop_id', sa.Integer(), nullable=False),
+        sa.Column('alert_type', sa.String(length=20), nullable=False),
+        sa.Column('message', sa.Text(), nullable=False),
+        sa.Column('is_active', sa.Boolean(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.Column('resolved_at', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['product_id'], ['product.id'], ondelete='CASCADE'),
+        sa.ForeignKeyConstraint(['shop_id'], ['shop.id']),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_product_alert_shop_active', 'product_alert', ['shop_id', 'is_active'])
+
+
+def downgrade():
+    op.drop_index('ix_product_alert_shop_active', table_name='product_alert')
+    op.drop_table('product_alert')
@@ -0,0 +1,47 @@
+"""add report_job table for background report generation
+
+Revision ID: add_report_job
+Revises: add_sale_unit_price
+Create Date: 2026-10-17 12:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'add_report_job'
+down_revision = 'add_sale_unit_price'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'report_job',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('report_id', sa.Integer(), nullable=True),
+        sa.Column('shop_id', sa.Integer(), nullable=True),
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('type', sa.String(length=50), nullable=False),
+        sa.Column('parameters', sa.JSON(), nullable=True),
+        sa.Column('status', sa.String(length=20), nullable=False, server_default='queued'),
+        sa.Column('progress', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('message', sa.String(length=255), nullable=True),
+        sa.Column('artifact_path', sa.String(length=500), nullable=True),
+        sa.Column('artifact_name', sa.String(length=255), nullable=True),
+        sa.Column('summary', sa.JSON(), nullable=True),
+        sa.Column('error', sa.Text(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.Column('started_at', sa.DateTime(), nullable=True),
+        sa.Column('finished_at', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['report_id'], ['report.id'], ondelete='SET NULL'),
+        sa.ForeignKeyConstraint(['shop_id'], ['shop.id']),
+        sa.ForeignKeyConstraint(['user_id'], ['user.id']),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_report_job_created_at', 'report_job', ['created_at'])
+
+
+def downgrade():
+    op.drop_index('ix_report_job_created_at', table_name='report_job')
+    op.drop_table('report_job')
@@ -0,0 +1,38 @@
+"""store unit price and line total on sale
+
+Revision ID: add_sale_unit_price
+Revises: add_shop_daily_totals
+Create Date: 2026-10-17 11:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'add_sale_unit_price'
+down_revision = 'add_shop_daily_totals'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('sale', sa.Column('unit_price', sa.Float(), nullable=True))
+    op.add_column('sale', sa.Column('line_total', sa.Float(), nullable=True))
+
+    # Price historical sales at their product's marked price in one statement,
+    # so revenue read from line_total is right as soon as the upgrade finishes
+    sale = sa.table('sale', sa.column('product_id'), sa.column('quantity'),
+                    sa.column('unit_price', sa.Float), sa.column('line_total', sa.Float))
+    product = sa.table('product', sa.column('id'), sa.column('marked_price', sa.Float))
+    marked_price = sa.select(product.c.marked_price)\
+        .where(product.c.id == sale.c.product_id).scalar_subquery()
+    op.execute(
+        sale.update()
+        .where(sale.c.line_total.is_(None))
+        .values(unit_price=marked_price, line_total=sale.c.quantity * marked_price)
+    )
+
+
+def downgrade():
+    op.drop_column('sale', 'line_total')
+    op.drop_column('sale', 'unit_price')
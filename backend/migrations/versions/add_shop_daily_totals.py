@@ -0,0 +1,41 @@
+"""add shop_daily_totals rollup
+
+Revision ID: add_shop_daily_totals
+Revises: add_shop_date_indexes
+Create Date: 2026-10-17 10:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'add_shop_daily_totals'
+down_revision = 'add_shop_date_indexes'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'shop_daily_totals',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('shop_id', sa.Integer(), nullable=False),
+        sa.Column('day', sa.Date(), nullable=False),
+        sa.Column('cash', sa.Numeric(12, 2), nullable=False, server_default='0'),
+        sa.Column('till', sa.Numeric(12, 2), nullable=False, server_default='0'),
+        sa.Column('bank', sa.Numeric(12, 2), nullable=False, server_default='0'),
+        sa.Column('product_revenue', sa.Numeric(12, 2), nullable=False, server_default='0'),
+        sa.Column('service_revenue', sa.Numeric(12, 2), nullable=False, server_default='0'),
+        sa.Column('expenses', sa.Numeric(12, 2), nullable=False, server_default='0'),
+        sa.Column('units_sold', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('sale_count', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('service_count', sa.Integer(), nullable=False, server_default='0'),
+        sa.ForeignKeyConstraint(['shop_id'], ['shop.id']),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('shop_id', 'day', name='uq_shop_daily_totals_shop_day')
+    )
+    # Existing history is backfilled with `flask rebuild-daily-totals`.
+
+
+def downgrade():
+    op.drop_table('shop_daily_totals')
@@ -0,0 +1,53 @@
+"""add shop/date composite indexes
+
+Revision ID: add_shop_date_indexes
+Revises: remove_price_from_sale
+Create Date: 2026-10-17 09:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'add_shop_date_indexes'
+down_revision = 'remove_price_from_sale'
+branch_labels = None
+depends_on = None
+
+SHOP_DATE_INDEXES = [
+    ('ix_sale_shop_date', 'sale', ['shop_id', 'sale_date']),
+    ('ix_service_sale_shop_date', 'service_sale', ['shop_id', 'sale_date']),
+    ('ix_expense_shop_date', 'expense', ['shop_id', 'date']),
+    ('ix_financial_record_shop_date', 'financial_record', ['shop_id', 'date']),
+]
+
+
+def upgrade():
+    conn = op.get_bind()
+
+    # Merge duplicate (shop_id, product_id) inventory rows into the oldest row
+    # so the unique index can be created.
+    duplicates = conn.execute(sa.text("""
+        SELECT shop_id, product_id, MIN(id) AS keep_id, SUM(quantity) AS total
+        FROM inventory
+        GROUP BY shop_id, product_id
+        HAVING COUNT(*) > 1
+    """)).fetchall()
+    for row in duplicates:
+        conn.execute(sa.text("UPDATE inventory SET quantity = :total WHERE id = :keep_id"),
+                     {'total': row.total or 0, 'keep_id': row.keep_id})
+        conn.execute(sa.text("""
+            DELETE FROM inventory
+            WHERE shop_id = :shop_id AND product_id = :product_id AND id != :keep_id
+        """), {'shop_id': row.shop_id, 'product_id': row.product_id, 'keep_id': row.keep_id})
+
+    op.create_index('uq_inventory_shop_product', 'inventory', ['shop_id', 'product_id'], unique=True)
+
+    for name, table, columns in SHOP_DATE_INDEXES:
+        op.create_index(name, table, columns)
+
+
+def downgrade():
+    for name, table, _ in reversed(SHOP_DATE_INDEXES):
+        op.drop_index(name, table_name=table)
+    op.drop_index('uq_inventory_shop_product', table_name='inventory')
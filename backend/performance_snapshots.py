@@ -0,0 +1,255 @@
+"""
+Per-(shop, period) performance snapshots for the AI agent.
+
+A snapshot holds one bucket per day of the period: product sales revenue,
+quantity and line count per product, service revenue and count, and
+expenses, built with three GROUP BY queries. The agent's performance
+analysis is summed from the buckets, so the chat endpoint and every
+/api/ai/* view share one snapshot instead of re-aggregating the window on
+each call.
+
+Committing a Sale, ServiceSale or Expense marks the snapshot's shop dirty
+from the day of the changed row (normally today). The next read
+re-aggregates only the days from there to now and keeps the older
+buckets. Once the day rolls over, the days that fell out of the window
+are dropped. Writes from other gunicorn workers or outside the ORM
+session are picked up by the same latest-day refresh once a snapshot is
+KPI_CACHE_TTL seconds old, and every PERFORMANCE_SNAPSHOT_TTL seconds the
+whole window is rebuilt.
+
+Periods are aligned to whole days: "30d" covers midnight 30 days ago
+until now.
+"""
+
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timedelta
+
+from flask import current_app
+from sqlalchemy import event, func, inspect
+from sqlalchemy.orm import Session
+
+from database import db, Shop, Sale, Product, ServiceSale, Expense
+
+PERIOD_DAYS = {'7d': 7, '30d': 30, '90d': 90}
+DEFAULT_PERIOD_DAYS = 30
+
+DEFAULT_REFRESH_AFTER = 60
+DEFAULT_TTL = 3600
+
+# Date column of each watched model
+WATCHED_DATES = {Sale: 'sale_date', ServiceSale: 'sale_date', Expense: 'date'}
+
+# session.info key for {shop_id: earliest day} touched by the current transaction
+_PENDING_KEY = 'performance_snapshot_days'
+
+
+def _empty_day():
+    return {'sales': 0.0, 'sales_count': 0, 'services': 0.0, 'service_count': 0,
+            'expenses': 0.0, 'products': {}}
+
+
+def _aggregate_days(shop_id, start, end):
+    """{day: bucket} for every day in [start, end] that has any activity."""
+    days = {}
+
+    sale_day = func.date(Sale.sale_date)
+    for day, name, quantity, revenue, count in db.session.query(
+        sale_day, Product.name, func.sum(Sale.quantity),
+        func.coalesce(func.sum(Sale.line_total), 0.0), func.count(Sale.id)
+    ).join(Product, Product.id == Sale.product_id)\
+            .filter(Sale.shop_id == shop_id, Sale.sale_date >= start, Sale.sale_date <= end)\
+            .group_by(sale_day, Product.name):
+        bucket = days.setdefault(str(day)[:10], _empty_day())
+        bucket['sales'] += float(revenue or 0)
+        bucket['sales_count'] += count
+        bucket['products'][name] = (int(quantity or 0), float(revenue or 0))
+
+    service_day = func.date(ServiceSale.sale_date)
+    for day, revenue, count in db.session.query(
+        service_day, func.coalesce(func.sum(ServiceSale.price), 0.0), func.count(ServiceSale.id)
+    ).filter(ServiceSale.shop_id == shop_id, ServiceSale.sale_date >= start, ServiceSale.sale_date <= end)\
+            .group_by(service_day):
+        bucket = days.setdefault(str(day)[:10], _empty_day())
+        bucket['services'] = float(revenue or 0)
+        bucket['service_count'] = count
+
+    expense_day = func.date(Expense.date)
+    for day, amount in db.session.query(expense_day, func.coalesce(func.sum(Expense.amount), 0))\
+            .filter(Expense.shop_id == shop_id, Expense.date >= start, Expense.date <= end)\
+            .group_by(expense_day):
+        days.setdefault(str(day)[:10], _empty_day())['expenses'] = float(amount or 0)
+
+    return days
+
+
+class _Snapshot:
+    __slots__ = ('shop_name', 'start_day', 'days', 'latest_day', 'refreshed_at', 'built_at',
+                 'dirty_day', 'version')
+
+    def __init__(self, shop_name, start_day, days, latest_day, now):
+        self.shop_name = shop_name
+        self.start_day = start_day
+        self.days = days  # never mutated once stored; refreshes build a new dict
+        self.latest_day = latest_day
+        self.refreshed_at = now
+        self.built_at = now
+        self.dirty_day = None  # earliest day changed since the snapshot was taken
+        self.version = 0  # bumped by every mark_dirty
+
+
+class PerformanceSnapshots:
+    """Snapshot store keyed by (shop_id, period length in days)."""
+
+    def __init__(self):
+        self._entries = {}  # (shop_id, days) -> _Snapshot
+        self._lock = threading.Lock()
+        self.counters = Counter()
+
+    def get(self, shop_id, period='30d'):
+        """Aggregates for the shop over `period`, or None if the shop does not exist.
+
+        Returns {'shop_name', 'start_date', 'end_date', 'daily_sales',
+        'daily_services', 'sales_count', 'service_count', 'total_expenses',
+        'products': {name: {'quantity', 'revenue'}}}.
+        """
+        key = (shop_id, PERIOD_DAYS.get(period, DEFAULT_PERIOD_DAYS))
+        end = datetime.now()
+        today = end.date()
+        start_day = today - timedelta(days=key[1])
+        now = time.monotonic()
+        refresh_after = current_app.config.get('KPI_CACHE_TTL', DEFAULT_REFRESH_AFTER)
+        ttl = current_app.config.get('PERFORMANCE_SNAPSHOT_TTL', DEFAULT_TTL)
+
+        with self._lock:
+            snapshot = self._entries.get(key)
+            if snapshot is not None:
+                dirty_day, version = snapshot.dirty_day, snapshot.version
+
+        if snapshot is None or now - snapshot.built_at >= ttl:
+            self.counters['builds'] += 1
+            fresh = self._build(shop_id, start_day, end, today, now)
+            if fresh is None:
+                return None
+        elif dirty_day is not None or snapshot.start_day != start_day or now - snapshot.refreshed_at >= refresh_after:
+            self.counters['refreshes'] += 1
+            fresh = self._refresh(snapshot, shop_id, start_day, end, today, dirty_day, now)
+        else:
+            self.counters['hits'] += 1
+            return self._summarise(snapshot, end)
+
+        with self._lock:
+            current = self._entries.get(key)
+            if current is not None and snapshot is not None and current.version != version:
+                # Written to while we were reading: stay dirty from the earliest pending day
+                fresh.dirty_day = current.dirty_day
+            if current is not None:
+                fresh.version = current.version
+            self._entries[key] = fresh
+        return self._summarise(fresh, end)
+
+    @staticmethod
+    def _build(shop_id, start_day, end, today, now):
+        shop_name = db.session.query(Shop.name).filter(Shop.id == shop_id).scalar()
+        if shop_name is None:
+            return None
+        start = datetime.combine(start_day, datetime.min.time())
+        return _Snapshot(shop_name, start_day, _aggregate_days(shop_id, start, end), today, now)
+
+    @staticmethod
+    def _refresh(snapshot, shop_id, start_day, end, today, dirty_day, now):
+        """Re-aggregate from the earliest changed day (or the snapshot's latest day) to now."""
+        since = max(min(day for day in (snapshot.latest_day, dirty_day) if day is not None), start_day)
+        since_key, start_key = since.isoformat(), start_day.isoformat()
+        days = {day: bucket for day, bucket in snapshot.days.items() if start_key <= day < since_key}
+        days.update(_aggregate_days(shop_id, datetime.combine(since, datetime.min.time()), end))
+        fresh = _Snapshot(snapshot.shop_name, start_day, days, today, now)
+        fresh.built_at = snapshot.built_at
+        return fresh
+
+    @staticmethod
+    def _summarise(snapshot, end):
+        daily_sales = {}
+        daily_services = {}
+        products = {}
+        sales_count = service_count = 0
+        total_expenses = 0.0
+        for day, bucket in snapshot.days.items():
+            if bucket['sales_count']:
+                daily_sales[day] = bucket['sales']
+            if bucket['service_count']:
+                daily_services[day] = bucket['services']
+            sales_count += bucket['sales_count']
+            service_count += bucket['service_count']
+            total_expenses += bucket['expenses']
+            for name, (quantity, revenue) in bucket['products'].items():
+                totals = products.setdefault(name, {'quantity': 0, 'revenue': 0.0})
+                totals['quantity'] += quantity
+                totals['revenue'] += revenue
+        return {
+            'shop_name': snapshot.shop_name,
+            'start_date': datetime.combine(snapshot.start_day, datetime.min.time()),
+            'end_date': end,
+            'daily_sales': daily_sales,
+            'daily_services': daily_services,
+            'sales_count': sales_count,
+            'service_count': service_count,
+            'total_expenses': total_expenses,
+            'products': products,
+        }
+
+    def mark_dirty(self, days_by_shop):
+        """Record that each shop in `{shop_id: date}` changed from that day onwards."""
+        with self._lock:
+            for (shop_id, _), snapshot in self._entries.items():
+                day = days_by_shop.get(shop_id)
+                if day is not None:
+                    snapshot.dirty_day = day if snapshot.dirty_day is None else min(snapshot.dirty_day, day)
+                    snapshot.version += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        lookups = self.counters['hits'] + self.counters['refreshes'] + self.counters['builds']
+        return {
+            'entries': len(self._entries),
+            'hits': self.counters['hits'],
+            'refreshes': self.counters['refreshes'],
+            'builds': self.counters['builds'],
+            'hit_rate': round(self.counters['hits'] / lookups, 3) if lookups else None,
+        }
+
+
+performance_snapshots = PerformanceSnapshots()
+
+
+@event.listens_for(Session, 'after_flush')
+def _collect_touched_days(session, flush_context):
+    touched = session.info.setdefault(_PENDING_KEY, {})
+    today = datetime.now().date()
+    for obj in (*session.new, *session.dirty, *session.deleted):
+        column = WATCHED_DATES.get(type(obj))
+        if column is None:
+            continue
+        state = inspect(obj)
+        shops = {shop_id for shop_id in (obj.shop_id, *state.attrs.shop_id.history.deleted) if shop_id is not None}
+        dates = [value for value in (getattr(obj, column), *state.attrs[column].history.deleted)
+                 if isinstance(value, datetime)]
+        day = min([value.date() for value in dates] + [today])
+        for shop_id in shops:
+            touched[shop_id] = min(touched.get(shop_id, day), day)
+
+
+@event.listens_for(Session, 'after_commit')
+def _mark_committed(session):
+    touched = session.info.pop(_PENDING_KEY, None)
+    if touched:
+        performance_snapshots.mark_dirty(touched)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_rolled_back(session):
+    session.info.pop(_PENDING_KEY, None)
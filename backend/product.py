@@ -1,8 +1,11 @@
 from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify
 from flask_login import login_required, current_user
-from database import db, Product, Inventory, Shop, Sale
+from database import db, Product, Inventory, Shop
 from sqlalchemy import or_
 import logging
+from datetime import datetime
+from checkout import checkout
+from barcode_cache import lookup as lookup_barcode
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -227,23 +230,11 @@ def scan_barcode():
         if not barcode:
             return jsonify({'error': 'No barcode provided'}), 400
 
-        product = Product.query.filter_by(barcode=barcode).first()
+        product = lookup_barcode(barcode, current_user.shop_id)
         if not product:
             return jsonify({'error': 'Product not found'}), 404
 
-        inventory = Inventory.query.filter_by(
-            product_id=product.id,
-            shop_id=current_user.shop_id
-        ).first()
-
-        return jsonify({
-            'id': product.id,
-            'name': product.name,
-            'barcode': product.barcode,
-            'category': product.category,
-            'marked_price': product.marked_price,
-            'quantity': inventory.quantity if inventory else 0
-        })
+        return jsonify(product)
     except Exception as e:
         return jsonify({'error': 'Error processing barcode'}), 500
 
@@ -280,36 +271,21 @@ def sell_product(id):
     try:
         product = Product.query.get_or_404(id)
         quantity = int(request.form.get('quantity', 0))
-        price = float(request.form.get('price', 0))
         customer_name = request.form.get('customer_name')
+        line = {'product_id': id, 'quantity': quantity}
+        # Only admins may sell below or above the marked price
+        is_admin = current_user.role == 'admin'
+        if is_admin and request.form.get('price'):
+            line['unit_price'] = request.form.get('price')
         
-        # Get current inventory
-        inventory = Inventory.query.filter_by(
-            product_id=id,
-            shop_id=current_user.shop_id
-        ).first()
-        
-        if not inventory or inventory.quantity < quantity:
-            flash('Not enough stock available.', 'danger')
-            return redirect(url_for('employee.inventory'))
-        
-        # Create sale record
-        sale = Sale(
-            product_id=id,
-            shop_id=current_user.shop_id,
-            employee_id=current_user.id,
-            quantity=quantity,
-            price=price,
-            customer_name=customer_name
-        )
-        
-        # Update inventory
-        inventory.quantity -= quantity
-        
-        db.session.add(sale)
-        db.session.commit()
+        # This form has never posted a FinancialRecord
+        checkout(current_user.shop_id, current_user.id, [line],
+                 customer_name=customer_name, sale_date=datetime.utcnow(),
+                 record_payment=False, allow_price_override=is_admin)
         
         flash(f'Successfully sold {quantity} {product.name}(s)!', 'success')
+    except ValueError as e:
+        flash(str(e), 'danger')
     except Exception as e:
         db.session.rollback()
         flash('Error processing sale.', 'danger')
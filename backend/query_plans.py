@@ -0,0 +1,122 @@
+"""
+Query-plan regression checks for the hot shop/date queries.
+
+Runs the helpers behind the dashboard, accounts, report, POS and stock
+alert paths against an in-memory SQLite copy of the schema, captures the
+SQL they emit, runs EXPLAIN QUERY PLAN on each statement and reports every
+one that falls back to a full table scan. Because the statements come from
+the helpers themselves, a change to a view's query is checked as written.
+"""
+
+import re
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List, Tuple
+
+from flask import Flask
+from sqlalchemy import event
+
+from admin import SALES_REPORT_PAGE_SIZE, _dashboard_context
+from alert_engine import low_stock_counts, low_stock_products, sweep_items
+from barcode_cache import barcode_cache, lookup
+from database import db, Product
+from database.daily_totals import load_daily_totals
+from report_queries import SalesReportQuery
+
+# "SCAN sale" / "SCAN TABLE sale" (older SQLite) means every row is visited.
+_FULL_SCAN = re.compile(r'^SCAN (TABLE )?(?P<table>\w+)')
+_IGNORED_SCANS = ('CONSTANT ROW', 'SUBQUERY')
+
+# Barcode of the one product seeded so the POS lookup takes both its paths
+_CHECK_BARCODE = 'query-plan-check'
+
+
+def _scan_barcode(shop_id):
+    """A POS scan on a cache miss, then the same scan on a hit."""
+    lookup(_CHECK_BARCODE, shop_id)
+    lookup(_CHECK_BARCODE, shop_id)
+
+
+def hot_queries(shop_id: int = 1) -> List[Tuple[str, Callable[[], object]]]:
+    """Return (name, call) pairs; each call runs a helper a hot view uses."""
+    end = datetime(2026, 1, 31)
+    start = end - timedelta(days=30)
+    report = SalesReportQuery(start=start, end=end, shop_id=shop_id, period='month')
+
+    return [
+        ('dashboard.context', lambda: _dashboard_context(admin_id=1)),
+        ('accounts.daily_totals', lambda: load_daily_totals([shop_id], start.date(), end.date())),
+        ('report.sales_page', lambda: report.page(1, SALES_REPORT_PAGE_SIZE)),
+        ('report.summary', report.summary),
+        ('report.by_day', lambda: report.grouped('day')),
+        ('pos.barcode_lookup', lambda: _scan_barcode(shop_id)),
+        ('alerts.sweep_items', lambda: sweep_items([(shop_id, 1)], [(shop_id, 1)], notify=False)),
+        ('alerts.low_stock', lambda: (low_stock_counts([shop_id]), low_stock_products([shop_id], limit=10))),
+    ]
+
+
+def capture(call) -> List[Tuple[str, tuple]]:
+    """Run `call` and return the (sql, parameters) of every SELECT it sent."""
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith('SELECT'):
+            statements.append((statement, parameters))
+
+    event.listen(db.engine, 'before_cursor_execute', record)
+    try:
+        call()
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', record)
+    return statements
+
+
+def explain(conn, statement, parameters=()) -> List[str]:
+    """Return the EXPLAIN QUERY PLAN detail lines for a SQL string."""
+    rows = conn.exec_driver_sql('EXPLAIN QUERY PLAN ' + statement, tuple(parameters)).fetchall()
+    return [row[-1] for row in rows]
+
+
+def full_scans(plan: List[str]) -> List[str]:
+    """Return the plan lines that visit every row of a table."""
+    scans = []
+    for detail in plan:
+        match = _FULL_SCAN.match(detail)
+        if match and not any(detail.startswith(f'SCAN {kind}') for kind in _IGNORED_SCANS):
+            scans.append(detail)
+    return scans
+
+
+def check_query_plans(shop_id: int = 1) -> Dict[str, List[str]]:
+    """Run every hot helper against a fresh SQLite schema and explain its SQL.
+
+    Returns a mapping of query name to offending plan lines; an empty dict
+    means every query is served by an index.
+    """
+    # A bare app, as in the job pool, so the helpers' db.session binds to the scratch database
+    app = Flask(__name__)
+    app.config.update(SQLALCHEMY_DATABASE_URI='sqlite://', SQLALCHEMY_TRACK_MODIFICATIONS=False)
+    db.init_app(app)
+
+    failures = {}
+    db.session.remove()
+    with app.app_context():
+        try:
+            db.create_all()
+            db.session.add(Product(name='Query plan check', barcode=_CHECK_BARCODE, marked_price=0,
+                                   category='', shop_id=shop_id))
+            db.session.commit()
+
+            for name, call in hot_queries(shop_id):
+                statements = capture(call)
+                scans = []
+                with db.engine.connect() as conn:
+                    for statement, parameters in statements:
+                        scans.extend(scan for scan in full_scans(explain(conn, statement, parameters))
+                                     if scan not in scans)
+                if scans:
+                    failures[name] = scans
+        finally:
+            barcode_cache.invalidate([_CHECK_BARCODE])
+            db.session.remove()
+            db.engine.dispose()
+    return failures
@@ -1,11 +1,22 @@
-from flask import Blueprint, jsonify, request
-from database import db, Report, Shop, User
+import os
+from flask import Blueprint, jsonify, request, send_file, url_for
+from database import db, Report, ReportJob, Shop, User
+from jobs import enqueue
+from report_scheduler import latest_artifact, artifact_path
 from flask_jwt_extended import jwt_required, get_jwt_identity
-from datetime import datetime
 import logging
 
 report_bp = Blueprint('report', __name__)
 
+def _artifact_info(report):
+    """Latest precomputed artifact for a scheduled report, read from disk."""
+    if not report.schedule or report.schedule == 'none':
+        return None
+    info = latest_artifact(report.id)
+    if info and info.get('filename'):
+        info['download_url'] = url_for('report.download_report_artifact', report_id=report.id, period=info['period'])
+    return info
+
 @report_bp.route('/api/reports', methods=['GET'])
 @jwt_required()
 def get_reports():
@@ -36,7 +47,8 @@ def get_reports():
             'parameters': report.parameters,
             'created_at': report.created_at.isoformat(),
             'last_generated': report.last_generated.isoformat() if report.last_generated else None,
-            'schedule': report.schedule
+            'schedule': report.schedule,
+            'latest_artifact': _artifact_info(report)
         } for report in reports])
 
     except Exception as e:
@@ -170,19 +182,132 @@ def generate_report(report_id):
         if not report:
             return jsonify({'error': 'Report not found'}), 404
 
-        # Update last generated timestamp
-        report.last_generated = datetime.utcnow()
-        db.session.commit()
+        # Build the report in the background job pool; last_generated is
+        # stamped when the job succeeds
+        try:
+            job = enqueue(report.type, report.parameters, current_user_id,
+                          shop_id=report.shop_id, report_id=report.id)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
 
-        # Here you would implement the actual report generation logic
-        # based on the report type and parameters
-        # For now, we'll just return a success message
         return jsonify({
             'message': 'Report generation started',
             'report_id': report.id,
-            'type': report.type
-        })
+            'type': report.type,
+            'job': job.to_dict()
+        }), 202
 
     except Exception as e:
         logging.error(f"Error generating report: {str(e)}")
-        return jsonify({'error': 'Internal server error'}), 500 
\ No newline at end of file
+        return jsonify({'error': 'Internal server error'}), 500
+
+@report_bp.route('/api/reports/<int:report_id>/artifact', methods=['GET'])
+@jwt_required()
+def download_report_artifact(report_id):
+    try:
+        current_user_id = get_jwt_identity()
+        user = User.query.get(current_user_id)
+        if not user or not user.shop_id:
+            return jsonify({'error': 'Shop not found'}), 404
+
+        report = Report.query.filter_by(
+            id=report_id,
+            shop_id=user.shop_id
+        ).first()
+
+        if not report:
+            return jsonify({'error': 'Report not found'}), 404
+
+        # Defaults to the newest period; ?period= picks an older one
+        info = latest_artifact(report.id)
+        period = request.args.get('period') or (info and info['period'])
+        if not period or os.path.basename(period) != period or period.startswith('.'):
+            return jsonify({'error': 'No precomputed report available'}), 404
+
+        path = artifact_path(report.id, period)
+        if not os.path.exists(path):
+            return jsonify({'error': 'No precomputed report available'}), 404
+
+        filename = info['filename'] if info and info['period'] == period and info.get('filename') else f'report_{report.id}_{period}.xlsx'
+        return send_file(
+            path,
+            mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+            as_attachment=True,
+            download_name=filename
+        )
+
+    except Exception as e:
+        logging.error(f"Error downloading report artifact: {str(e)}")
+        return jsonify({'error': 'Internal server error'}), 500
+
+@report_bp.route('/api/jobs', methods=['POST'])
+@jwt_required()
+def create_job():
+    try:
+        current_user_id = get_jwt_identity()
+        user = User.query.get(current_user_id)
+        if not user or not user.shop_id:
+            return jsonify({'error': 'Shop not found'}), 404
+
+        data = request.get_json()
+        if not data or 'type' not in data:
+            return jsonify({'error': 'Type is required'}), 400
+
+        try:
+            job = enqueue(data['type'], data.get('parameters', {}), current_user_id,
+                          shop_id=user.shop_id)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+
+        return jsonify(job.to_dict()), 202
+
+    except Exception as e:
+        logging.error(f"Error creating report job: {str(e)}")
+        return jsonify({'error': 'Internal server error'}), 500
+
+@report_bp.route('/api/jobs/<int:job_id>', methods=['GET'])
+@jwt_required()
+def get_job(job_id):
+    try:
+        current_user_id = get_jwt_identity()
+        user = User.query.get(current_user_id)
+        if not user or not user.shop_id:
+            return jsonify({'error': 'Shop not found'}), 404
+
+        job = ReportJob.query.filter_by(id=job_id, shop_id=user.shop_id).first()
+        if not job:
+            return jsonify({'error': 'Job not found'}), 404
+
+        return jsonify(job.to_dict())
+
+    except Exception as e:
+        logging.error(f"Error getting report job: {str(e)}")
+        return jsonify({'error': 'Internal server error'}), 500
+
+@report_bp.route('/api/jobs/<int:job_id>/download', methods=['GET'])
+@jwt_required()
+def download_job(job_id):
+    try:
+        current_user_id = get_jwt_identity()
+        user = User.query.get(current_user_id)
+        if not user or not user.shop_id:
+            return jsonify({'error': 'Shop not found'}), 404
+
+        job = ReportJob.query.filter_by(id=job_id, shop_id=user.shop_id).first()
+        if not job:
+            return jsonify({'error': 'Job not found'}), 404
+        if job.status != 'succeeded':
+            return jsonify({'error': f'Job is {job.status}', 'progress': job.progress}), 409
+        if not job.artifact_path or not os.path.exists(job.artifact_path):
+            return jsonify({'error': 'Report file is no longer available'}), 410
+
+        return send_file(
+            job.artifact_path,
+            mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+            as_attachment=True,
+            download_name=job.artifact_name
+        )
+
+    except Exception as e:
+        logging.error(f"Error downloading report job: {str(e)}")
+        return jsonify({'error': 'Internal server error'}), 500
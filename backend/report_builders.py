@@ -0,0 +1,408 @@
+"""
+Workbook builders for the downloadable reports.
+
+Each builder takes a writable binary file, a plain dict of report
+parameters and an optional progress callback, writes an .xlsx workbook and
+returns a JSON-serialisable summary. The background job runner dispatches
+to them by job type; the admin download views and the report API only
+queue jobs.
+Invalid parameters or an empty period raise ValueError with a message fit
+for the user.
+"""
+
+from datetime import datetime
+
+import pandas as pd
+import xlsxwriter
+from werkzeug.datastructures import MultiDict
+
+from database import Shop
+from database.daily_totals import load_daily_totals, sum_totals, net_total
+from report_queries import SalesReportQuery, period_start
+
+
+def _noop_progress(percent, message=None):
+    pass
+
+
+def _period_range(period):
+    """(start, end) datetimes for an accounts period; unknown periods mean today."""
+    end_date = datetime.now()
+    start_date = period_start(period if period in ('week', 'month', 'year') else 'today', end_date)
+    return start_date, end_date
+
+
+def _shops(shop_id):
+    if shop_id:
+        shops = Shop.query.filter_by(id=shop_id).all()
+        if not shops:
+            raise ValueError('Selected shop not found.')
+    else:
+        shops = Shop.query.all()
+        if not shops:
+            raise ValueError('No shops found.')
+    return shops
+
+
+def build_sales_report(output, params, progress=None):
+    """Detailed sales plus daily/shop/category/payment summaries.
+
+    Parameters: period, start_date, end_date, shop_id, sort_by.
+    """
+    progress = progress or _noop_progress
+    try:
+        report = SalesReportQuery.from_args(MultiDict(params), default_period='today')
+    except ValueError:
+        raise ValueError('Invalid date format. Please use YYYY-MM-DD format.')
+
+    period = report.period
+    start_date_dt = report.start or datetime.min
+    end_date_dt = report.end or datetime.now()
+
+    summary = report.summary()
+    if not summary['total_transactions']:
+        raise ValueError('No sales data found for the selected period.')
+    progress(10, f"Exporting {summary['total_transactions']} sales")
+
+    def grouped_frame(key, label, with_quantity=True):
+        columns = ['Total', 'Quantity', 'Transactions'] if with_quantity else ['Total', 'Transactions']
+        rows = report.grouped(key)
+        return pd.DataFrame(
+            [[row['total'], row['quantity'], row['transactions']] if with_quantity
+             else [row['total'], row['transactions']] for row in rows],
+            index=pd.Index([row['group'] for row in rows], name=label),
+            columns=columns
+        )
+
+    with pd.ExcelWriter(output, engine='xlsxwriter') as writer:
+        # Prepare detailed sales data
+        sales_data = [{
+            'Date': sale.sale_date.strftime('%Y-%m-%d %H:%M'),
+            'Shop': sale.shop.name,
+            'Product': sale.product.name,
+            'Category': sale.product.category,
+            'Quantity': sale.quantity,
+            'Price': float(sale.price),
+            'Total': float(sale.total),
+            'Payment Method': sale.payment_method.title(),
+            'Customer': sale.customer_name or 'N/A'
+        } for sale in report.rows()]
+
+        # Create detailed sales sheet
+        df_sales = pd.DataFrame(sales_data)
+        df_sales.to_excel(writer, sheet_name='Detailed Sales', index=False)
+        progress(60, 'Wrote detailed sales')
+
+        # Summary sheets are aggregated in SQL
+        grouped_frame('day', 'Date').to_excel(writer, sheet_name='Daily Summary')
+        grouped_frame('shop', 'Shop').to_excel(writer, sheet_name='Shop Summary')
+        grouped_frame('category', 'Category').to_excel(writer, sheet_name='Category Summary')
+        payment_summary = grouped_frame('payment_method', 'Payment Method', with_quantity=False)
+        payment_summary.index = payment_summary.index.str.title()
+        payment_summary.to_excel(writer, sheet_name='Payment Summary')
+        progress(80, 'Wrote summary sheets')
+
+        # Create overall summary sheet
+        summary_data = {
+            'Metric': [
+                'Total Sales',
+                'Total Items Sold',
+                'Total Transactions',
+                'Average Sale Amount',
+                'Period',
+                'Start Date',
+                'End Date'
+            ],
+            'Value': [
+                f"KES {summary['total_sales']:.2f}",
+                summary['total_items'],
+                summary['total_transactions'],
+                f"KES {summary['average_sale']:.2f}",
+                period.capitalize(),
+                start_date_dt.strftime('%Y-%m-%d') if report.start else 'All time',
+                end_date_dt.strftime('%Y-%m-%d')
+            ]
+        }
+
+        if report.shop_id:
+            shop = Shop.query.get(report.shop_id)
+            if shop:
+                summary_data['Metric'].extend(['Shop Name', 'Shop Location'])
+                summary_data['Value'].extend([shop.name, shop.location])
+
+        df_summary = pd.DataFrame(summary_data)
+        df_summary.to_excel(writer, sheet_name='Summary', index=False)
+
+        # Get workbook and worksheet objects
+        workbook = writer.book
+        header_format = workbook.add_format({
+            'bold': True,
+            'bg_color': '#4CAF50',
+            'font_color': 'white',
+        })
+        number_format = workbook.add_format({'num_format': 'KES #,##0.00'})
+
+        # Format the detailed sheet: header row and money columns
+        worksheet = writer.sheets['Detailed Sales']
+        for col_num, value in enumerate(df_sales.columns.values):
+            worksheet.write(0, col_num, value, header_format)
+        worksheet.set_column('F:G', 14, number_format)
+
+    summary.update({
+        'period': period,
+        'start_date': start_date_dt.strftime('%Y-%m-%d') if report.start else None,
+        'end_date': end_date_dt.strftime('%Y-%m-%d'),
+        'shop_id': report.shop_id
+    })
+    return summary
+
+
+def build_shop_accounts(output, params, progress=None):
+    """Per-shop daily cash/till/bank/expense breakdown with shop totals.
+
+    Parameters: period ('today', 'week', 'month', 'year') or explicit
+    start_date/end_date (YYYY-MM-DD), shop_id.
+    """
+    progress = progress or _noop_progress
+    period = params.get('period') or 'today'
+    if params.get('start_date') and params.get('end_date'):
+        try:
+            start_date = datetime.strptime(params['start_date'], '%Y-%m-%d')
+            end_date = datetime.strptime(params['end_date'], '%Y-%m-%d')
+        except ValueError:
+            raise ValueError('Invalid date format. Please use YYYY-MM-DD format.')
+        period = 'custom'
+    else:
+        start_date, end_date = _period_range(period)
+    shops = _shops(params.get('shop_id'))
+
+    # One rollup query covers every shop and day in the period
+    daily_totals = load_daily_totals([shop.id for shop in shops],
+                                     start_date.date(), end_date.date())
+    progress(30, 'Loaded daily totals')
+    blank_row = {'Date': '', 'Cash': '', 'Till': '', 'Bank': '', 'Expenses': '', 'Total': ''}
+
+    data = []
+    shop_summaries = []
+    for shop in shops:
+        # Add shop header
+        data.append(dict(blank_row, Date=shop.name))
+
+        days = daily_totals[shop.id].values()
+        for day in days:
+            data.append({
+                'Date': day['day'].strftime('%Y-%m-%d'),
+                'Cash': float(day['cash']),
+                'Till': float(day['till']),
+                'Bank': float(day['bank']),
+                'Expenses': float(day['expenses']),
+                'Total': float(net_total(day))
+            })
+
+        # Add shop total
+        shop_total = sum_totals(days)
+        totals_row = {
+            'Cash': float(shop_total['cash']),
+            'Till': float(shop_total['till']),
+            'Bank': float(shop_total['bank']),
+            'Expenses': float(shop_total['expenses']),
+            'Total': float(net_total(shop_total))
+        }
+        data.append(dict(totals_row, Date=f'{shop.name} Total'))
+        shop_summaries.append(dict(
+            {key.lower(): value for key, value in totals_row.items()},
+            shop_id=shop.id, shop_name=shop.name
+        ))
+
+        # Add empty row for spacing
+        data.append(dict(blank_row))
+
+    with pd.ExcelWriter(output, engine='xlsxwriter') as writer:
+        df = pd.DataFrame(data)
+        df.to_excel(writer, sheet_name='Shop Accounts', index=False)
+
+        # Get workbook and worksheet objects
+        workbook = writer.book
+        worksheet = writer.sheets['Shop Accounts']
+
+        # Add some formatting
+        header_format = workbook.add_format({
+            'bold': True,
+            'bg_color': '#4CAF50',
+            'font_color': 'white',
+            'border': 1
+        })
+
+        shop_header_format = workbook.add_format({
+            'bold': True,
+            'bg_color': '#E8F5E9',
+            'border': 1
+        })
+
+        shop_total_format = workbook.add_format({
+            'bold': True,
+            'bg_color': '#C8E6C9',
+            'border': 1
+        })
+
+        number_format = workbook.add_format({
+            'num_format': 'KES #,##0.00',
+            'border': 1
+        })
+
+        # Format headers
+        for col_num, value in enumerate(df.columns.values):
+            worksheet.write(0, col_num, value, header_format)
+
+        # Format data
+        for row_num, row in enumerate(df.itertuples(), start=1):
+            for col_num, value in enumerate(row[1:], start=0):
+                if isinstance(value, (int, float)):
+                    worksheet.write(row_num, col_num, value, number_format)
+                elif isinstance(value, str):
+                    if value.endswith('Total'):
+                        worksheet.write(row_num, col_num, value, shop_total_format)
+                    elif value and not value.isdigit():
+                        worksheet.write(row_num, col_num, value, shop_header_format)
+                    else:
+                        worksheet.write(row_num, col_num, value)
+
+        # Adjust column widths
+        worksheet.set_column('A:A', 20)  # Date column
+        worksheet.set_column('B:F', 15)  # Other columns
+
+        # Add period information
+        worksheet.write(0, 6, f'Period: {period.capitalize()}', header_format)
+        worksheet.write(1, 6, f'From: {start_date.strftime("%Y-%m-%d")}', header_format)
+        worksheet.write(2, 6, f'To: {end_date.strftime("%Y-%m-%d")}', header_format)
+
+    return {
+        'period': period,
+        'start_date': start_date.strftime('%Y-%m-%d'),
+        'end_date': end_date.strftime('%Y-%m-%d'),
+        'shops': shop_summaries
+    }
+
+
+def build_daily_report(output, params, progress=None):
+    """One sheet per shop of daily sales, payment methods and counts, with charts.
+
+    Parameters: start_date and end_date (YYYY-MM-DD, required), shop_id.
+    """
+    progress = progress or _noop_progress
+    if not params.get('start_date') or not params.get('end_date'):
+        raise ValueError('Start date and end date are required')
+    try:
+        start_date = datetime.strptime(params['start_date'], '%Y-%m-%d')
+        end_date = datetime.strptime(params['end_date'], '%Y-%m-%d')
+    except ValueError:
+        raise ValueError('Invalid date format. Please use YYYY-MM-DD format.')
+
+    # Get the shops and their daily rollup rows in one query
+    shops = _shops(params.get('shop_id'))
+    daily_totals = load_daily_totals([shop.id for shop in shops],
+                                     start_date.date(), end_date.date())
+    progress(30, 'Loaded daily totals')
+
+    workbook = xlsxwriter.Workbook(output)
+    shop_summaries = []
+
+    # Add a worksheet for each shop
+    for shop in shops:
+        worksheet = workbook.add_worksheet(shop.name)
+        sheet_ref = "'" + shop.name.replace("'", "''") + "'"
+
+        # Add headers
+        headers = [
+            'Date', 'Total Sales', 'Cash', 'Till', 'Bank', 'Expenses',
+            'Products Sold', 'Services Rendered', 'Average Transaction Value'
+        ]
+        for col, header in enumerate(headers):
+            worksheet.write(0, col, header)
+
+        row = 1
+        for day in daily_totals[shop.id].values():
+            total_sales = day['cash'] + day['till'] + day['bank']
+            transactions = day['sale_count'] + day['service_count']
+            avg_transaction = total_sales / transactions if transactions else 0
+
+            # Write data to worksheet
+            worksheet.write(row, 0, day['day'].strftime('%Y-%m-%d'))
+            worksheet.write(row, 1, float(total_sales))
+            worksheet.write(row, 2, float(day['cash']))
+            worksheet.write(row, 3, float(day['till']))
+            worksheet.write(row, 4, float(day['bank']))
+            worksheet.write(row, 5, float(day['expenses']))
+            worksheet.write(row, 6, day['units_sold'])
+            worksheet.write(row, 7, day['service_count'])
+            worksheet.write(row, 8, float(avg_transaction))
+            row += 1
+
+        # Add summary section
+        summary_row = row + 2
+        worksheet.write(summary_row, 0, 'Summary')
+        worksheet.write(summary_row + 1, 0, 'Total Sales')
+        worksheet.write(summary_row + 1, 1, f'=SUM(B2:B{row})')
+        worksheet.write(summary_row + 2, 0, 'Average Daily Sales')
+        worksheet.write(summary_row + 2, 1, f'=AVERAGE(B2:B{row})')
+        worksheet.write(summary_row + 3, 0, 'Total Expenses')
+        worksheet.write(summary_row + 3, 1, f'=SUM(F2:F{row})')
+        worksheet.write(summary_row + 4, 0, 'Total Products Sold')
+        worksheet.write(summary_row + 4, 1, f'=SUM(G2:G{row})')
+        worksheet.write(summary_row + 5, 0, 'Total Services Rendered')
+        worksheet.write(summary_row + 5, 1, f'=SUM(H2:H{row})')
+
+        # Add charts
+        chart_sheet = workbook.add_worksheet(f'{shop.name} Charts')
+
+        # Sales trend chart
+        sales_chart = workbook.add_chart({'type': 'line'})
+        sales_chart.add_series({
+            'name': 'Daily Sales',
+            'categories': f'={sheet_ref}!$A$2:$A${row}',
+            'values': f'={sheet_ref}!$B$2:$B${row}',
+        })
+        sales_chart.set_title({'name': 'Daily Sales Trend'})
+        sales_chart.set_x_axis({'name': 'Date'})
+        sales_chart.set_y_axis({'name': 'Amount (KES)'})
+        chart_sheet.insert_chart('A1', sales_chart)
+
+        # Payment methods pie chart over the per-method totals
+        payment_row = summary_row + 7
+        worksheet.write(payment_row, 0, 'Payment Methods')
+        for offset, (label, column) in enumerate([('Cash', 'C'), ('Till', 'D'), ('Bank', 'E')], start=1):
+            worksheet.write(payment_row + offset, 0, label)
+            worksheet.write(payment_row + offset, 1, f'=SUM({column}2:{column}{row})')
+        payment_chart = workbook.add_chart({'type': 'pie'})
+        payment_chart.add_series({
+            'name': 'Payment Methods',
+            'categories': f'={sheet_ref}!$A${payment_row + 2}:$A${payment_row + 4}',
+            'values': f'={sheet_ref}!$B${payment_row + 2}:$B${payment_row + 4}',
+        })
+        payment_chart.set_title({'name': 'Payment Methods Distribution'})
+        chart_sheet.insert_chart('A17', payment_chart)
+
+        shop_total = sum_totals(daily_totals[shop.id].values())
+        shop_summaries.append({
+            'shop_id': shop.id,
+            'shop_name': shop.name,
+            'total_sales': float(shop_total['cash'] + shop_total['till'] + shop_total['bank']),
+            'expenses': float(shop_total['expenses']),
+            'units_sold': shop_total['units_sold'],
+            'services_rendered': shop_total['service_count']
+        })
+
+    workbook.close()
+    return {
+        'start_date': start_date.strftime('%Y-%m-%d'),
+        'end_date': end_date.strftime('%Y-%m-%d'),
+        'shops': shop_summaries
+    }
+
+
+# Report.type -> (builder, download file prefix)
+REPORT_BUILDERS = {
+    'sales': (build_sales_report, 'sales_report'),
+    'accounts': (build_shop_accounts, 'shop_accounts'),
+    'daily': (build_daily_report, 'daily_report'),
+}
@@ -0,0 +1,155 @@
+"""
+Shared query engine for the admin sales report views.
+
+Parses the report filters (period or explicit dates, shop, sort order) once
+and serves page rows, SQL-side totals and grouped summaries from the same
+conditions, so no view has to load every matching sale to add it up.
+"""
+
+from datetime import datetime, timedelta
+
+from sqlalchemy import func
+
+from database import db, Sale, Shop, Product
+
+SORT_ORDERS = {
+    'date_desc': (Sale.sale_date.desc(), Sale.id.desc()),
+    'date_asc': (Sale.sale_date.asc(), Sale.id.asc()),
+    'amount_desc': (Sale.line_total.desc(), Sale.id.desc()),
+    'amount_asc': (Sale.line_total.asc(), Sale.id.asc()),
+}
+
+GROUPINGS = {
+    'day': func.date(Sale.sale_date),
+    'shop': Shop.name,
+    'product': Product.name,
+    'category': Product.category,
+    'payment_method': Sale.payment_method,
+}
+
+
+def period_start(period, now):
+    """Start of a named report period ending at `now`; None for 'all'."""
+    if period == 'all':
+        return None
+    if period == 'week':
+        return now - timedelta(days=7)
+    if period == 'month':
+        return now - timedelta(days=30)
+    if period == 'year':
+        return now.replace(month=1, day=1, hour=0, minute=0, second=0, microsecond=0)
+    return now.replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+class SalesReportQuery:
+    """Filtered view over Sale rows for reports and exports."""
+
+    def __init__(self, start=None, end=None, shop_id=None, sort_by='date_desc', period='all'):
+        self.start = start
+        self.end = end
+        self.shop_id = shop_id
+        self.sort_by = sort_by if sort_by in SORT_ORDERS else 'date_desc'
+        self.period = period
+
+        self.conditions = []
+        if start is not None:
+            self.conditions.append(Sale.sale_date >= start)
+        if end is not None:
+            self.conditions.append(Sale.sale_date < end)
+        if shop_id:
+            self.conditions.append(Sale.shop_id == shop_id)
+
+    @classmethod
+    def from_args(cls, args, default_period='all'):
+        """Build from request args.
+
+        Explicit start_date/end_date (YYYY-MM-DD, end inclusive) win over
+        `period`. Raises ValueError on a malformed date.
+        """
+        period = args.get('period', default_period)
+        start_date = args.get('start_date')
+        end_date = args.get('end_date')
+
+        if start_date and end_date:
+            start = datetime.strptime(start_date, '%Y-%m-%d')
+            end = datetime.strptime(end_date, '%Y-%m-%d') + timedelta(days=1)
+        else:
+            now = datetime.now()
+            start = period_start(period, now)
+            end = None
+
+        return cls(start=start, end=end,
+                   shop_id=args.get('shop_id', type=int),
+                   sort_by=args.get('sort_by', 'date_desc'),
+                   period=period)
+
+    def _filtered(self, *columns):
+        return db.session.query(*columns).select_from(Sale).filter(*self.conditions)
+
+    def summary(self):
+        """Totals for the whole filter in one aggregate query."""
+        total_sales, total_items, total_transactions = self._filtered(
+            func.coalesce(func.sum(Sale.line_total), 0.0),
+            func.coalesce(func.sum(Sale.quantity), 0),
+            func.count(Sale.id)
+        ).one()
+        return self._summary(total_sales, total_items, total_transactions)
+
+    @staticmethod
+    def _summary(total_sales, total_items, total_transactions):
+        total_sales = float(total_sales or 0)
+        total_transactions = int(total_transactions or 0)
+        return {
+            'total_sales': total_sales,
+            'total_items': int(total_items or 0),
+            'total_transactions': total_transactions,
+            'average_sale': total_sales / total_transactions if total_transactions else 0
+        }
+
+    def rows(self, sort_by=None):
+        """Sorted Sale query with shop and product loaded in the same SELECT."""
+        return Sale.query.join(Shop, Shop.id == Sale.shop_id)\
+            .join(Product, Product.id == Sale.product_id)\
+            .options(db.contains_eager(Sale.shop), db.contains_eager(Sale.product))\
+            .filter(*self.conditions)\
+            .order_by(*SORT_ORDERS[sort_by or self.sort_by])
+
+    def page(self, page=1, per_page=50):
+        """Return (sales, summary) for one page in a single round trip.
+
+        The totals ride along as window aggregates over the full filter;
+        only a page past the end needs a separate summary query.
+        """
+        page = max(page or 1, 1)
+        results = self.rows().add_columns(
+            func.coalesce(func.sum(Sale.line_total).over(), 0.0),
+            func.coalesce(func.sum(Sale.quantity).over(), 0),
+            func.count(Sale.id).over()
+        ).limit(per_page).offset((page - 1) * per_page).all()
+
+        if not results:
+            return [], self.summary() if page > 1 else self._summary(0, 0, 0)
+
+        _, total_sales, total_items, total_transactions = results[0]
+        return [row[0] for row in results], self._summary(total_sales, total_items, total_transactions)
+
+    def grouped(self, key):
+        """Per-group total, quantity and transaction count, ordered by group."""
+        group = GROUPINGS[key]
+        query = self._filtered(
+            group,
+            func.coalesce(func.sum(Sale.line_total), 0.0),
+            func.coalesce(func.sum(Sale.quantity), 0),
+            func.count(Sale.id)
+        )
+        if key == 'shop':
+            query = query.join(Shop, Shop.id == Sale.shop_id)
+        elif key in ('product', 'category'):
+            query = query.join(Product, Product.id == Sale.product_id)
+
+        return [{
+            'group': str(value)[:10] if key == 'day' else value,
+            'total': float(total or 0),
+            'quantity': int(quantity or 0),
+            'transactions': int(transactions or 0)
+        } for value, total, quantity, transactions in query.group_by(group).order_by(group)]
@@ -0,0 +1,145 @@
+"""
+Precomputes scheduled reports.
+
+A report whose `schedule` is 'daily', 'weekly' or 'monthly' is built once
+per closed period (yesterday, last ISO week, last calendar month), ideally
+by `flask generate-scheduled-reports` from cron before the shops open.
+Each run leaves `<period>.xlsx` and `<period>.json` (the builder summary)
+under REPORT_ARTIFACT_DIR/scheduled/<report id>/, plus a `latest.json`
+pointer that the report API returns without touching the sales tables.
+A period whose summary already exists is never rebuilt, so the command
+is safe to run as often as you like.
+"""
+
+import json
+import logging
+import os
+from datetime import datetime, timedelta
+
+from flask import current_app
+
+from database import db, Report
+from report_builders import REPORT_BUILDERS
+
+logger = logging.getLogger(__name__)
+
+SCHEDULES = ('daily', 'weekly', 'monthly')
+
+
+def closed_period(schedule, now):
+    """(key, first day, last day) of the most recent complete period."""
+    today = now.date()
+    if schedule == 'daily':
+        day = today - timedelta(days=1)
+        return day.isoformat(), day, day
+    if schedule == 'weekly':
+        start = today - timedelta(days=today.weekday() + 7)
+        year, week, _ = start.isocalendar()
+        return f'{year}-W{week:02d}', start, start + timedelta(days=6)
+    if schedule == 'monthly':
+        end = today.replace(day=1) - timedelta(days=1)
+        return end.strftime('%Y-%m'), end.replace(day=1), end
+    raise ValueError(f'Unsupported schedule: {schedule}')
+
+
+def report_dir(report_id):
+    return os.path.join(current_app.config['REPORT_ARTIFACT_DIR'], 'scheduled', str(report_id))
+
+
+def artifact_path(report_id, period_key):
+    return os.path.join(report_dir(report_id), f'{period_key}.xlsx')
+
+
+def latest_artifact(report_id):
+    """Metadata of the newest precomputed artifact, or None."""
+    try:
+        with open(os.path.join(report_dir(report_id), 'latest.json')) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _write_json(path, data):
+    tmp_path = f'{path}.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(data, f, default=str)
+    os.replace(tmp_path, path)
+
+
+def generate(report, now=None):
+    """Build `report` for its last closed period. Returns the metadata, or None if it already exists."""
+    now = now or datetime.now()
+    if report.type not in REPORT_BUILDERS:
+        raise ValueError(f'Unsupported report type: {report.type}')
+    period_key, start_day, end_day = closed_period(report.schedule, now)
+
+    directory = report_dir(report.id)
+    summary_path = os.path.join(directory, f'{period_key}.json')
+    if os.path.exists(summary_path):
+        return None
+    os.makedirs(directory, exist_ok=True)
+
+    builder, prefix = REPORT_BUILDERS[report.type]
+    parameters = dict(report.parameters or {})
+    parameters.update({
+        'shop_id': report.shop_id,
+        'start_date': start_day.isoformat(),
+        'end_date': end_day.isoformat()
+    })
+
+    path = artifact_path(report.id, period_key)
+    tmp_path = f'{path}.tmp'
+    filename, message = f'{prefix}_{period_key}.xlsx', None
+    try:
+        with open(tmp_path, 'wb') as output:
+            summary = builder(output, parameters)
+        os.replace(tmp_path, path)
+    except ValueError as e:
+        # Nothing to report for this period (e.g. no sales); record that
+        # instead of retrying on every run
+        summary, filename, message = None, None, str(e)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+    metadata = {
+        'report_id': report.id,
+        'period': period_key,
+        'start_date': start_day.isoformat(),
+        'end_date': end_day.isoformat(),
+        'generated_at': datetime.utcnow().isoformat(),
+        'filename': filename,
+        'summary': summary,
+        'message': message
+    }
+    _write_json(summary_path, metadata)
+    _write_json(os.path.join(directory, 'latest.json'), metadata)
+
+    report.last_generated = datetime.utcnow()
+    db.session.commit()
+    return metadata
+
+
+def generate_due_reports(now=None, report_ids=None):
+    """Build every scheduled report that has no artifact for its last closed period.
+
+    Returns (generated, skipped, failed) counts. A failing report is logged
+    and does not stop the others.
+    """
+    now = now or datetime.now()
+    query = Report.query.filter(Report.schedule.in_(SCHEDULES)).order_by(Report.id)
+    if report_ids:
+        query = query.filter(Report.id.in_(report_ids))
+
+    generated = skipped = failed = 0
+    for report in query.all():
+        try:
+            if generate(report, now) is None:
+                skipped += 1
+            else:
+                generated += 1
+        except Exception as e:
+            db.session.rollback()
+            failed += 1
+            logger.error(f"Error generating scheduled report {report.id}: {str(e)}")
+    return generated, skipped, failed
@@ -0,0 +1,80 @@
+"""
+Bulk stock-take for shop resources.
+
+Loads every affected ShopResource row in one query, writes the changed
+quantities with one executemany UPDATE and the matching ResourceHistory
+rows with one executemany INSERT. The bulk UPDATE does not fire the
+per-row `track_resource_changes` listener, so history is written exactly
+once. Low-stock ResourceAlerts are then reconciled for the changed
+resources by one set-based alert_engine sweep.
+"""
+
+from datetime import datetime
+
+from alert_engine import sweep_items
+from database import db, ShopResource, ResourceHistory
+
+
+def _parse_updates(updates):
+    """{resource_id: (quantity, reason)}; a later update for the same resource wins."""
+    parsed = {}
+    for update in updates:
+        try:
+            resource_id = int(update['resource_id'])
+            quantity = int(float(update['quantity']))
+        except (KeyError, TypeError, ValueError):
+            raise ValueError('Each update needs a resource_id and a numeric quantity')
+        if quantity < 0:
+            raise ValueError('Quantity cannot be negative')
+        parsed[resource_id] = (quantity, update.get('reason') or '')
+    return parsed
+
+
+def apply_resource_updates(shop_id, updates, user_id, change_type='adjust'):
+    """Set resource quantities for one shop in a single transaction.
+
+    `updates` is a list of {resource_id, quantity, reason}. Resources the
+    shop does not stock are skipped. Returns
+    {'updated': [resource_id], 'unchanged': [...], 'skipped': [...], 'alerts': n}.
+    """
+    parsed = _parse_updates(updates)
+    if not parsed:
+        return {'updated': [], 'unchanged': [], 'skipped': [], 'alerts': 0}
+
+    rows = db.session.query(ShopResource.id, ShopResource.resource_id, ShopResource.quantity)\
+        .filter(ShopResource.shop_id == shop_id,
+                ShopResource.resource_id.in_(list(parsed))).all()
+
+    now = datetime.utcnow()
+    found = {row.resource_id for row in rows}
+    changed = [row for row in rows if parsed[row.resource_id][0] != row.quantity]
+
+    if changed:
+        db.session.bulk_update_mappings(ShopResource, [{
+            'id': row.id,
+            'quantity': parsed[row.resource_id][0],
+            'last_updated': now,
+            'updated_by': user_id,
+        } for row in changed])
+        db.session.bulk_insert_mappings(ResourceHistory, [{
+            'resource_id': row.resource_id,
+            'shop_id': shop_id,
+            'previous_quantity': row.quantity or 0,
+            'new_quantity': parsed[row.resource_id][0],
+            'change_type': change_type,
+            'reason': parsed[row.resource_id][1],
+            'updated_by': user_id,
+            'updated_at': now,
+        } for row in changed])
+
+    db.session.commit()
+
+    alerts = 0
+    if changed:
+        alerts = sweep_items(resource_keys=[(shop_id, row.resource_id) for row in changed])['raised']
+    return {
+        'updated': sorted(row.resource_id for row in changed),
+        'unchanged': sorted(found.difference(row.resource_id for row in changed)),
+        'skipped': sorted(set(parsed) - found),
+        'alerts': alerts,
+    }
@@ -1,8 +1,9 @@
 from flask import Blueprint, jsonify, request
-from database import db, Sale, Product, Shop, User, Inventory
+from database import db, Sale, Product, Shop, User
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from datetime import datetime, timedelta
 import logging
+from checkout import checkout
 
 sale_bp = Blueprint('sale', __name__)
 
@@ -23,19 +24,19 @@ def get_sales():
         query = Sale.query.filter_by(shop_id=user.shop_id)
         
         if start_date:
-            query = query.filter(Sale.created_at >= datetime.fromisoformat(start_date))
+            query = query.filter(Sale.sale_date >= datetime.fromisoformat(start_date))
         if end_date:
-            query = query.filter(Sale.created_at <= datetime.fromisoformat(end_date))
+            query = query.filter(Sale.sale_date <= datetime.fromisoformat(end_date))
             
-        sales = query.order_by(Sale.created_at.desc()).all()
+        sales = query.order_by(Sale.sale_date.desc()).all()
         
         return jsonify([{
             'id': sale.id,
             'product_id': sale.product_id,
             'product_name': sale.product.name if sale.product else None,
             'quantity': sale.quantity,
-            'total_amount': sale.total_amount,
-            'created_at': sale.created_at.isoformat() if sale.created_at else None
+            'total_amount': sale.total,
+            'created_at': sale.sale_date.isoformat() if sale.sale_date else None
         } for sale in sales])
     except Exception as e:
         logging.error(f"Error getting sales: {str(e)}")
@@ -64,42 +65,67 @@ def create_sale():
         if not product:
             return jsonify({'error': 'Product not found'}), 404
             
-        # Check inventory
-        inventory = Inventory.query.filter_by(
-            product_id=product.id,
-            shop_id=user.shop_id
-        ).first()
-        
-        if not inventory or inventory.quantity < data['quantity']:
-            return jsonify({'error': 'Insufficient inventory'}), 400
-            
-        # Calculate total amount
-        total_amount = product.price * data['quantity']
-        
-        # Create sale
-        sale = Sale(
-            shop_id=user.shop_id,
-            product_id=product.id,
-            quantity=data['quantity'],
-            total_amount=total_amount,
-            created_at=datetime.utcnow()
-        )
-        
-        # Update inventory
-        inventory.quantity -= data['quantity']
-        inventory.last_updated = datetime.utcnow()
-        
-        db.session.add(sale)
-        db.session.commit()
-        
+        # The JWT API has never posted a FinancialRecord for single sales
+        sales, _, _ = checkout(user.shop_id, user.id,
+                               [{'product_id': product.id, 'quantity': data['quantity']}],
+                               sale_date=datetime.utcnow(), record_payment=False)
+        sale = sales[0]
+
         return jsonify({
             'id': sale.id,
             'product_id': sale.product_id,
             'product_name': product.name,
             'quantity': sale.quantity,
-            'total_amount': sale.total_amount,
-            'created_at': sale.created_at.isoformat()
+            'total_amount': sale.line_total,
+            'created_at': sale.sale_date.isoformat()
         }), 201
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         logging.error(f"Error creating sale: {str(e)}")
-        return jsonify({'error': 'Internal server error'}), 500 
\ No newline at end of file
+        return jsonify({'error': 'Internal server error'}), 500
+
+@sale_bp.route('/api/sales/checkout', methods=['POST'])
+@jwt_required()
+def checkout_basket():
+    try:
+        current_user_id = get_jwt_identity()
+        user = User.query.get(current_user_id)
+
+        if not user or not user.shop_id:
+            return jsonify({'error': 'Shop not found'}), 404
+
+        data = request.get_json() or {}
+        if not data.get('items'):
+            return jsonify({'error': 'At least one item is required'}), 400
+
+        product_ids = {item.get('product_id') for item in data['items'] if isinstance(item, dict)}
+        foreign = db.session.query(Product.id).filter(
+            Product.id.in_(product_ids), Product.shop_id != user.shop_id).first()
+        if foreign:
+            return jsonify({'error': 'Product not found'}), 404
+
+        sales, financial_record, total = checkout(
+            user.shop_id, user.id, data['items'],
+            payment_method=data.get('payment_method', 'cash'),
+            customer_name=data.get('customer_name'),
+            sale_date=datetime.utcnow()
+        )
+
+        return jsonify({
+            'sales': [{
+                'id': sale.id,
+                'product_id': sale.product_id,
+                'quantity': sale.quantity,
+                'unit_price': sale.unit_price,
+                'total_amount': sale.line_total
+            } for sale in sales],
+            'financial_record_id': financial_record.id,
+            'total_amount': total,
+            'created_at': sales[0].sale_date.isoformat()
+        }), 201
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        logging.error(f"Error during checkout: {str(e)}")
+        return jsonify({'error': 'Internal server error'}), 500
@@ -0,0 +1,174 @@
+"""
+Per-request SQL instrumentation.
+
+Cursor events on every engine count the statements a request runs, the
+time spent in the database and how often each statement shape (its
+fingerprint, with literals and IN-lists collapsed) repeats. A shape that
+repeats N_PLUS_ONE_THRESHOLD times in one request is almost always a query
+inside a Python loop and is logged as a likely N+1.
+
+When SQL_METRICS_ENABLED is set, every response carries X-SQL-Count,
+X-SQL-Time-Ms and X-SQL-Repeated headers and /debug/sql lists the most
+recent requests. `query_budget` applies the same counters to any block of
+code, e.g. in a shell session or a smoke-test script:
+
+    with app.test_client() as client, query_budget(10):
+        client.get('/admin/products')
+"""
+
+import logging
+import re
+import threading
+import time
+from collections import Counter, deque
+from contextlib import contextmanager
+
+from flask import g, jsonify, request
+from flask_login import current_user
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+logger = logging.getLogger(__name__)
+
+# Executions of one fingerprint in a single request that count as an N+1
+N_PLUS_ONE_THRESHOLD = 5
+
+# Requests kept per process for /debug/sql
+RECENT_REQUESTS = 50
+
+_local = threading.local()
+_recent = deque(maxlen=RECENT_REQUESTS)
+
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r'\b\d+(?:\.\d+)?\b')
+_PARAM_LIST = re.compile(r'\((?:\s*(?:\?|%\(\w+\)s|:\w+|%s)\s*,?)+\)')
+_SPACE = re.compile(r'\s+')
+
+
+def fingerprint(statement):
+    """Statement shape: literals and bind lists collapsed, whitespace normalised."""
+    statement = _STRING.sub('?', statement)
+    statement = _NUMBER.sub('?', statement)
+    statement = _PARAM_LIST.sub('(?)', statement)
+    return _SPACE.sub(' ', statement).strip()
+
+
+class QueryStats:
+    """Statements seen while this collector is active."""
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+        self.fingerprints = Counter()
+
+    def record(self, statement, duration):
+        self.count += 1
+        self.duration += duration
+        self.fingerprints[fingerprint(statement)] += 1
+
+    def repeated(self, threshold=N_PLUS_ONE_THRESHOLD):
+        """[(fingerprint, executions)] for shapes run at least `threshold` times."""
+        return [(sql, n) for sql, n in self.fingerprints.most_common() if n >= threshold]
+
+    def to_dict(self):
+        return {
+            'statements': self.count,
+            'db_time_ms': round(self.duration * 1000, 2),
+            'repeated': [{'sql': sql, 'executions': n} for sql, n in self.repeated()]
+        }
+
+
+def _collectors():
+    if not hasattr(_local, 'collectors'):
+        _local.collectors = []
+    return _local.collectors
+
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if _collectors():
+        conn.info.setdefault('sql_metrics_start', []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    collectors = _collectors()
+    starts = conn.info.get('sql_metrics_start')
+    if not collectors or not starts:
+        return
+    duration = time.perf_counter() - starts.pop()
+    for stats in collectors:
+        stats.record(statement, duration)
+
+
+@contextmanager
+def collect():
+    """Collect statements run by this thread inside the block."""
+    stats = QueryStats()
+    _collectors().append(stats)
+    try:
+        yield stats
+    finally:
+        _collectors().remove(stats)
+
+
+@contextmanager
+def query_budget(max_statements, max_repeats=None):
+    """Fail with AssertionError if the block runs more than `max_statements`
+    statements, or (when given) repeats one fingerprint more than
+    `max_repeats` times."""
+    with collect() as stats:
+        yield stats
+    problems = []
+    if stats.count > max_statements:
+        problems.append(f'{stats.count} statements run, budget is {max_statements}')
+    if max_repeats is not None:
+        problems.extend(f'{n}x {sql}' for sql, n in stats.repeated(max_repeats + 1))
+    if problems:
+        raise AssertionError('Query budget exceeded:\n  ' + '\n  '.join(problems))
+
+
+def init_app(app):
+    """Attach per-request collection, response headers and /debug/sql."""
+    if not app.config.get('SQL_METRICS_ENABLED'):
+        return
+
+    @app.before_request
+    def _start_sql_metrics():
+        g.sql_metrics = QueryStats()
+        _collectors().append(g.sql_metrics)
+
+    @app.after_request
+    def _sql_metrics_headers(response):
+        stats = g.pop('sql_metrics', None)
+        if stats is None:
+            return response
+        if stats in _collectors():
+            _collectors().remove(stats)
+
+        repeated = stats.repeated()
+        response.headers['X-SQL-Count'] = str(stats.count)
+        response.headers['X-SQL-Time-Ms'] = f'{stats.duration * 1000:.2f}'
+        response.headers['X-SQL-Repeated'] = str(len(repeated))
+        for sql, n in repeated:
+            logger.warning(f"Possible N+1 on {request.method} {request.path}: {n}x {sql[:200]}")
+
+        if request.endpoint != 'sql_metrics_debug':
+            _recent.appendleft(dict(stats.to_dict(),
+                                    method=request.method,
+                                    path=request.path,
+                                    status=response.status_code))
+        return response
+
+    @app.teardown_request
+    def _stop_sql_metrics(exc):
+        # after_request is skipped when a view raises; don't leak the collector
+        stats = g.pop('sql_metrics', None)
+        if stats is not None and stats in _collectors():
+            _collectors().remove(stats)
+
+    @app.route('/debug/sql')
+    def sql_metrics_debug():
+        if not app.debug and not (current_user.is_authenticated and current_user.role == 'admin'):
+            return jsonify({'error': 'Not found'}), 404
+        return jsonify(list(_recent))
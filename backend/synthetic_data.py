@@ -0,0 +1,285 @@
+"""
+Synthetic multi-shop dataset for load and scale testing.
+
+Generates shops with staff, a product catalogue with inventory, services,
+resources and a history of product sales, service sales, expenses and
+daily cash/till/bank deposits. Volumes follow a weekly and hourly shape
+(busy weekends, lunch and after-work peaks) with a slow growth trend and
+day-to-day noise, so dashboards and trend analysis see realistic curves.
+
+Rows are written with Core executemany inserts in batches, committing
+after each batch, so millions of sales need neither ORM objects nor one
+huge transaction. Core inserts skip the ORM rollup listeners; the
+shop_daily_totals rows for the new shops are rebuilt once at the end.
+The same seed always produces the same data.
+"""
+
+import itertools
+import random
+from bisect import bisect
+from datetime import datetime, timedelta
+
+from werkzeug.security import generate_password_hash
+
+from database import (
+    db, Shop, User, Product, Inventory, Service, ServiceCategory, ServiceSale,
+    Resource, ShopResource, Sale, Expense, FinancialRecord
+)
+from database.daily_totals import rebuild_daily_totals
+
+PRODUCT_CATEGORIES = {
+    'Beverages': (40, 250), 'Snacks': (20, 150), 'Dairy': (50, 300),
+    'Bakery': (30, 200), 'Household': (80, 900), 'Personal Care': (60, 700),
+    'Stationery': (10, 400), 'Electronics': (300, 5000), 'Produce': (20, 250),
+    'Frozen': (150, 1200),
+}
+SERVICE_CATEGORIES = {
+    'Printing': (10, 50), 'Photocopy': (5, 20), 'Scanning': (20, 60),
+    'Lamination': (30, 100), 'Typing': (50, 200), 'Binding': (80, 300),
+}
+RESOURCES = [
+    ('A4 Paper', 'Paper', 'sheets', 1.0), ('Printer Ink Black', 'Ink', 'ml', 8.0),
+    ('Printer Ink Color', 'Ink', 'ml', 12.0), ('Laminating Pouches', 'Supplies', 'pieces', 15.0),
+    ('Binding Combs', 'Supplies', 'pieces', 10.0), ('Toner', 'Ink', 'grams', 5.0),
+    ('Staples', 'Supplies', 'pieces', 0.1), ('Receipt Rolls', 'Paper', 'rolls', 60.0),
+]
+EXPENSE_CATEGORIES = ['Rent', 'Utilities', 'Supplies', 'Transport', 'Salaries', 'Maintenance']
+PAYMENT_METHODS = ['cash', 'till', 'bank']
+PAYMENT_WEIGHTS = [50, 35, 15]
+
+# Monday..Sunday and 0..23h relative volume
+WEEKDAY_WEIGHTS = [0.85, 0.8, 0.9, 0.95, 1.15, 1.35, 1.0]
+HOUR_WEIGHTS = [0, 0, 0, 0, 0, 0, 0.2, 0.6, 1.0, 1.1, 1.2, 1.5,
+                1.9, 1.8, 1.3, 1.1, 1.3, 1.8, 2.0, 1.5, 0.9, 0.4, 0.1, 0]
+
+DEFAULT_PASSWORD = 'synthetic123'
+
+
+def _cumulative(weights):
+    return list(itertools.accumulate(weights))
+
+
+def _pick(rng, values, cum_weights):
+    return values[bisect(cum_weights, rng.random() * cum_weights[-1])]
+
+
+class SyntheticDataGenerator:
+    """Writes one synthetic dataset; call `run()` once."""
+
+    def __init__(self, shops=5, products_per_shop=1000, days=365, sales_per_day=300,
+                 seed=42, batch_size=5000, end=None, echo=None):
+        self.shops = shops
+        self.products_per_shop = products_per_shop
+        self.days = days
+        self.sales_per_day = sales_per_day
+        self.batch_size = batch_size
+        self.end = (end or datetime.now()).replace(hour=0, minute=0, second=0, microsecond=0)
+        self.rng = random.Random(seed)
+        self.echo = echo or (lambda message: None)
+        self.counts = {}
+        self._hour_cum = _cumulative(HOUR_WEIGHTS)
+        self._payment_cum = _cumulative(PAYMENT_WEIGHTS)
+
+    def run(self):
+        admin = self._admin()
+        service_categories = self._service_categories()
+        shop_ids = []
+        for index in range(self.shops):
+            shop = Shop(name=f'Synthetic Shop {admin.id}-{index + 1}',
+                        location=f'{index + 1} Synthetic Avenue',
+                        admin_id=admin.id)
+            db.session.add(shop)
+            db.session.commit()
+            shop_ids.append(shop.id)
+            self._populate_shop(shop.id, admin.id, service_categories)
+            self.echo(f'Shop {index + 1}/{self.shops} (id {shop.id}) done')
+
+        self.echo('Rebuilding daily totals...')
+        rebuild_daily_totals(shop_ids=shop_ids)
+        return shop_ids
+
+    # Reference data
+
+    def _admin(self):
+        stamp = datetime.utcnow().strftime('%Y%m%d%H%M%S')
+        admin = User(name='Synthetic Admin', email=f'synthetic-admin-{stamp}@example.com',
+                     password_hash=self._password_hash(), role='admin')
+        db.session.add(admin)
+        db.session.commit()
+        return admin
+
+    def _password_hash(self):
+        if not hasattr(self, '_hash'):
+            self._hash = generate_password_hash(DEFAULT_PASSWORD)
+        return self._hash
+
+    def _service_categories(self):
+        existing = {c.name: c.id for c in ServiceCategory.query.filter(
+            ServiceCategory.name.in_(SERVICE_CATEGORIES)).all()}
+        for name in SERVICE_CATEGORIES:
+            if name not in existing:
+                category = ServiceCategory(name=name, description=f'{name} services')
+                db.session.add(category)
+                db.session.flush()
+                existing[name] = category.id
+        db.session.commit()
+        return existing
+
+    # Per-shop data
+
+    def _populate_shop(self, shop_id, admin_id, service_categories):
+        rng = self.rng
+        employees = []
+        for number in range(rng.randint(2, 4)):
+            employee = User(name=f'Synthetic Employee {shop_id}-{number + 1}',
+                            email=f'synthetic-{shop_id}-{number + 1}@example.com',
+                            password_hash=self._password_hash(), role='employee',
+                            shop_id=shop_id, admin_id=admin_id)
+            db.session.add(employee)
+            employees.append(employee)
+        db.session.commit()
+        employee_ids = [employee.id for employee in employees]
+
+        products = self._products(shop_id)
+        services = self._services(shop_id, service_categories)
+        self._resources(shop_id, employee_ids[0])
+        self._history(shop_id, employee_ids, products, services)
+
+    def _insert(self, table, rows):
+        if rows:
+            db.session.execute(table.insert(), rows)
+            db.session.commit()
+            self.counts[table.name] = self.counts.get(table.name, 0) + len(rows)
+
+    def _products(self, shop_id):
+        rng = self.rng
+        categories = list(PRODUCT_CATEGORIES)
+        rows = []
+        for number in range(self.products_per_shop):
+            category = rng.choice(categories)
+            low, high = PRODUCT_CATEGORIES[category]
+            rows.append({
+                'name': f'{category} Item {number + 1}',
+                'barcode': f'SYN{shop_id:05d}{number + 1:07d}',
+                'category': category,
+                'marked_price': float(round(rng.uniform(low, high))),
+                'reorder_level': rng.choice([5, 10, 20]),
+                'shop_id': shop_id,
+                'created_at': self.end - timedelta(days=self.days),
+            })
+            if len(rows) >= self.batch_size:
+                self._insert(Product.__table__, rows)
+                rows = []
+        self._insert(Product.__table__, rows)
+
+        products = db.session.query(Product.id, Product.marked_price)\
+            .filter(Product.shop_id == shop_id).order_by(Product.id).all()
+        self._insert(Inventory.__table__, [{
+            'shop_id': shop_id,
+            'product_id': product_id,
+            'quantity': rng.randint(0, 200),
+            'updated_at': self.end,
+        } for product_id, _ in products])
+        return products
+
+    def _services(self, shop_id, service_categories):
+        rng = self.rng
+        rows = []
+        for name, (low, high) in SERVICE_CATEGORIES.items():
+            for variant in ('Standard', 'Express'):
+                rows.append({
+                    'name': f'{name} ({variant})',
+                    'description': f'{variant} {name.lower()}',
+                    'price': float(round(rng.uniform(low, high))),
+                    'duration': rng.choice([5, 10, 15, 30]),
+                    'category_id': service_categories[name],
+                    'is_active': True,
+                    'shop_id': shop_id,
+                })
+        self._insert(Service.__table__, rows)
+        return db.session.query(Service.id, Service.price)\
+            .filter(Service.shop_id == shop_id).order_by(Service.id).all()
+
+    def _resources(self, shop_id, employee_id):
+        rng = self.rng
+        self._insert(Resource.__table__, [{
+            'name': name, 'description': f'{name} for shop services', 'category': category,
+            'unit': unit, 'cost_per_unit': cost, 'reorder_level': rng.choice([10, 50, 100]),
+            'shop_id': shop_id,
+        } for name, category, unit, cost in RESOURCES])
+        resource_ids = [row.id for row in db.session.query(Resource.id).filter(Resource.shop_id == shop_id)]
+        self._insert(ShopResource.__table__, [{
+            'shop_id': shop_id, 'resource_id': resource_id, 'quantity': rng.randint(0, 500),
+            'last_updated': self.end, 'updated_by': employee_id,
+        } for resource_id in resource_ids])
+
+    def _history(self, shop_id, employee_ids, products, services):
+        rng = self.rng
+        # Long-tailed product popularity: a few best sellers, many slow movers
+        product_cum = _cumulative(1.0 / (rank + 1) ** 0.8 for rank in range(len(products)))
+        shop_scale = rng.uniform(0.6, 1.4)
+
+        sales, service_sales, expenses, deposits = [], [], [], []
+        start = self.end - timedelta(days=self.days)
+        for offset in range(self.days):
+            day = start + timedelta(days=offset)
+            trend = 0.8 + 0.4 * offset / max(self.days - 1, 1)
+            volume = self.sales_per_day * shop_scale * WEEKDAY_WEIGHTS[day.weekday()] * trend
+            takings = dict.fromkeys(PAYMENT_METHODS, 0.0)
+
+            for _ in range(max(int(rng.gauss(volume, volume * 0.15)), 0)):
+                product_id, price = _pick(rng, products, product_cum)
+                quantity = _pick(rng, (1, 2, 3, 4, 5), (55, 80, 90, 96, 100))
+                method = _pick(rng, PAYMENT_METHODS, self._payment_cum)
+                takings[method] += price * quantity
+                sales.append({
+                    'shop_id': shop_id, 'product_id': product_id, 'quantity': quantity,
+                    'payment_method': method, 'sale_date': self._moment(day),
+                    'unit_price': price, 'line_total': price * quantity,
+                })
+                if len(sales) >= self.batch_size:
+                    self._insert(Sale.__table__, sales)
+                    sales = []
+
+            for _ in range(max(int(rng.gauss(volume / 10, volume / 40)), 0)):
+                service_id, price = rng.choice(services)
+                method = _pick(rng, PAYMENT_METHODS, self._payment_cum)
+                takings[method] += price
+                service_sales.append({
+                    'service_id': service_id, 'shop_id': shop_id,
+                    'employee_id': rng.choice(employee_ids), 'price': price,
+                    'sale_date': self._moment(day), 'status': 'completed',
+                    'payment_method': method,
+                })
+
+            for _ in range(_pick(rng, (0, 1, 2, 3), (40, 75, 92, 100))):
+                category = rng.choice(EXPENSE_CATEGORIES)
+                expenses.append({
+                    'shop_id': shop_id, 'category': category,
+                    'description': f'{category} payment',
+                    'amount': round(rng.uniform(200, 5000) * shop_scale, 2),
+                    'date': self._moment(day), 'created_by': rng.choice(employee_ids),
+                })
+
+            for method, amount in takings.items():
+                if amount:
+                    deposits.append({
+                        'shop_id': shop_id, 'type': method, 'amount': round(amount, 2),
+                        'date': day + timedelta(hours=21),
+                        'description': f'Daily {method} takings',
+                        'created_by': employee_ids[0],
+                    })
+
+            if len(service_sales) >= self.batch_size:
+                self._insert(ServiceSale.__table__, service_sales)
+                service_sales = []
+
+        self._insert(Sale.__table__, sales)
+        self._insert(ServiceSale.__table__, service_sales)
+        for table, rows in ((Expense.__table__, expenses), (FinancialRecord.__table__, deposits)):
+            for begin in range(0, len(rows), self.batch_size):
+                self._insert(table, rows[begin:begin + self.batch_size])
+
+    def _moment(self, day):
+        return day + timedelta(hours=_pick(self.rng, range(24), self._hour_cum),
+                               seconds=self.rng.randrange(3600))